@@ -0,0 +1,7 @@
+"""
+Benchmarks for the Brewin interpreter. Each programs/NAME.brewin is a representative workload, with its
+expected output in programs/NAME.exp. Run them with:
+
+  python -m benchmarks.runner                      # compare against benchmarks/baseline.json
+  python -m benchmarks.runner --save-baseline      # record a new baseline
+"""
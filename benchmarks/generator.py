@@ -0,0 +1,138 @@
+"""
+Generates valid Brewin programs of a given shape, for stress-testing how the interpreter scales with
+the number of classes, inheritance depth, methods per class, fields per class and template arity/nesting.
+
+usage: python -m benchmarks.generator --classes 20 --depth 5 --methods 4 --fields 3 --arity 2 --nesting 3
+"""
+
+import argparse
+
+
+class ProgramShape:
+    def __init__(
+        self,
+        num_classes=10,
+        depth=5,
+        methods_per_class=3,
+        fields_per_class=2,
+        template_arity=1,
+        template_nesting=1,
+    ):
+        self.num_classes = num_classes
+        self.depth = max(1, depth)
+        self.methods_per_class = max(1, methods_per_class)
+        self.fields_per_class = fields_per_class
+        self.template_arity = max(1, template_arity)
+        self.template_nesting = max(1, template_nesting)
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+# classes c0..c{n-1} form inheritance chains of `depth` classes: c{i} inherits c{i-1} unless i is a
+# multiple of depth. Every class overrides m0..m{k-1}, while base_only is only defined on chain roots,
+# so calling it on a leaf makes dispatch walk the whole chain.
+def get_class_name(i):
+    return f"c{i}"
+
+
+def get_root_name(shape):
+    return get_class_name(0)
+
+
+# the most derived class of the first inheritance chain
+def get_leaf_name(shape):
+    return get_class_name(min(shape.depth, max(1, shape.num_classes)) - 1)
+
+
+def get_template_name(level):
+    return f"t{level}"
+
+
+# e.g. t2@int@string for arity 2
+def get_template_instance_name(shape, level):
+    param_types = ["int", "string", "bool"]
+    args = [param_types[i % len(param_types)] for i in range(shape.template_arity)]
+    return "@".join([get_template_name(level)] + args)
+
+
+def generate_class(shape, i):
+    name = get_class_name(i)
+    if i % shape.depth == 0:
+        lines = [f"(class {name}"]
+        lines.append("  (method int base_only () (return 0))")
+    else:
+        lines = [f"(class {name} inherits {get_class_name(i - 1)}"]
+    for f in range(shape.fields_per_class):
+        lines.append(f"  (field int f{i}_{f} {f})")
+    for m in range(shape.methods_per_class):
+        lines.append(f"  (method int m{m} ((int x)) (return (+ x {i + m})))")
+    lines.append(")")
+    return lines
+
+
+# t{d} holds one field per type parameter plus a reference to a t{d-1} with the same parameters;
+# build() instantiates the next level down, so instantiating t{nesting-1} specializes every level
+def generate_template(shape, level):
+    params = [f"p{i}" for i in range(shape.template_arity)]
+    lines = [f"(tclass {get_template_name(level)} ({' '.join(params)})"]
+    for i, param in enumerate(params):
+        lines.append(f"  (field {param} v{i})")
+    if level == 0:
+        lines.append("  (method void build () (return))")
+    else:
+        inner = "@".join([get_template_name(level - 1)] + params)
+        lines.append(f"  (field {inner} inner null)")
+        lines.append(
+            f"  (method void build () (begin (set inner (new {inner})) (call inner build)))"
+        )
+    for i, param in enumerate(params):
+        lines.append(f"  (method {param} get{i} () (return v{i}))")
+    lines.append(")")
+    return lines
+
+
+def generate_program(shape):
+    lines = []
+    for level in range(shape.template_nesting):
+        lines.extend(generate_template(shape, level))
+    for i in range(shape.num_classes):
+        lines.extend(generate_class(shape, i))
+    leaf = get_leaf_name(shape)
+    outer = get_template_instance_name(shape, shape.template_nesting - 1)
+    lines.extend(
+        [
+            "(class main",
+            f"  (field {leaf} obj null)",
+            f"  (field {outer} tobj null)",
+            "  (method void main ()",
+            "    (begin",
+            f"      (set obj (new {leaf}))",
+            "      (print (call obj base_only) \" \" (call obj m0 1))",
+            f"      (set tobj (new {outer}))",
+            "      (call tobj build)",
+            "    )",
+            "  )",
+            ")",
+        ]
+    )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a Brewin program of a given shape.")
+    parser.add_argument("--classes", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--methods", type=int, default=3)
+    parser.add_argument("--fields", type=int, default=2)
+    parser.add_argument("--arity", type=int, default=1)
+    parser.add_argument("--nesting", type=int, default=1)
+    args = parser.parse_args(argv)
+    shape = ProgramShape(
+        args.classes, args.depth, args.methods, args.fields, args.arity, args.nesting
+    )
+    print("\n".join(generate_program(shape)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Runs the Brewin benchmark programs, records wall time, peak memory and statements executed for each,
+and compares them against a stored baseline. Exits with status 1 if any program produces the wrong
+output (run directly, or prepared once and run twice with PreparedProgram.run) or gets slower/bigger than
+the baseline by more than the threshold.
+
+usage: python -m benchmarks.runner [--repeat N] [--threshold 0.15] [--output results.json]
+                                   [--baseline PATH] [--save-baseline [--without-time]] [-o name=value ...]
+                                   [names ...]
+
+A missing baseline, or a benchmark missing from it, is a failure too. The committed baseline.json only
+holds the metrics that don't depend on the machine (peak memory and statements executed, recorded with
+--save-baseline --without-time); a metric missing from the baseline isn't compared. Saving the baseline for
+some benchmarks keeps the other benchmarks' entries.
+
+-o passes keyword arguments to the Interpreter, e.g. -o trace_output=false, so that alternate
+interpreter configurations can be measured against the same baseline.
+
+A benchmark may have a NAME.json next to its program, e.g. {"options": {"memoize": 100}, "engines": ["bytecode"]}:
+its options are passed to the Interpreter under those given with -o, and it is skipped when the engine
+(-o engine=..., tree by default) isn't one of its engines.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from interpreterv3 import Interpreter
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROGRAM_DIR = os.path.join(BENCHMARK_DIR, "programs")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# the metrics compared against the baseline
+METRICS = ["time", "peak_memory", "statements_executed"]
+MACHINE_INDEPENDENT_METRICS = ["peak_memory", "statements_executed"]
+
+
+def get_benchmark_names():
+    return sorted(
+        os.path.basename(path)[: -len(".brewin")]
+        for path in glob.glob(os.path.join(PROGRAM_DIR, "*.brewin"))
+    )
+
+
+# returns (the Interpreter options, the engines it runs on or None for all) of a benchmark
+def read_settings(name):
+    path = os.path.join(PROGRAM_DIR, name + ".json")
+    if not os.path.exists(path):
+        return {}, None
+    with open(path) as f:
+        settings = json.load(f)
+    return settings.get("options", {}), settings.get("engines")
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+# runs a single program; returns (output, statements_executed)
+def run_program(program, interpreter_options):
+    interpreter = Interpreter(console_output=False, inp=[], **interpreter_options)
+    interpreter.run(program)
+    return interpreter.get_output(), interpreter.statements_executed
+
+
+# time is the best of `repeat` runs; peak memory is measured in a separate run, since tracing
+# allocations slows the interpreter down
+def run_benchmark(name, repeat, interpreter_options):
+    program = read_lines(os.path.join(PROGRAM_DIR, name + ".brewin"))
+    expected_output = read_lines(os.path.join(PROGRAM_DIR, name + ".exp"))
+
+    best_time = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output, statements_executed = run_program(program, interpreter_options)
+        elapsed = time.perf_counter() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+
+    tracemalloc.start()
+    try:
+        run_program(program, interpreter_options)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # the program prepared once, with the same options, must give the same output every time it's run
+    prepared = Interpreter(console_output=False, **interpreter_options).prepare(program)
+    prepared_ok = all(prepared.run([]) == expected_output for _ in range(2))
+
+    return {
+        "time": best_time,
+        "peak_memory": peak_memory,
+        "statements_executed": statements_executed,
+        "output_ok": output == expected_output,
+        "prepared_ok": prepared_ok,
+    }
+
+
+# returns a list of human-readable regressions of results relative to baseline
+def compare_to_baseline(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        if not result["output_ok"]:
+            regressions.append(f"{name}: output does not match {name}.exp")
+        if not result["prepared_ok"]:
+            regressions.append(f"{name}: output of the prepared program run twice does not match {name}.exp")
+        if name not in baseline:
+            regressions.append(f"{name}: not in the baseline; run with --save-baseline to record it")
+            continue
+        for metric in METRICS:
+            old = baseline[name].get(metric)
+            new = result[metric]
+            if old and new > old * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} went from {old:.6g} to {new:.6g} (+{(new / old - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+# -o name=value; the value is parsed as JSON when possible (true, 3, "x"), otherwise used as a string
+def parse_interpreter_options(options):
+    parsed = {}
+    for option in options:
+        name, _, value = option.partition("=")
+        try:
+            parsed[name] = json.loads(value)
+        except ValueError:
+            parsed[name] = value
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Brewin benchmarks and check for regressions.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark; the best is kept")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative increase per metric")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument(
+        "--without-time", action="store_true", help="with --save-baseline, store only the machine-independent metrics"
+    )
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("-o", "--option", action="append", default=[], help="Interpreter keyword argument name=value")
+    args = parser.parse_args(argv)
+
+    interpreter_options = parse_interpreter_options(args.option)
+    names = args.names or get_benchmark_names()
+    results = {}
+    for name in names:
+        options, engines = read_settings(name)
+        options = {**options, **interpreter_options}
+        if engines is not None and options.get("engine", Interpreter.ENGINE_TREE) not in engines:
+            print(f"{name:24} skipped: only runs on {', '.join(engines)}")
+            continue
+        results[name] = run_benchmark(name, args.repeat, options)
+        result = results[name]
+        print(
+            f"{name:24} {result['time'] * 1000:9.1f} ms {result['peak_memory'] / 1024:9.1f} KiB "
+            f"{result['statements_executed']:9} stmts{'' if result['output_ok'] and result['prepared_ok'] else '  WRONG OUTPUT'}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        metrics = MACHINE_INDEPENDENT_METRICS if args.without_time else METRICS
+        baseline = baseline or {}
+        for name, result in results.items():
+            baseline[name] = {metric: result[metric] for metric in metrics}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
+        return 1
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Measures how the interpreter scales with program shape. Each program parameter (classes, depth, methods,
+fields, arity, nesting) is swept on its own while the others keep their defaults, and for every generated
+program we record:
+
+  load_time / load_memory          Interpreter.prepare_parsed (TypeManager + ClassDef construction)
+  subtype_time                     TypeManager.is_a_subtype(root, leaf), per call
+  dispatch_time                    call_method on a leaf for a method defined only at the chain root,
+                                   per call (this is where __get_obj_with_method walks the chain)
+  cached_dispatch_time             the same call through a warm InlineCache, as engines' call sites make it
+  instance_memory                  peak allocation while instantiating the leaf class
+  template_time                    instantiating and building the most deeply nested template
+
+Results are written as JSON; if matplotlib is installed, one PNG per swept parameter is written too.
+
+usage: python -m benchmarks.scaling [--output-dir scaling_results] [--quick]
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from bparser import BParser
+from interpreterv3 import Interpreter
+from objectv2 import InlineCache
+
+from benchmarks.generator import (
+    ProgramShape,
+    generate_program,
+    get_leaf_name,
+    get_root_name,
+    get_template_instance_name,
+)
+
+try:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+# parameter name -> (ProgramShape attribute, values to sweep)
+SWEEPS = {
+    "classes": ("num_classes", [10, 50, 100, 200, 400]),
+    "depth": ("depth", [1, 5, 10, 20, 40]),
+    "methods": ("methods_per_class", [1, 5, 10, 20, 40]),
+    "fields": ("fields_per_class", [0, 5, 10, 20, 40]),
+    "arity": ("template_arity", [1, 2, 4, 8, 16]),
+    "nesting": ("template_nesting", [1, 2, 4, 8, 16]),
+}
+QUICK_SWEEPS = {name: (attr, values[:3]) for name, (attr, values) in SWEEPS.items()}
+
+METRICS = [
+    "load_time",
+    "load_memory",
+    "subtype_time",
+    "dispatch_time",
+    "cached_dispatch_time",
+    "instance_memory",
+    "template_time",
+]
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(shape, repeat=3, calls=200):
+    status, parsed_program = BParser.parse(generate_program(shape))
+    assert status, parsed_program
+
+    load_time = best_time(
+        lambda: Interpreter(console_output=False).prepare_parsed(parsed_program), repeat
+    )
+    load_memory = peak_memory(
+        lambda: Interpreter(console_output=False).prepare_parsed(parsed_program)
+    )
+
+    interpreter = Interpreter(console_output=False)
+    prepared = interpreter.prepare_parsed(parsed_program)
+    interpreter.run_prepared(prepared)
+
+    root, leaf = get_root_name(shape), get_leaf_name(shape)
+    type_manager = prepared.type_manager
+
+    def check_subtypes():
+        for _ in range(calls):
+            type_manager.is_a_subtype(root, leaf)
+
+    leaf_obj = interpreter.instantiate(leaf, None)
+
+    def dispatch():
+        for _ in range(calls):
+            leaf_obj.call_method("base_only", [], False, None)
+
+    inline_cache = InlineCache()
+
+    def cached_dispatch():
+        for _ in range(calls):
+            leaf_obj.call_method("base_only", [], False, None, inline_cache)
+
+    outer = get_template_instance_name(shape, shape.template_nesting - 1)
+
+    def build_template():
+        interpreter.instantiate(outer, None).call_method("build", [], False, None)
+
+    return {
+        "load_time": load_time,
+        "load_memory": load_memory,
+        "subtype_time": best_time(check_subtypes, repeat) / calls,
+        "dispatch_time": best_time(dispatch, repeat) / calls,
+        "cached_dispatch_time": best_time(cached_dispatch, repeat) / calls,
+        "instance_memory": peak_memory(lambda: interpreter.instantiate(leaf, None)),
+        "template_time": best_time(build_template, repeat),
+    }
+
+
+def run_sweeps(sweeps, repeat):
+    results = {}
+    for param, (attr, values) in sweeps.items():
+        results[param] = []
+        for value in values:
+            shape = ProgramShape()
+            setattr(shape, attr, value)
+            shape.num_classes = max(shape.num_classes, shape.depth)  # room for a full-depth chain
+            row = {"value": value, "shape": shape.as_dict()}
+            row.update(measure(shape, repeat))
+            results[param].append(row)
+            print(
+                f"{param:8} = {value:4}: load {row['load_time'] * 1000:8.2f} ms "
+                f"{row['load_memory'] / 1024:9.1f} KiB | subtype {row['subtype_time'] * 1e6:7.2f} us "
+                f"| dispatch {row['dispatch_time'] * 1e6:8.2f} us "
+                f"(cached {row['cached_dispatch_time'] * 1e6:8.2f} us) | instance "
+                f"{row['instance_memory'] / 1024:7.1f} KiB | template {row['template_time'] * 1000:7.2f} ms"
+            )
+    return results
+
+
+def plot(results, output_dir):
+    for param, rows in results.items():
+        values = [row["value"] for row in rows]
+        fig, axes = plt.subplots(2, 4, figsize=(18, 8))
+        for ax in axes.flat[len(METRICS):]:
+            ax.set_visible(False)
+        for ax, metric in zip(axes.flat, METRICS):
+            ax.plot(values, [row[metric] for row in rows], marker="o")
+            ax.set_title(metric)
+            ax.set_xlabel(param)
+        fig.suptitle(f"scaling with {param}")
+        fig.tight_layout()
+        fig.savefig(os.path.join(output_dir, f"scaling_{param}.png"))
+        plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure interpreter scaling with program shape.")
+    parser.add_argument("--output-dir", default="scaling_results")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="only sweep the three smallest values")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    results = run_sweeps(QUICK_SWEEPS if args.quick else SWEEPS, args.repeat)
+    with open(os.path.join(args.output_dir, "scaling.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    if plt is not None:
+        plot(results, args.output_dir)
+    else:
+        print("matplotlib is not installed; skipping plots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Long-lived server that runs Brewin programs on a pool of warm worker processes, so that a program only
+pays for its own execution and not for Python startup and imports.
+
+Requests and responses are newline-delimited JSON objects, either over stdin/stdout (the default) or over
+a Unix socket (--socket PATH):
+
+  request:  {"id": 1, "program": ["(class main ...", ...], "inputs": ["5"], "timeout": 2.0}
+  response: {"id": 1, "output": ["..."], "error_type": "TYPE_ERROR", "error_line": 6,
+             "error": "ErrorType.TYPE_ERROR on line 6: ...", "timed_out": false,
+             "wall_time": 0.004, "statements_executed": 12}
+
+"inputs" and "timeout" are optional; a request whose program or inputs isn't a list of strings, or whose
+timeout isn't a non-negative number, is answered with a "bad request" error. error_type/error_line/error
+are null when the program ran cleanly.
+A worker that exceeds its timeout is killed and replaced.
+"""
+
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from interpreterv3 import Interpreter
+
+
+# body of each worker process: prepared programs are kept (up to max_prepared) so that reruns of the same
+# program with different inputs skip the load phase
+def _worker_main(conn, max_prepared, engine):
+    sys.stdout = open(os.devnull, "w")  # keep stray prints off the protocol channel
+    prepared_programs = collections.OrderedDict()
+    while True:
+        try:
+            program, inputs = conn.recv()
+        except (EOFError, OSError):
+            return
+        interpreter = Interpreter(console_output=False, inp=inputs, engine=engine)
+        error = None
+        start = time.perf_counter()
+        try:
+            key = tuple(program)
+            prepared = prepared_programs.get(key)
+            if prepared is None:
+                prepared = interpreter.prepare(program)
+                prepared_programs[key] = prepared
+                if len(prepared_programs) > max_prepared:
+                    prepared_programs.popitem(last=False)
+            else:
+                prepared_programs.move_to_end(key)
+            interpreter.run_prepared(prepared)
+        except Exception as e:  # Brewin errors are raised as plain Exceptions by InterpreterBase.error
+            error = str(e)
+        wall_time = time.perf_counter() - start
+        error_type, error_line = interpreter.get_error_type_and_line()
+        conn.send(
+            {
+                "output": interpreter.get_output(),
+                "error_type": error_type.name if error_type is not None else None,
+                "error_line": error_line,
+                "error": error,
+                "timed_out": False,
+                "wall_time": wall_time,
+                "statements_executed": interpreter.statements_executed,
+            }
+        )
+
+
+class _Worker:
+    def __init__(self, max_prepared, engine):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main, args=(child_conn, max_prepared, engine), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+# a fixed number of worker processes; each request is handed to an idle worker
+class WorkerPool:
+    def __init__(self, num_workers=None, timeout=10.0, max_prepared=64, engine=Interpreter.ENGINE_TREE):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_prepared = max_prepared
+        self.engine = engine
+        self.idle_workers = queue.Queue()
+        for _ in range(self.num_workers):
+            self.idle_workers.put(self.__create_worker())
+
+    # runs program (a list of source lines) with the given input lines and returns a response dict
+    def execute(self, program, inputs=None, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        worker = self.idle_workers.get()
+        try:
+            worker.conn.send((program, inputs))
+            if worker.conn.poll(timeout):
+                return worker.conn.recv()
+            worker = self.__replace_worker(worker)
+            return WorkerPool.__failure(f"timed out after {timeout}s", True)
+        except (EOFError, OSError):  # the worker died, e.g. out of memory
+            worker = self.__replace_worker(worker)
+            return WorkerPool.__failure("worker process exited unexpectedly", False)
+        except BaseException:
+            # the worker may still send a response for this program, which the next request would read
+            worker = self.__replace_worker(worker)
+            raise
+        finally:
+            self.idle_workers.put(worker)
+
+    def __create_worker(self):
+        return _Worker(self.max_prepared, self.engine)
+
+    # kills worker and returns a new one to take its place
+    def __replace_worker(self, worker):
+        worker.kill()
+        return self.__create_worker()
+
+    def shutdown(self):
+        for _ in range(self.num_workers):
+            self.idle_workers.get().kill()
+
+    @staticmethod
+    def __failure(message, timed_out):
+        return {
+            "output": [],
+            "error_type": None,
+            "error_line": None,
+            "error": message,
+            "timed_out": timed_out,
+            "wall_time": None,
+            "statements_executed": None,
+        }
+
+
+# returns the "timeout" of a request in seconds, or None if it has none; raises ValueError unless it's a
+# non-negative number
+def get_timeout(request):
+    timeout = request.get("timeout")
+    if timeout is None:
+        return None
+    if type(timeout) not in (int, float) or not math.isfinite(timeout) or timeout < 0:
+        raise ValueError(f"timeout must be a non-negative number of seconds, not {json.dumps(timeout)}")
+    return float(timeout)
+
+
+# returns the list of strings stored under name in a request (None if it's optional and missing); raises
+# ValueError unless it's a list of strings
+def get_lines(request, name, required=False):
+    lines = request[name] if required else request.get(name)
+    if lines is None and not required:
+        return None
+    if type(lines) is not list or not all(type(line) is str for line in lines):
+        raise ValueError(f"{name} must be a list of strings, not {json.dumps(lines)}")
+    return lines
+
+
+# decodes one request line and returns the encoded response line
+def handle_request(pool, line):
+    try:
+        request = json.loads(line)
+        program = get_lines(request, "program", True)
+        inputs = get_lines(request, "inputs")
+        timeout = get_timeout(request)
+    except (ValueError, KeyError, TypeError) as e:
+        return json.dumps({"id": None, "error": f"bad request: {e}"})
+    response = pool.execute(program, inputs, timeout)
+    response["id"] = request.get("id")
+    return json.dumps(response)
+
+
+# requests are processed concurrently; responses are written as they complete, so match them up by id
+def serve_stdio(pool):
+    write_lock = threading.Lock()
+
+    def respond(line):
+        response = handle_request(pool, line)
+        with write_lock:
+            sys.stdout.write(response + "\n")
+            sys.stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=pool.num_workers) as executor:
+        for line in sys.stdin:
+            if line.strip():
+                executor.submit(respond, line)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                response = handle_request(self.server.pool, line.decode())
+                self.wfile.write(response.encode() + b"\n")
+                self.wfile.flush()
+
+
+# each connection is served by its own thread; requests on one connection are answered in order
+def serve_socket(pool, path):
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, _RequestHandler) as server:
+        server.daemon_threads = True
+        server.pool = pool
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Brewin programs on warm worker processes.")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="default per-request timeout in seconds")
+    parser.add_argument("--socket", default=None, help="serve on this Unix socket path instead of stdin/stdout")
+    parser.add_argument("--engine", default=Interpreter.ENGINE_TREE, help="method execution engine (tree, closure, transpile or bytecode)")
+    args = parser.parse_args(argv)
+
+    pool = WorkerPool(args.workers, args.timeout, engine=args.engine)
+    try:
+        if args.socket:
+            serve_socket(pool, args.socket)
+        else:
+            serve_stdio(pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
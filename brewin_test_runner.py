@@ -0,0 +1,170 @@
+"""
+Runs a directory of Brewin test programs in parallel and reports the results as JSON and/or JUnit XML.
+
+For every NAME.brewin in the directory:
+  NAME.in   (optional) input lines fed to inputi/inputs
+  NAME.exp  (optional) expected output lines
+  NAME.err  (optional) expected error: an error type name (e.g. TYPE_ERROR or ErrorType.TYPE_ERROR),
+            optionally followed by the expected line number. Without it the program must run cleanly.
+
+usage: python brewin_test_runner.py tests/ --workers 8 --json report.json --junit report.xml
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from brewin_server import WorkerPool
+from interpreterv3 import Interpreter
+
+
+class BrewinTest:
+    def __init__(self, brewin_path):
+        base = brewin_path[: -len(".brewin")]
+        self.name = os.path.basename(base)
+        self.program = BrewinTest.__read_lines(brewin_path)
+        self.inputs = BrewinTest.__read_lines(base + ".in")
+        self.expected_output = BrewinTest.__read_lines(base + ".exp")
+        self.expected_error_type = None
+        self.expected_error_line = None
+        expected_error = BrewinTest.__read_lines(base + ".err")
+        if expected_error:
+            parts = " ".join(expected_error).split()
+            self.expected_error_type = parts[0].replace("ErrorType.", "")
+            if len(parts) > 1:
+                self.expected_error_line = int(parts[1])
+
+    # returns a list of reasons the run doesn't match what the test expects (empty if the test passed)
+    def check(self, result):
+        problems = []
+        if result["timed_out"]:
+            return [result["error"]]
+        if self.expected_output is not None and result["output"] != self.expected_output:
+            problems.append(
+                f"expected output {self.expected_output!r} but got {result['output']!r}"
+            )
+        if self.expected_error_type is None:
+            if result["error"] is not None:
+                problems.append(f"unexpected error: {result['error']}")
+            return problems
+        if result["error_type"] != self.expected_error_type:
+            problems.append(
+                f"expected {self.expected_error_type} but got {result['error_type']} ({result['error']})"
+            )
+        elif self.expected_error_line is not None and result["error_line"] != self.expected_error_line:
+            problems.append(
+                f"expected {self.expected_error_type} on line {self.expected_error_line} "
+                f"but it was reported on line {result['error_line']}"
+            )
+        return problems
+
+    # returns a list of lines, or None if the file doesn't exist
+    @staticmethod
+    def __read_lines(path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().splitlines()
+
+
+# runs every test in test_dir on a pool of num_workers processes and returns a list of result dicts
+def run_tests(test_dir, num_workers=None, timeout=10.0, engine=Interpreter.ENGINE_TREE):
+    tests = [BrewinTest(path) for path in sorted(glob.glob(os.path.join(test_dir, "*.brewin")))]
+    pool = WorkerPool(num_workers, timeout, engine=engine)
+
+    def run_one(test):
+        result = pool.execute(test.program, test.inputs)
+        problems = test.check(result)
+        return {
+            "name": test.name,
+            "passed": not problems,
+            "problems": problems,
+            "wall_time": result["wall_time"],
+            "statements_executed": result["statements_executed"],
+            "output": result["output"],
+            "error": result["error"],
+        }
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.num_workers) as executor:
+            return list(executor.map(run_one, tests))
+    finally:
+        pool.shutdown()
+
+
+def write_json_report(results, total_time, path):
+    report = {
+        "tests": len(results),
+        "passed": sum(1 for result in results if result["passed"]),
+        "failed": sum(1 for result in results if not result["passed"]),
+        "total_time": total_time,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def write_junit_report(results, total_time, path):
+    suite = ET.Element(
+        "testsuite",
+        name="brewin",
+        tests=str(len(results)),
+        failures=str(sum(1 for result in results if not result["passed"])),
+        time=f"{total_time:.3f}",
+    )
+    for result in results:
+        case = ET.SubElement(
+            suite,
+            "testcase",
+            classname="brewin",
+            name=result["name"],
+            time=f"{result['wall_time'] or 0:.6f}",
+        )
+        ET.SubElement(case, "properties").append(
+            ET.Element(
+                "property",
+                name="statements_executed",
+                value=str(result["statements_executed"]),
+            )
+        )
+        if not result["passed"]:
+            failure = ET.SubElement(case, "failure", message=result["problems"][0])
+            failure.text = "\n".join(result["problems"])
+        ET.SubElement(case, "system-out").text = "\n".join(result["output"])
+    ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a directory of Brewin test programs in parallel.")
+    parser.add_argument("test_dir", help="directory containing NAME.brewin (+ .in/.exp/.err) files")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-test timeout in seconds")
+    parser.add_argument("--json", default=None, help="write a JSON report to this path")
+    parser.add_argument("--junit", default=None, help="write a JUnit XML report to this path")
+    parser.add_argument("--engine", default=Interpreter.ENGINE_TREE, help="method execution engine (tree, closure, transpile or bytecode)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_tests(args.test_dir, args.workers, args.timeout, args.engine)
+    total_time = time.perf_counter() - start
+
+    for result in results:
+        if not result["passed"]:
+            print(f"FAIL {result['name']}: {'; '.join(result['problems'])}")
+    num_passed = sum(1 for result in results if result["passed"])
+    print(f"{num_passed}/{len(results)} tests passed in {total_time:.2f}s")
+
+    if args.json:
+        write_json_report(results, total_time, args.json)
+    if args.junit:
+        write_junit_report(results, total_time, args.junit)
+    return 0 if num_passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
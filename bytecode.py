@@ -0,0 +1,866 @@
+"""
+Brewin bytecode: a compact, serializable form of method bodies and a stack VM that runs it.
+
+Each MethodDef body compiles into a Code object:
+  instructions  a flat list of ints, two per instruction (opcode, argument)
+  constants     the constant pool: literal Values, Types, operators, call sites and error descriptions,
+                each built from a marshallable descriptor
+  names         the parameter/method/class names the instructions refer to by index (interned); fields are
+                referred to by their offset in ObjectDef.field_values
+  line_table    (instruction offset, line number) pairs, one per change of line; only looked up when an
+                error has to be reported
+Locals and parameters live in numbered slots of a per-call frame, and a Brewin try pushes a handler that
+a throw unwinds to. The VM runs a method and every method it calls in one loop, keeping the frames of
+suspended callers in a list, so deep Brewin recursion is only limited by Interpreter.max_call_depth.
+The VM performs every run-time check of the tree-walking ObjectDef, in the same order, and reports the
+same ErrorType and line number; operators and let checks are shared with closure_engine.
+
+A whole program can be saved as a .bbc file: the class skeletons (fields and method signatures, without
+method bodies), the Code of every method and one interned name table. load_program rebuilds a
+PreparedProgram from it without running the parser; it can only run with the bytecode engine. Templated
+classes keep their full source in the file since their methods are compiled per specialization.
+
+usage: python bytecode.py compile program.brewin [-o program.bbc]
+       python bytecode.py run program.bbc [input ...]
+       python bytecode.py dis program.brewin|program.bbc
+"""
+
+import bisect
+import builtins
+import marshal
+import sys
+from array import array
+
+from closure_engine import (
+    EXCEPTION_VAR_NAME,
+    check_local,
+    get_type_for_name,
+    make_binary_operation,
+    make_unary_operation,
+)
+from intbase import InterpreterBase, ErrorType
+from objectv2 import ObjectDef, InlineCache, BINARY_OP_LIST, UNARY_OP_LIST
+from parse_cache import encode_tree, decode_tree
+from type_valuev2 import Type, Value, create_value, create_default_value, create_int_value
+
+MAGIC = "BBC"
+FORMAT_VERSION = 3
+
+STATUS_PROCEED = ObjectDef.STATUS_PROCEED
+STATUS_RETURN = ObjectDef.STATUS_RETURN
+STATUS_EXCEPTION_THROWN = ObjectDef.STATUS_EXCEPTION_THROWN
+
+INT_TYPE_CONST = ObjectDef.INT_TYPE_CONST
+STRING_TYPE_CONST = ObjectDef.STRING_TYPE_CONST
+BOOL_TYPE_CONST = ObjectDef.BOOL_TYPE_CONST
+
+# opcodes; the argument of an instruction is 0 when it isn't used
+COUNT = 1  # one statement starts executing
+LOAD_LOCAL = 2  # push slots[arg], with null typed as the local
+LOAD_FIELD = 3  # push the field at offset arg of ObjectDef.field_values, with null typed as the field
+LOAD_CONST = 4  # push constants[arg]
+LOAD_ME = 5  # push me
+LOAD_NONE = 6  # push None (the tree walker's value for an unknown expression)
+STORE_LOCAL = 7  # pop a value, check it against the type of slots[arg] and store it
+STORE_FIELD = 8  # pop a value, check it against the type of the field at offset arg and store it
+INIT_LOCAL = 9  # pop a value into slots[arg] without a check (let defaults, the caught exception)
+BINARY_OP = 10  # pop two operands, push constants[arg](operand1, operand2)
+UNARY_OP = 11  # pop an operand, push constants[arg](operand)
+NEW = 12  # push a new object; constants[arg] is (Type, class name, line)
+LOAD_TARGET_ME = 13  # push the object a (call me ...) is made on
+LOAD_TARGET_SUPER = 14  # push the super object, or report a call to super without one
+DEREFERENCE = 15  # pop an object reference Value, push the object or report a null dereference
+JUMP_IF_THROWN = 16  # jump to arg if the top of the stack is a thrown exception (it stays on the stack)
+DISCARD_BELOW = 17  # keep the top of the stack but pop the arg items below it
+CALL = 18  # constants[arg] is (method name, number of args, super_only, line, InlineCache); pop args and target
+POP = 19
+THROW_IF_THROWN = 20  # if the top of the stack is a thrown exception, pop it and throw it
+CHECK_CONDITION = 21  # report a non-bool top of the stack; constants[arg] is the failure
+POP_JUMP_IF_FALSE = 22
+JUMP = 23
+RETURN_NOTHING = 24
+RETURN_VALUE = 25  # pop the value, check it against the return type and return it
+PRINT = 26  # pop arg values and print them
+INPUT_STRING = 27
+INPUT_INT = 28
+THROW = 29  # pop a string Value and throw it; arg is 1 if it may be a thrown exception from a call
+SETUP_TRY = 30  # a try statement starts; a throw until the matching POP_TRY jumps to arg
+POP_TRY = 31
+FAIL = 32  # report an error or crash; constants[arg] is the failure
+END = 33  # the end of the body was reached without a return statement
+
+OPCODE_NAMES = {
+    value: name for name, value in list(globals().items()) if name.isupper() and type(value) is int
+    and name not in ("FORMAT_VERSION", "STATUS_PROCEED", "STATUS_RETURN", "STATUS_EXCEPTION_THROWN")
+}
+JUMP_OPCODES = {JUMP_IF_THROWN, POP_JUMP_IF_FALSE, JUMP, SETUP_TRY}
+
+
+# returns the compiled body of method_def (a member of class_def), compiling it on first use.
+# the result is a function (obj, args) -> (status, return_value), where args are the argument Values
+def compile_method(class_def, method_def):
+    return get_code(class_def, method_def).run
+
+
+# returns the Code of method_def (a member of class_def), compiling it on first use
+def get_code(class_def, method_def):
+    code = method_def.bytecode
+    if code is None:
+        code = MethodCompiler(class_def, method_def).compile()
+        method_def.bytecode = code
+    return code
+
+
+# descriptors only hold plain strs, since marshal can't store the parser's tokens
+def describe_type(var_type):
+    return ("type",) + tuple(
+        None if name is None else str(name)
+        for name in (var_type.type_name, var_type.supertype_name, var_type.full_name)
+    )
+
+
+# a failure: ("error", error type name, description, line) or ("crash", exception class name, message)
+def describe_crash(exception):
+    return ("crash", type(exception).__name__, str(exception))
+
+
+# builds the run-time constant for a constant pool descriptor; names is the Code's name table
+def make_constant(descriptor, names):
+    kind = descriptor[0]
+    if kind == "value":
+        return create_value(descriptor[1])
+    if kind == "default":
+        return create_default_value(make_constant(descriptor[1], names))
+    if kind == "type":
+        return Type(*descriptor[1:])
+    if kind == "binary":
+        return make_binary_operation(descriptor[1], descriptor[2])
+    if kind == "unary":
+        return make_unary_operation(descriptor[1], descriptor[2])
+    if kind == "new":
+        return make_constant(descriptor[1], names), names[descriptor[2]], descriptor[3]
+    if kind == "call":
+        return names[descriptor[1]], descriptor[2], descriptor[3], descriptor[4], InlineCache()
+    if kind == "error":
+        return ErrorType[descriptor[1]], descriptor[2], descriptor[3]
+    if kind == "crash":
+        return getattr(builtins, descriptor[1]), descriptor[2]
+    raise ValueError(f"unknown constant {descriptor!r}")
+
+
+# reports a failure constant built from an "error" or "crash" descriptor
+def fail(interpreter, failure):
+    if len(failure) == 3:
+        interpreter.error(*failure)
+    raise failure[0](failure[1])
+
+
+class Code:
+    def __init__(self, instructions, descriptors, names, num_params, num_slots, local_types,
+                 return_type, line_table):
+        self.instructions = instructions
+        self.descriptors = descriptors
+        self.names = [sys.intern(name) for name in names]
+        self.constants = [make_constant(descriptor, self.names) for descriptor in descriptors]
+        self.num_params = num_params
+        self.num_slots = num_slots
+        self.local_types = local_types  # constant index of the Type of each slot
+        self.slot_types = [self.constants[index] for index in local_types]
+        self.return_type = return_type  # constant index
+        self.line_table = line_table
+        self.local_slots = [None] * (num_slots - num_params)  # appended to the arguments by run
+        self.line_offsets = [offset for offset, _ in line_table]
+
+    # returns the line of the instruction starting at offset
+    def get_line(self, offset):
+        index = bisect.bisect_right(self.line_offsets, offset) - 1
+        return self.line_table[index][1] if index >= 0 else None
+
+    # the VM: runs the body on obj with args, the argument Values; returns (status, return_value)
+    # the methods it calls run in the same loop: a call suspends the caller's frame on a list and the
+    # callee's return resumes it, so Brewin calls don't nest Python frames, and the call depth is only
+    # limited by Interpreter.max_call_depth
+    def run(self, obj, args):
+        interpreter = obj.interpreter
+        max_call_depth = interpreter.max_call_depth
+        memos = interpreter.memos
+        frames = []  # (code, obj, slots, stack, handlers, pc, memo) of every suspended caller, innermost last
+        memo = None  # (MethodMemo, key, statements executed before the call) if the frame runs a memoized call
+        code = self
+        slots = args  # the parameters take the first slots; see ObjectDef.call_method
+        slots.extend(self.local_slots)
+        stack = []
+        handlers = []  # (handler offset, stack depth) of every try being executed, innermost last
+        pc = 0
+        while True:
+            instructions = code.instructions
+            constants = code.constants
+            slot_types = code.slot_types
+            push = stack.append
+            pop = stack.pop
+            callee = None
+            while True:
+                op = instructions[pc]
+                arg = instructions[pc + 1]
+                pc += 2
+                if op == LOAD_LOCAL:
+                    value = slots[arg]
+                    if value.is_null():
+                        value = slot_types[arg].null_value
+                    push(value)
+                elif op == COUNT:
+                    interpreter.statements_executed += 1
+                elif op == LOAD_CONST:
+                    push(constants[arg])
+                elif op == LOAD_FIELD:
+                    value = obj.field_values[arg]
+                    if value.is_null():
+                        value = obj.class_def.field_types[arg].null_value
+                    push(value)
+                elif op == BINARY_OP:
+                    operand2 = pop()
+                    stack[-1] = constants[arg](stack[-1], operand2, obj)
+                elif op == THROW_IF_THROWN:
+                    if type(stack[-1]) is tuple:
+                        thrown = pop()[1]
+                        if not handlers:
+                            status, result = STATUS_EXCEPTION_THROWN, thrown
+                            break
+                        pc, depth = handlers.pop()
+                        del stack[depth:]
+                        push(thrown)
+                elif op == CHECK_CONDITION:
+                    if stack[-1].type() != BOOL_TYPE_CONST:
+                        fail(interpreter, constants[arg])
+                elif op == POP_JUMP_IF_FALSE:
+                    if not pop().value():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == CALL:
+                    method_name, num_args, super_only, line_num, inline_cache = constants[arg]
+                    if num_args:
+                        actual_args = stack[-num_args:]
+                        del stack[-num_args:]
+                    else:
+                        actual_args = []
+                    target = stack[-1]
+                    if inline_cache.inlined is not None:
+                        value = inline_cache.call_inlined(target, actual_args)
+                        if value is not None:
+                            stack[-1] = value
+                            continue
+                    # the same dispatch as ObjectDef.call_method
+                    callee = inline_cache.lookup(target, method_name, actual_args, super_only, line_num)
+                    pop()
+                    break
+                elif op == LOAD_TARGET_ME:
+                    push(obj)
+                elif op == STORE_LOCAL:
+                    value = pop()
+                    var_type = slot_types[arg]
+                    if not interpreter.check_type_compatibility(var_type, value.type(), True):
+                        interpreter.error(
+                            ErrorType.TYPE_ERROR,
+                            f"type mismatch {var_type.type_name} and {value.type().type_name}",
+                            code.get_line(pc - 2),
+                        )
+                    slots[arg] = value
+                elif op == STORE_FIELD:
+                    value = pop()
+                    field_type = obj.class_def.field_types[arg]
+                    if not interpreter.check_type_compatibility(field_type, value.type(), True):
+                        interpreter.error(
+                            ErrorType.TYPE_ERROR,
+                            f"type mismatch {field_type.type_name} and {value.type().type_name}",
+                            code.get_line(pc - 2),
+                        )
+                    obj.field_values[arg] = value
+                elif op == RETURN_VALUE:
+                    result = pop()
+                    return_type = constants[code.return_type]
+                    if result.is_typeless_null():
+                        if not interpreter.check_type_compatibility(return_type, result.type(), True):
+                            interpreter.error(
+                                ErrorType.TYPE_ERROR,
+                                f"type mismatch {return_type.type_name} and {result.type().type_name}",
+                                code.get_line(pc - 2),
+                            )
+                        result = return_type.null_value  # propagate return type to null
+                    if not interpreter.check_type_compatibility(return_type, result.type(), True):
+                        interpreter.error(
+                            ErrorType.TYPE_ERROR,
+                            f"type mismatch {return_type.type_name} and {result.type().type_name}",
+                            code.get_line(pc - 2),
+                        )
+                    status, result = STATUS_RETURN, result
+                    break
+                elif op == RETURN_NOTHING:
+                    status, result = STATUS_RETURN, None
+                    break
+                elif op == POP:
+                    pop()
+                elif op == LOAD_ME:
+                    push(obj.get_me_as_value())
+                elif op == UNARY_OP:
+                    stack[-1] = constants[arg](stack[-1], obj)
+                elif op == DEREFERENCE:
+                    obj_val = stack[-1]
+                    if obj_val.is_null():
+                        interpreter.error(ErrorType.FAULT_ERROR, "null dereference", code.get_line(pc - 2))
+                    stack[-1] = obj_val.value()
+                elif op == JUMP_IF_THROWN:
+                    if type(stack[-1]) is tuple:
+                        pc = arg
+                elif op == DISCARD_BELOW:
+                    del stack[-1 - arg:-1]
+                elif op == INIT_LOCAL:
+                    slots[arg] = pop()
+                elif op == NEW:
+                    class_type, class_name, line_num = constants[arg]
+                    push(Value(class_type, interpreter.instantiate(class_name, line_num)))
+                elif op == PRINT:
+                    output = ""
+                    for term in stack[len(stack) - arg:]:
+                        val = term.value()
+                        if term.type() == BOOL_TYPE_CONST:
+                            if val == True:
+                                val = "true"
+                            else:
+                                val = "false"
+                        output += str(val)
+                    del stack[len(stack) - arg:]
+                    interpreter.output(output)
+                elif op == SETUP_TRY:
+                    handlers.append((arg, len(stack)))
+                elif op == POP_TRY:
+                    handlers.pop()
+                elif op == THROW:
+                    term = pop()
+                    if arg:
+                        term.value()  # the tree walker crashes here if the expression threw
+                    if term.type() != STRING_TYPE_CONST:
+                        interpreter.error(
+                            ErrorType.TYPE_ERROR, "throwing a non string error", code.get_line(pc - 2)
+                        )
+                    if not handlers:
+                        status, result = STATUS_EXCEPTION_THROWN, term
+                        break
+                    pc, depth = handlers.pop()
+                    del stack[depth:]
+                    push(term)
+                elif op == LOAD_TARGET_SUPER:
+                    if not obj.super_object:
+                        interpreter.error(
+                            ErrorType.TYPE_ERROR,
+                            "invalid call to super object by class " + obj.class_def.get_name(),
+                            code.get_line(pc - 2),
+                        )
+                    push(obj.super_object)
+                elif op == INPUT_STRING:
+                    push(Value(STRING_TYPE_CONST, interpreter.get_input()))
+                elif op == INPUT_INT:
+                    push(create_int_value(int(interpreter.get_input())))
+                elif op == LOAD_NONE:
+                    push(None)
+                elif op == FAIL:
+                    fail(interpreter, constants[arg])
+                elif op == END:
+                    status, result = STATUS_PROCEED, None
+                    break
+                else:
+                    raise ValueError(f"bad opcode {op} at offset {pc - 2}")
+
+            if callee is not None:  # a call: suspend this frame and start the callee's
+                method_def = callee.class_def.method_map[method_name]
+                callee_memo = None
+                if memos and method_def in memos:  # a pure method, see memo.py
+                    method_memo = memos[method_def]
+                    key, result = method_memo.lookup(callee, actual_args)
+                    if result is not None:
+                        stack.append(result)
+                        continue
+                    # a miss runs in a frame like any call, and is remembered when the frame returns
+                    callee_memo = (method_memo, key, interpreter.statements_executed)
+                if len(frames) >= max_call_depth:
+                    raise RecursionError("maximum Brewin call depth exceeded")
+                frames.append((code, obj, slots, stack, handlers, pc, memo))
+                memo = callee_memo
+                obj = callee
+                code = method_def.bytecode
+                if code is None:
+                    code = get_code(obj.class_def, method_def)
+                slots = actual_args
+                slots.extend(code.local_slots)
+                stack = []
+                handlers = []
+                pc = 0
+                continue
+            if not frames:
+                return status, result
+            # the frame returned: resume the caller with the value ObjectDef.call_method would return
+            if status == STATUS_EXCEPTION_THROWN:
+                result = (status, result)
+            elif status != STATUS_RETURN or result is None:
+                result = create_default_value(code.constants[code.return_type])
+            if memo is not None:
+                memo[0].remember(memo[1], result, interpreter.statements_executed - memo[2])
+            code, obj, slots, stack, handlers, pc, memo = frames.pop()
+            stack.append(result)
+
+    # returns a list of lines, one per instruction
+    def disassemble(self):
+        lines = []
+        for offset in range(0, len(self.instructions), 2):
+            op, arg = self.instructions[offset], self.instructions[offset + 1]
+            name = OPCODE_NAMES.get(op, str(op))
+            if op in (LOAD_CONST, BINARY_OP, UNARY_OP, NEW, CALL, CHECK_CONDITION, FAIL):
+                detail = repr(self.descriptors[arg])
+            elif op in JUMP_OPCODES:
+                detail = f"-> {arg}"
+            else:
+                detail = str(arg)
+            lines.append(f"{offset:6} {str(self.get_line(offset)):>5}  {name:18} {detail}")
+        return lines
+
+    # returns a marshallable tuple; name_index maps every name to its index in the program's name table
+    def to_tuple(self, name_index):
+        return (
+            array("i", self.instructions).tobytes(),
+            self.descriptors,
+            [name_index.setdefault(name, len(name_index)) for name in self.names],
+            self.num_params,
+            self.num_slots,
+            self.local_types,
+            self.return_type,
+            self.line_table,
+        )
+
+    @staticmethod
+    def from_tuple(data, names):
+        instructions = array("i")
+        instructions.frombytes(data[0])
+        return Code(
+            instructions.tolist(), data[1], [names[i] for i in data[2]], *data[3:]
+        )
+
+
+# compiles one method body into a Code
+class MethodCompiler:
+    def __init__(self, class_def, method_def):
+        self.interpreter = class_def.interpreter  # only used for compile-time type queries
+        self.field_index = class_def.field_index  # field name -> offset in ObjectDef.field_values
+        self.method_def = method_def
+        self.instructions = []  # [opcode, argument, line] while compiling; jump arguments are labels
+        self.labels = []  # label -> instruction index
+        self.descriptors = []
+        self.descriptor_index = {}
+        self.names = []
+        self.name_index = {}
+        self.local_types = []
+        # Brewin name -> slot, one dict per nested block
+        self.scopes = [{}]
+        for param in method_def.get_formal_params():
+            self.scopes[0][param.name] = self.__new_slot(param.type)
+        self.num_params = len(self.local_types)
+
+    def compile(self):
+        self.statement(self.method_def.get_code())
+        self.__emit(END)
+        instructions = []
+        line_table = []
+        for op, arg, line_num in self.instructions:
+            if op in JUMP_OPCODES:
+                arg = self.labels[arg] * 2
+            if not line_table or line_table[-1][1] != line_num:
+                line_table.append((len(instructions), line_num))
+            instructions.append(op)
+            instructions.append(arg)
+        return Code(
+            instructions,
+            self.descriptors,
+            self.names,
+            self.num_params,
+            len(self.local_types),
+            self.local_types,
+            self.__constant(describe_type(self.method_def.get_return_type())),
+            line_table,
+        )
+
+    def __emit(self, op, arg=0, line_num=None):
+        self.instructions.append([op, arg, line_num])
+
+    def __new_label(self):
+        self.labels.append(None)
+        return len(self.labels) - 1
+
+    def __place_label(self, label):
+        self.labels[label] = len(self.instructions)
+
+    def __constant(self, descriptor):
+        index = self.descriptor_index.get(descriptor)
+        if index is None:
+            index = len(self.descriptors)
+            self.descriptors.append(descriptor)
+            self.descriptor_index[descriptor] = index
+        return index
+
+    def __name(self, name):
+        name = str(name)
+        index = self.name_index.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self.name_index[name] = index
+        return index
+
+    def __new_slot(self, var_type):
+        self.local_types.append(self.__constant(describe_type(var_type)))
+        return len(self.local_types) - 1
+
+    def __find_local(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    # compiles a statement; malformed source is compiled into a crash like the tree walker's
+    def statement(self, code):
+        num_instructions, num_scopes = len(self.instructions), len(self.scopes)
+        try:
+            self.__statement(code)
+        except (IndexError, TypeError, AttributeError) as e:
+            del self.instructions[num_instructions:]
+            del self.scopes[num_scopes:]
+            self.__emit(FAIL, self.__constant(describe_crash(e)))
+
+    def __statement(self, code):
+        tok = code[0]
+        line_num = tok.line_num
+        if tok == InterpreterBase.BEGIN_DEF:
+            self.__emit(COUNT, 0, line_num)
+            for statement in code[1:]:
+                self.statement(statement)
+        elif tok == InterpreterBase.SET_DEF:
+            self.__emit(COUNT, 0, line_num)
+            self.__value(code[2], line_num)
+            self.__store(code[1], line_num)
+        elif tok == InterpreterBase.IF_DEF:
+            self.__if(code, line_num)
+        elif tok == InterpreterBase.CALL_DEF:
+            self.__emit(COUNT, 0, line_num)
+            self.__call(code, line_num)
+            self.__emit(THROW_IF_THROWN, 0, line_num)
+            self.__emit(POP, 0, line_num)
+        elif tok == InterpreterBase.WHILE_DEF:
+            self.__while(code, line_num)
+        elif tok == InterpreterBase.RETURN_DEF:
+            self.__emit(COUNT, 0, line_num)
+            if len(code) == 1:
+                self.__emit(RETURN_NOTHING, 0, line_num)
+            else:
+                self.__value(code[1], line_num)
+                self.__emit(RETURN_VALUE, 0, line_num)
+        elif tok == InterpreterBase.INPUT_STRING_DEF or tok == InterpreterBase.INPUT_INT_DEF:
+            self.__emit(COUNT, 0, line_num)
+            self.__emit(INPUT_STRING if tok == InterpreterBase.INPUT_STRING_DEF else INPUT_INT, 0, line_num)
+            self.__store(code[1], line_num)
+        elif tok == InterpreterBase.PRINT_DEF:
+            self.__emit(COUNT, 0, line_num)
+            for expr in code[1:]:
+                self.__value(expr, line_num)
+            self.__emit(PRINT, len(code) - 1, line_num)
+        elif tok == InterpreterBase.LET_DEF:
+            self.__let(code, line_num)
+        elif tok == InterpreterBase.THROW_DEF:
+            self.__emit(COUNT, 0, line_num)
+            has_call = self.__expression(code[1], line_num)
+            self.__emit(THROW, int(has_call), line_num)
+        elif tok == InterpreterBase.TRY_DEF:
+            self.__try(code, line_num)
+        else:
+            self.__fail(ErrorType.SYNTAX_ERROR, "unknown statement " + tok, line_num)
+
+    def __fail(self, error_type, description, line_num):
+        self.__emit(FAIL, self.__constant(("error", error_type.name, str(description), line_num)), line_num)
+
+    # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+    def __let(self, code, line_num):
+        self.__emit(COUNT, 0, line_num)
+        scope = {}
+        for var_def in code[1]:
+            problem = check_local(self.interpreter, var_def, scope, line_num)
+            if isinstance(problem, Exception):
+                self.__emit(FAIL, self.__constant(describe_crash(problem)), line_num)
+                break
+            if problem is not None:
+                self.__fail(*problem)
+                break
+            var_type = get_type_for_name(var_def[0])
+            if len(var_def) == 3:
+                default_value = ("value", str(var_def[2]))
+            else:
+                default_value = ("default", describe_type(var_type))
+            slot = self.__new_slot(var_type)
+            self.__emit(LOAD_CONST, self.__constant(default_value), line_num)
+            self.__emit(INIT_LOCAL, slot, line_num)
+            scope[var_def[1]] = slot
+
+        self.scopes.append(scope)
+        try:
+            for statement in code[2:]:
+                self.statement(statement)
+        finally:
+            self.scopes.pop()
+
+    # stores the value on top of the stack into the local/parameter or field var_name
+    def __store(self, var_name, line_num):
+        slot = self.__find_local(var_name)
+        if slot is not None:
+            self.__emit(STORE_LOCAL, slot, line_num)
+        elif var_name in self.field_index:
+            self.__emit(STORE_FIELD, self.field_index[var_name], line_num)
+        else:
+            self.__fail(ErrorType.NAME_ERROR, "unknown field/variable " + var_name, line_num)
+
+    # leaves the condition on the stack and checks that it's a bool, like the tree walker's if and while
+    def __condition(self, expr, statement_name, line_num):
+        try:
+            failure = (
+                "error",
+                ErrorType.TYPE_ERROR.name,
+                f"non-boolean {statement_name} condition " + ' '.join(x for x in expr),
+                line_num,
+            )
+        except TypeError as e:  # the tree walker crashes building the message for a nested expression
+            failure = describe_crash(e)
+        self.__emit(CHECK_CONDITION, self.__constant(failure), line_num)
+
+    # (if expression (statement) (statement))
+    def __if(self, code, line_num):
+        self.__emit(COUNT, 0, line_num)
+        self.__value(code[1], line_num)
+        self.__condition(code[1], "if", line_num)
+        if_false = self.__new_label()
+        self.__emit(POP_JUMP_IF_FALSE, if_false, line_num)
+        self.statement(code[2])
+        if len(code) == 4:
+            end = self.__new_label()
+            self.__emit(JUMP, end, line_num)
+            self.__place_label(if_false)
+            self.statement(code[3])
+            self.__place_label(end)
+        else:
+            self.__place_label(if_false)
+
+    # (while expression (statement))
+    def __while(self, code, line_num):
+        self.__emit(COUNT, 0, line_num)
+        start = self.__new_label()
+        end = self.__new_label()
+        self.__place_label(start)
+        self.__value(code[1], line_num)
+        self.__condition(code[1], "while", line_num)
+        self.__emit(POP_JUMP_IF_FALSE, end, line_num)
+        self.statement(code[2])
+        self.__emit(JUMP, start, line_num)
+        self.__place_label(end)
+
+    # (try (statement) (catch statement)); the catch statement sees the thrown string as "exception"
+    def __try(self, code, line_num):
+        self.__emit(COUNT, 0, line_num)
+        catch = self.__new_label()
+        end = self.__new_label()
+        self.__emit(SETUP_TRY, catch, line_num)
+        self.statement(code[1])
+        self.__emit(POP_TRY, 0, line_num)
+        self.__emit(JUMP, end, line_num)
+        self.__place_label(catch)
+        slot = self.__new_slot(STRING_TYPE_CONST)
+        self.__emit(INIT_LOCAL, slot, line_num)
+        self.scopes.append({EXCEPTION_VAR_NAME: slot})
+        try:
+            self.statement(code[2])
+        finally:
+            self.scopes.pop()
+        self.__place_label(end)
+
+    # pushes the Value of expr; a call that threw is thrown
+    def __value(self, expr, line_num):
+        if self.__expression(expr, line_num):
+            self.__emit(THROW_IF_THROWN, 0, line_num)
+
+    # pushes the Value of expr, or a thrown exception, which is only possible if the result is true
+    def __expression(self, expr, line_num):
+        if type(expr) is not list:
+            self.__name_or_constant(expr, line_num)
+            return False
+        operator = expr[0]
+        if operator in BINARY_OP_LIST:
+            left_call = self.__expression(expr[1], line_num)
+            right_call = self.__expression(expr[2], line_num)
+            self.__emit(BINARY_OP, self.__constant(("binary", str(operator), line_num)), line_num)
+            return left_call or right_call
+        if operator in UNARY_OP_LIST:
+            has_call = self.__expression(expr[1], line_num)
+            self.__emit(UNARY_OP, self.__constant(("unary", str(operator), line_num)), line_num)
+            return has_call
+        if operator == InterpreterBase.CALL_DEF:
+            self.__call(expr, line_num)
+            return True
+        if operator == InterpreterBase.NEW_DEF:
+            descriptor = ("new", describe_type(get_type_for_name(expr[1])), self.__name(expr[1]), line_num)
+            self.__emit(NEW, self.__constant(descriptor), line_num)
+            return False
+        self.__emit(LOAD_NONE, 0, line_num)
+        return False
+
+    # locals shadow fields, which shadow constants, which shadow me
+    def __name_or_constant(self, expr, line_num):
+        slot = self.__find_local(expr)
+        if slot is not None:
+            self.__emit(LOAD_LOCAL, slot, line_num)
+        elif expr in self.field_index:
+            self.__emit(LOAD_FIELD, self.field_index[expr], line_num)
+        elif create_value(expr) is not None:
+            self.__emit(LOAD_CONST, self.__constant(("value", str(expr))), line_num)
+        elif expr == InterpreterBase.ME_DEF:
+            self.__emit(LOAD_ME, 0, line_num)
+        else:
+            self.__fail(ErrorType.NAME_ERROR, "invalid field or parameter " + expr, line_num)
+            self.__emit(LOAD_NONE, 0, line_num)
+
+    # (call object_ref/me/super methodname p1 p2 p3); pushes the result
+    def __call(self, code, line_num):
+        obj_name = code[1]
+        args = code[3:]
+        if obj_name == InterpreterBase.ME_DEF:
+            self.__emit(LOAD_TARGET_ME, 0, line_num)
+        elif obj_name == InterpreterBase.SUPER_DEF:
+            self.__emit(LOAD_TARGET_SUPER, 0, line_num)
+        else:
+            self.__expression(obj_name, line_num)
+            self.__emit(DEREFERENCE, 0, line_num)
+
+        # each argument is evaluated exactly once. If an argument with a call threw, that is the result of
+        # the call and the target and earlier arguments are dropped
+        thrown_labels = []
+        for i, arg in enumerate(args):
+            if self.__expression(arg, line_num):
+                thrown = self.__new_label()
+                thrown_labels.append((thrown, i + 1))
+                self.__emit(JUMP_IF_THROWN, thrown, line_num)
+        descriptor = (
+            "call",
+            self.__name(code[2]),
+            len(args),
+            obj_name == InterpreterBase.SUPER_DEF,
+            line_num,
+        )
+        self.__emit(CALL, self.__constant(descriptor), line_num)
+        if thrown_labels:
+            end = self.__new_label()
+            self.__emit(JUMP, end, line_num)
+            for thrown, num_below in thrown_labels:
+                self.__place_label(thrown)
+                self.__emit(DISCARD_BELOW, num_below, line_num)
+                self.__emit(JUMP, end, line_num)
+            self.__place_label(end)
+
+
+# compiles every method of the program's non-templated classes, so they can be saved
+def compile_program(prepared):
+    for class_def in prepared.class_index.values():
+        if not class_def.template:
+            for method_def in class_def.get_methods():
+                compile_method(class_def, method_def)
+
+
+# saves a prepared program (see Interpreter.prepare) as a .bbc file
+def save_program(prepared, path):
+    compile_program(prepared)
+    name_index = {}
+    codes = {}
+    skeleton = []
+    for item in prepared.parsed_program:
+        if item[0] != InterpreterBase.CLASS_DEF:
+            skeleton.append(item)  # templated classes are compiled per specialization, at run time
+            continue
+        # [method return_type method_name [params] [statement]]: the statement is replaced by its Code
+        skeleton.append(
+            [
+                member[:4] + [[]]
+                if type(member) is list and member[0] == InterpreterBase.METHOD_DEF else member
+                for member in item
+            ]
+        )
+        class_def = prepared.class_index[item[1]]
+        codes[str(item[1])] = {
+            str(method_def.method_name): method_def.bytecode.to_tuple(name_index)
+            for method_def in class_def.get_methods()
+        }
+    token_table, tree = encode_tree(skeleton)
+    names = sorted(name_index, key=name_index.get)
+    with open(path, "wb") as f:
+        marshal.dump((MAGIC, FORMAT_VERSION, token_table, tree, names, codes), f)
+
+
+# loads a .bbc file into a PreparedProgram for interpreter (which reports any error in the program)
+def load_program(path, interpreter):
+    with open(path, "rb") as f:
+        data = marshal.load(f)
+    if type(data) is not tuple or len(data) != 6 or data[0] != MAGIC:
+        raise ValueError(f"{path} is not a Brewin bytecode file")
+    _, version, token_table, tree, names, codes = data
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has bytecode format {version}, expected {FORMAT_VERSION}")
+    prepared = interpreter.prepare_parsed(decode_tree(token_table, tree))
+    for class_name, methods in codes.items():
+        class_def = prepared.class_index[class_name]
+        for method_def in class_def.get_methods():
+            method_def.bytecode = Code.from_tuple(methods[method_def.method_name], names)
+    return prepared
+
+
+def main(argv=None):
+    import argparse
+    from interpreterv3 import Interpreter
+
+    parser = argparse.ArgumentParser(description="Compile, run or disassemble Brewin bytecode.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_parser = subparsers.add_parser("compile", help="compile a .brewin file into a .bbc file")
+    compile_parser.add_argument("program")
+    compile_parser.add_argument("-o", "--output", default=None)
+    run_parser = subparsers.add_parser("run", help="run a .bbc file")
+    run_parser.add_argument("program")
+    run_parser.add_argument("inputs", nargs="*", help="input lines for inputi/inputs")
+    dis_parser = subparsers.add_parser("dis", help="disassemble a .brewin or .bbc file")
+    dis_parser.add_argument("program")
+    args = parser.parse_args(argv)
+
+    interpreter = Interpreter(inp=getattr(args, "inputs", None), engine=Interpreter.ENGINE_BYTECODE)
+    if args.program.endswith(".bbc"):
+        prepared = load_program(args.program, interpreter)
+    else:
+        with open(args.program) as f:
+            prepared = interpreter.prepare(f.read().splitlines())
+
+    if args.command == "compile":
+        output = args.output or args.program.rsplit(".", 1)[0] + ".bbc"
+        save_program(prepared, output)
+        print(f"wrote {output}")
+    elif args.command == "run":
+        interpreter.run_prepared(prepared)
+    else:
+        compile_program(prepared)
+        for class_def in prepared.class_index.values():
+            if class_def.template:
+                continue
+            for method_def in class_def.get_methods():
+                print(f"{class_def.name}.{method_def.method_name}:")
+                print("\n".join(method_def.bytecode.disassemble()))
+                print()
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,9 @@
    a null pointer of type person to a null pointer of type robot
 """
 
+import copy
+import optimizer
+from bparser import StringWithLineNumber
 from intbase import InterpreterBase, ErrorType
 from type_valuev2 import Type, create_value, create_default_value
 
@@ -65,6 +68,11 @@ class MethodDef:
                 self.return_type = Type(method_source[1])
         self.formal_params = self.__parse_params(method_source[3])
         self.code = method_source[4]
+        self.resolved = None  # the body with every name bound, made lazily by the tree engine (see resolver.py)
+        self.closure_body = None  # compiled lazily by the closure engine (see closure_engine.py)
+        self.transpiled_body = None  # set by the transpile engine (see transpiler.py)
+        self.bytecode = None  # compiled lazily by the bytecode engine (see bytecode.py)
+        self.inlined = None  # whether calls can be inlined, worked out lazily by InlineCache (see objectv2.py)
 
     def get_method_name(self):
         return self.method_name
@@ -84,7 +92,6 @@ class MethodDef:
     def __parse_params(self, params):
         formal_params = []
         for param in params:
-            print(param)
             if '@' in param[0]:
                 var_def = VariableDef(Type(param[0][:param[0].find('@')], full_name=param[0]), param[1])
             else:
@@ -103,31 +110,54 @@ class ClassDef:
         self.name = class_source[1]
         self.class_source = class_source
         self.template = False
+        self.full_name = None  # set to e.g. Foo@int@string on specialized templated classes
         self.fields_and_methods_start_index = (
             self.__check_for_inheritance_and_set_superclass_info(class_source)
         )
+        # number of superclasses above this class; a part's index in an object's object_parts follows from it
+        self.depth = 0 if self.super_class is None else self.super_class.depth + 1
         self.__create_field_list(class_source[self.fields_and_methods_start_index:])
         self.__create_method_list(class_source[self.fields_and_methods_start_index:])
+        if not self.template:
+            self.__build_field_layout()
+            self.__build_vtable()
     
+    # returns a new ClassDef for this templated class with every parameterized type replaced by the
+    # matching entry of templated_vars; the template (and its class_source) is left untouched so the
+    # result can be cached and shared by every object of the same signature
+    # interpreter is the one running the program, which reports any errors found while specializing
+    def specialize(self, templated_vars, interpreter=None):
+        specialized = copy.copy(self)
+        if interpreter is not None:
+            specialized.interpreter = interpreter
+        specialized.parameterized_types = dict(self.parameterized_types)
+        specialized.template_instantiation(templated_vars)
+        return specialized
+
     def template_instantiation(self, templated_vars):
-        # print(templated_vars)
         if self.num_parameterized_types != len(templated_vars):
             self.interpreter.error(
                 ErrorType.TYPE_ERROR,
                 "templated class with not all types " + self.name,
                 
             )
-        print("bo", templated_vars)
         for i, typ in enumerate(self.parameterized_types_arr):
             self.parameterized_types[typ] = templated_vars[i]
+        self.full_name = '@'.join([self.name] + list(templated_vars))
+
+        # substitute into copies of the members so the shared class_source is never modified
+        class_body = [
+            self.__substitute_member_types(member)
+            for member in self.class_source[self.fields_and_methods_start_index:]
+        ]
 
         # handle and create all fields
-        self.__template_instantiation_fields(self.class_source[self.fields_and_methods_start_index:])
+        self.__template_instantiation_fields(class_body)
 
         # handle and create all methods
-        self.__template_instantiation_methods(self.class_source[self.fields_and_methods_start_index:])
-        
-        # handle and check all types
+        self.__template_instantiation_methods(class_body)
+        self.__build_field_layout()
+        self.__build_vtable()
     
     def __template_instantiation_fields(self, class_body):
         self.fields = []  # array of VariableDefs with default values set
@@ -142,15 +172,6 @@ class ClassDef:
                         "duplicate field " + member[2],
                         member[0].line_num,
                     )
-                if member[1] in self.parameterized_types:
-                    member[1] = self.parameterized_types[member[1]]
-                if '@' in member[1]:
-                    temp = member[1].split('@')
-                    for t in temp:
-                        if t in self.parameterized_types:
-                            t = self.parameterized_types[t]
-                    member[1] = '@'.join(temp)
-                    
                 var_def = self.__create_variable_def_from_field(member)
                 self.fields.append(var_def)
                 self.field_map[member[2]] = var_def
@@ -162,13 +183,6 @@ class ClassDef:
         methods_defined_so_far = set()
         for member in class_body:
             if member[0] == InterpreterBase.METHOD_DEF:
-                print("bob", self.parameterized_types)
-                if member[1] in self.parameterized_types:
-                    member[1] = self.parameterized_types[member[1]]
-                for param in member[3]:
-                    if param[0] in self.parameterized_types:
-                        param[0] = self.parameterized_types[param[0]]
-                print(member)
                 method_def = MethodDef(member)
                 if method_def.method_name in methods_defined_so_far:  # redefinition
                     self.interpreter.error(
@@ -180,6 +194,48 @@ class ClassDef:
                 self.methods.append(method_def)
                 self.method_map[method_def.method_name] = method_def
                 methods_defined_so_far.add(method_def.method_name)
+
+    # returns a type name with the parameterized types replaced, e.g., pair@a@b -> pair@int@string
+    def __substitute_type_name(self, typename):
+        parts = typename.split('@')
+        substituted = [self.parameterized_types.get(part, part) for part in parts]
+        if substituted == parts:
+            return typename
+        return StringWithLineNumber('@'.join(substituted), getattr(typename, "line_num", None))
+
+    # [field typename varname default_value] or [method return_type method_name [params] [statement]]
+    # returns a copy of the member with types substituted; only type positions are rewritten since
+    # a variable may share its name with a parameterized type
+    def __substitute_member_types(self, member):
+        if member[0] == InterpreterBase.FIELD_DEF:
+            return [member[0], self.__substitute_type_name(member[1])] + member[2:]
+        if member[0] == InterpreterBase.METHOD_DEF:
+            params = [
+                [self.__substitute_type_name(param[0])] + param[1:] for param in member[3]
+            ]
+            return [
+                member[0],
+                self.__substitute_type_name(member[1]),
+                member[2],
+                params,
+                self.__substitute_statement_types(member[4]),
+            ]
+        return member
+
+    # types appear in statements as let variable types, (let ((type var val) ...) ...), and as
+    # the class name of (new classname)
+    def __substitute_statement_types(self, code):
+        if type(code) is not list:
+            return code
+        if code and code[0] == InterpreterBase.NEW_DEF:
+            return [code[0], self.__substitute_type_name(code[1])] + code[2:]
+        substituted = [self.__substitute_statement_types(item) for item in code]
+        if code and code[0] == InterpreterBase.LET_DEF:
+            substituted[1] = [
+                [self.__substitute_type_name(var_def[0])] + var_def[1:]
+                for var_def in code[1]
+            ]
+        return substituted
                 
     def __check_all_types_templates(self):
         return 1
@@ -344,6 +400,44 @@ class ClassDef:
                 self.method_map[method_def.method_name] = method_def
                 methods_defined_so_far.add(method_def.method_name)
 
+    # lays out the fields of this class and all of its superclasses in one list, superclass fields first, so
+    # that every object keeps all of its fields in a single list (shared by its parts) at fixed offsets:
+    # field_index maps the names of this class's fields to their offsets, field_types holds the declared
+    # Type at every offset and field_defaults the initial Value at every offset
+    def __build_field_layout(self):
+        if self.super_class is None:
+            field_types = []
+            field_defaults = []
+        else:
+            field_types = list(self.super_class.field_types)
+            field_defaults = list(self.super_class.field_defaults)
+        self.field_index = {}
+        for var_def in self.fields:
+            self.field_index[var_def.name] = len(field_types)
+            field_types.append(var_def.type)
+            field_defaults.append(var_def.value)
+        self.field_types = tuple(field_types)
+        self.field_defaults = tuple(field_defaults)
+
+    # builds the flattened virtual method table, which maps (method name, # of params) to a tuple of
+    # (depth, method_def, formal param types) with the most derived method first; depth is the number of
+    # superclass links from this class to the class defining the method. Dispatch takes the first entry
+    # whose formal types accept the arguments, so an inherited method that this class overrides with the
+    # same formal types can never be chosen and is left out.
+    def __build_vtable(self):
+        vtable = {}
+        for method_def in self.methods:
+            formal_types = tuple(param.type for param in method_def.formal_params)
+            vtable[(method_def.method_name, len(formal_types))] = [(0, method_def, formal_types)]
+        if self.super_class is not None:
+            for key, inherited in self.super_class.vtable.items():
+                entries = vtable.setdefault(key, [])
+                overridden = get_signature(entries[0][2]) if entries else None
+                for depth, method_def, formal_types in inherited:
+                    if get_signature(formal_types) != overridden:
+                        entries.append((depth + 1, method_def, formal_types))
+        self.vtable = {key: tuple(entries) for key, entries in vtable.items()}
+
     # for a given method, make sure that the parameter types are valid, return type is valid, and param names
     # are not duplicated
     def __check_method_names_and_types(self, method_def):
@@ -370,3 +464,44 @@ class ClassDef:
                     "invalid type for parameter " + param.name,
                     method_def.line_num,
                 )
+
+
+# returns a hashable key for a tuple of formal parameter Types (Type only compares type and supertype names)
+def get_signature(formal_types):
+    return tuple((t.type_name, t.supertype_name, t.full_name) for t in formal_types)
+
+
+# caches one specialized ClassDef per template signature (e.g., Foo@int@string), so every
+# (new Foo@int@string) shares the same ClassDef instead of rebuilding it from the class source
+class TemplateCache:
+    # optimize runs the load-time optimizer (see optimizer.py) on every specialization
+    def __init__(self, optimize=False):
+        self.optimize = optimize
+        self.specializations = {}
+        self.hits = 0
+        self.misses = 0
+
+    # full_name is the complete templated type name and template_def is the ClassDef of the tclass
+    def get(self, full_name, template_def, interpreter=None):
+        class_def = self.specializations.get(full_name)
+        if class_def is not None:
+            self.hits += 1
+            return class_def
+        self.misses += 1
+        class_def = template_def.specialize(full_name.split('@')[1:], interpreter)
+        if self.optimize:
+            optimizer.optimize_class(class_def)
+        self.specializations[full_name] = class_def
+        return class_def
+
+    def clear(self):
+        self.specializations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.specializations),
+        }
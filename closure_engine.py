@@ -0,0 +1,667 @@
+"""
+Closure-compilation engine for method bodies.
+
+Instead of re-walking the parsed lists on every execution like ObjectDef.__execute_statement and
+__evaluate_expression do, each MethodDef body is compiled once into a tree of Python closures. Everything
+that only depends on the source is decided at compile time: which statement or operator a list is, which
+operator lambdas apply, literal Values, whether an identifier is a local/parameter (lexical scope is
+static, so each one gets a slot in a per-call list, the frame), a field of the class, a literal or me, and
+the type checks on let defaults.
+
+The compiled code must behave exactly like the tree-walking engine, including the errors it reports and
+their line numbers, so every check that the tree walker performs at run time is still performed at run
+time (a compile-time decision only selects which check runs). Statement closures return the same
+(status, value) pairs as ObjectDef's __execute_* methods and expression closures return a Value, or a
+(STATUS_EXCEPTION_THROWN, value) tuple when a call threw.
+"""
+
+from intbase import InterpreterBase, ErrorType
+from objectv2 import ObjectDef, InlineCache, BINARY_OP_LIST, UNARY_OP_LIST, BINARY_OPS, UNARY_OPS
+from type_valuev2 import Type, Value, create_value, create_default_value, create_int_value
+
+STATUS_PROCEED = ObjectDef.STATUS_PROCEED
+STATUS_RETURN = ObjectDef.STATUS_RETURN
+STATUS_EXCEPTION_THROWN = ObjectDef.STATUS_EXCEPTION_THROWN
+
+INT_TYPE_CONST = ObjectDef.INT_TYPE_CONST
+STRING_TYPE_CONST = ObjectDef.STRING_TYPE_CONST
+BOOL_TYPE_CONST = ObjectDef.BOOL_TYPE_CONST
+
+EXCEPTION_VAR_NAME = 'exception'  # the variable holding the thrown string inside a catch statement
+
+
+# returns the compiled body of method_def (a member of class_def), compiling it on first use.
+# the result is a function (obj, args) -> (status, return_value), where args are the argument Values
+def compile_method(class_def, method_def):
+    body = method_def.closure_body
+    if body is None:
+        body = MethodCompiler(class_def, method_def).compile()
+        method_def.closure_body = body
+    return body
+
+
+# returns a Type for a type name, e.g., Type("int") or Type("box", full_name="box@int")
+def get_type_for_name(typename):
+    if '@' in typename:
+        return Type(typename[0:typename.find('@')], full_name=typename)
+    return Type(typename)
+
+
+def fail_with_error(error_type, description, line_num):
+    def fail(obj, frame):
+        obj.interpreter.error(error_type, description, line_num)
+
+    return fail
+
+
+# for source that the tree walker would crash on (e.g., a malformed statement); crash the same way, but
+# only when the code actually runs
+def fail_with_exception(exception):
+    def fail(obj, frame):
+        raise exception
+
+    return fail
+
+
+# mirrors the checks (and their order) of ObjectDef.__add_locals_to_env for one local of a let; returns
+# None, an (error_type, description, line_num) triple for the first problem, or the exception the tree
+# walker would crash with
+def check_local(interpreter, var_def, names_so_far, line_num):
+    if '@' in var_def[0] and not interpreter.is_valid_type(var_def[0]):
+        return ErrorType.TYPE_ERROR, "invalid use of templated class", None
+    var_type = get_type_for_name(var_def[0])
+    if len(var_def) == 3:
+        default_value = create_value(var_def[2])
+        if default_value is None:
+            return AttributeError("'NoneType' object has no attribute 'type'")
+    else:
+        default_value = create_default_value(var_type)
+    if not interpreter.check_type_compatibility(var_type, default_value.type(), True):
+        return (
+            ErrorType.TYPE_ERROR,
+            f"type mismatch {var_type.type_name} and {default_value.type().type_name}",
+            line_num,
+        )
+    if var_def[1] in names_so_far:
+        return ErrorType.NAME_ERROR, "duplicate local variable name " + var_def[1], line_num
+    return None
+
+
+# returns a function (operand1, operand2, obj) that applies a binary operator to two evaluated operands
+# exactly like ObjectDef.__evaluate_binary_operation, including passing a thrown exception through
+def make_binary_operation(operator, line_num):
+    int_op = BINARY_OPS[InterpreterBase.INT_DEF].get(operator)
+    string_op = BINARY_OPS[InterpreterBase.STRING_DEF].get(operator)
+    bool_op = BINARY_OPS[InterpreterBase.BOOL_DEF].get(operator)
+    class_op = BINARY_OPS[InterpreterBase.CLASS_DEF].get(operator)
+
+    def apply_binary_operation(operand1, operand2, obj):
+        if type(operand1) is tuple:
+            return operand1
+        if type(operand2) is tuple:
+            return operand2
+        type1 = operand1.type()
+        type2 = operand2.type()
+        if type1 == type2:
+            if type1 == INT_TYPE_CONST:
+                if int_op is None:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR, "invalid operator applied to ints", line_num
+                    )
+                return int_op(operand1, operand2)
+            if type1 == STRING_TYPE_CONST:
+                if string_op is None:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR, "invalid operator applied to strings", line_num
+                    )
+                return string_op(operand1, operand2)
+            if type1 == BOOL_TYPE_CONST:
+                if bool_op is None:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR, "invalid operator applied to bool", line_num
+                    )
+                return bool_op(operand1, operand2)
+        # handle object reference comparisons last
+        if obj.interpreter.check_type_compatibility(type1, type2, False):
+            if class_op is None:
+                raise KeyError(operator)  # as the tree walker's table lookup does
+            return class_op(operand1, operand2)
+        obj.interpreter.error(
+            ErrorType.TYPE_ERROR,
+            f"operator {operator} applied to two incompatible types",
+            line_num,
+        )
+
+    return apply_binary_operation
+
+
+# returns a function (operand, obj) that applies a unary operator like ObjectDef.__evaluate_unary_operation
+def make_unary_operation(operator, line_num):
+    bool_op = UNARY_OPS[InterpreterBase.BOOL_DEF].get(operator)
+
+    def apply_unary_operation(operand, obj):
+        if operand.type() == BOOL_TYPE_CONST:
+            if bool_op is None:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR, "invalid unary operator applied to bool", line_num
+                )
+            return bool_op(operand)
+        return None
+
+    return apply_unary_operation
+
+
+class MethodCompiler:
+    def __init__(self, class_def, method_def):
+        self.interpreter = class_def.interpreter  # only used for compile-time type queries
+        self.field_index = class_def.field_index  # field name -> offset in ObjectDef.field_values
+        self.field_types = class_def.field_types
+        self.return_type = method_def.get_return_type()
+        self.method_def = method_def
+        # name -> (slot, Type) of the locals/parameters in scope, one dict per nested block; the parameters
+        # take the first slots, so the frame starts as the list of arguments
+        self.scopes = [{}]
+        self.next_slot = 0
+        self.num_slots = 0
+        for param in method_def.get_formal_params():
+            self.__declare(param.name, param.type)
+
+    def compile(self):
+        statement = self.compile_statement(self.method_def.get_code())
+        num_locals = self.num_slots - len(self.method_def.get_formal_params())
+        if not num_locals:
+            return statement
+        local_slots = [None] * num_locals
+
+        def execute_body(obj, args):
+            args.extend(local_slots)  # the list of arguments becomes the frame; see ObjectDef.call_method
+            return statement(obj, args)
+
+        return execute_body
+
+    # returns a new slot for a local/parameter of the innermost block; slots are reused once it ends
+    def __declare(self, name, var_type):
+        slot = self.next_slot
+        self.next_slot += 1
+        self.num_slots = max(self.num_slots, self.next_slot)
+        self.scopes[-1][name] = (slot, var_type)
+        return slot
+
+    # returns the (slot, Type) of a local/parameter, or None
+    def __find_local(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def compile_statement(self, code):
+        try:
+            return self.__compile_statement(code)
+        except (IndexError, TypeError, AttributeError) as e:
+            return fail_with_exception(e)
+
+    def __compile_statement(self, code):
+        tok = code[0]
+        if tok == InterpreterBase.BEGIN_DEF:
+            return self.__compile_begin(code)
+        elif tok == InterpreterBase.SET_DEF:
+            return self.__compile_set(code)
+        elif tok == InterpreterBase.IF_DEF:
+            return self.__compile_if(code)
+        elif tok == InterpreterBase.CALL_DEF:
+            return self.__compile_call_statement(code)
+        elif tok == InterpreterBase.WHILE_DEF:
+            return self.__compile_while(code)
+        elif tok == InterpreterBase.RETURN_DEF:
+            return self.__compile_return(code)
+        elif tok == InterpreterBase.INPUT_STRING_DEF:
+            return self.__compile_input(code, True)
+        elif tok == InterpreterBase.INPUT_INT_DEF:
+            return self.__compile_input(code, False)
+        elif tok == InterpreterBase.PRINT_DEF:
+            return self.__compile_print(code)
+        elif tok == InterpreterBase.LET_DEF:
+            return self.__compile_let(code)
+        elif tok == InterpreterBase.THROW_DEF:
+            return self.__compile_throw(code)
+        elif tok == InterpreterBase.TRY_DEF:
+            return self.__compile_try(code)
+        else:
+            return fail_with_error(
+                ErrorType.SYNTAX_ERROR, "unknown statement " + tok, tok.line_num
+            )
+
+    # (begin (statement1) (statement2) ... (statementn))
+    def __compile_begin(self, code):
+        statements = [self.compile_statement(statement) for statement in code[1:]]
+
+        def execute_begin(obj, frame):
+            obj.interpreter.statements_executed += 1
+            status = STATUS_PROCEED
+            return_value = None
+            for statement in statements:
+                status, return_value = statement(obj, frame)
+                if status != STATUS_PROCEED:  # a return or an exception ends the block
+                    break
+            return status, return_value
+
+        return execute_begin
+
+    # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+    # every check on the locals only depends on the source, so the first error (if any) is found now and
+    # reported when the let runs
+    def __compile_let(self, code):
+        line_num = code[0].line_num
+        local_defs = []  # (slot, default Value)
+        names = set()
+        next_slot = self.next_slot
+        self.scopes.append({})
+        failure = None
+        for var_def in code[1]:
+            problem = check_local(self.interpreter, var_def, names, line_num)
+            if isinstance(problem, Exception):
+                failure = fail_with_exception(problem)
+                break
+            if problem is not None:
+                failure = fail_with_error(*problem)
+                break
+            var_type = get_type_for_name(var_def[0])
+            if len(var_def) == 3:
+                default_value = create_value(var_def[2])
+            else:
+                default_value = create_default_value(var_type)
+            local_defs.append((self.__declare(var_def[1], var_type), default_value))
+            names.add(var_def[1])
+
+        try:
+            statements = [self.compile_statement(statement) for statement in code[2:]]
+        finally:
+            self.scopes.pop()
+            self.next_slot = next_slot
+
+        def execute_let(obj, frame):
+            obj.interpreter.statements_executed += 1
+            if failure is not None:
+                failure(obj, frame)
+            for slot, default_value in local_defs:
+                frame[slot] = default_value
+            status = STATUS_PROCEED
+            return_value = None
+            for statement in statements:
+                status, return_value = statement(obj, frame)
+                if status != STATUS_PROCEED:
+                    break
+            return status, return_value
+
+        return execute_let
+
+    # (set varname expression)
+    def __compile_set(self, code):
+        line_num = code[0].line_num
+        expression = self.compile_expression(code[2], line_num)
+        assign = self.__compile_assignment(code[1], line_num)
+
+        def execute_set(obj, frame):
+            obj.interpreter.statements_executed += 1
+            val = expression(obj, frame)
+            if type(val) is tuple:
+                return val[0], val[1]
+            assign(obj, frame, val)
+            return STATUS_PROCEED, None
+
+        return execute_set
+
+    # returns a function (obj, frame, value) that stores value into the local/parameter or field var_name
+    def __compile_assignment(self, var_name, line_num):
+        local = self.__find_local(var_name)
+        if local is not None:
+            slot, var_type = local
+
+            def assign_local(obj, frame, value):
+                if not obj.interpreter.check_type_compatibility(var_type, value.type(), True):
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        f"type mismatch {var_type.type_name} and {value.type().type_name}",
+                        line_num,
+                    )
+                frame[slot] = value
+
+            return assign_local
+        field_index = self.field_index.get(var_name)
+        if field_index is not None:
+            field_type = self.field_types[field_index]
+
+            def assign_field(obj, frame, value):
+                if not obj.interpreter.check_type_compatibility(field_type, value.type(), True):
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        f"type mismatch {field_type.type_name} and {value.type().type_name}",
+                        line_num,
+                    )
+                obj.field_values[field_index] = value
+
+            return assign_field
+
+        def assign_unknown(obj, frame, value):
+            obj.interpreter.error(
+                ErrorType.NAME_ERROR, "unknown field/variable " + var_name, line_num
+            )
+
+        return assign_unknown
+
+    # (if expression (statement) (statement))
+    def __compile_if(self, code):
+        line_num = code[0].line_num
+        condition = self.compile_expression(code[1], line_num)
+        if_true = self.compile_statement(code[2])
+        if_false = self.compile_statement(code[3]) if len(code) == 4 else None
+
+        def execute_if(obj, frame):
+            obj.interpreter.statements_executed += 1
+            result = condition(obj, frame)
+            if type(result) is tuple:
+                return result[0], result[1]
+            if result.type() != BOOL_TYPE_CONST:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "non-boolean if condition " + ' '.join(x for x in code[1]),
+                    line_num,
+                )
+            if result.value():
+                return if_true(obj, frame)
+            elif if_false is not None:
+                return if_false(obj, frame)
+            return STATUS_PROCEED, None
+
+        return execute_if
+
+    # (while expression (statement))
+    def __compile_while(self, code):
+        line_num = code[0].line_num
+        condition = self.compile_expression(code[1], line_num)
+        body = self.compile_statement(code[2])
+
+        def execute_while(obj, frame):
+            obj.interpreter.statements_executed += 1
+            while True:
+                result = condition(obj, frame)
+                if type(result) is tuple:
+                    return result[0], result[1]
+                if result.type() != BOOL_TYPE_CONST:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        "non-boolean while condition " + ' '.join(x for x in code[1]),
+                        line_num,
+                    )
+                if not result.value():
+                    return STATUS_PROCEED, None
+                status, return_value = body(obj, frame)
+                if status != STATUS_PROCEED:
+                    return status, return_value
+
+        return execute_while
+
+    # (return expression) or (return)
+    def __compile_return(self, code):
+        if len(code) == 1:
+            def execute_return_nothing(obj, frame):
+                obj.interpreter.statements_executed += 1
+                return STATUS_RETURN, None
+
+            return execute_return_nothing
+
+        line_num = code[0].line_num
+        expression = self.compile_expression(code[1], line_num)
+        return_type = self.return_type
+
+        def execute_return(obj, frame):
+            interpreter = obj.interpreter
+            interpreter.statements_executed += 1
+            result = expression(obj, frame)
+            if type(result) is tuple:
+                return result[0], result[1]
+            if result.is_typeless_null():
+                if not interpreter.check_type_compatibility(return_type, result.type(), True):
+                    interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        f"type mismatch {return_type.type_name} and {result.type().type_name}",
+                        line_num,
+                    )
+                result = return_type.null_value  # propagate return type to null
+            if not interpreter.check_type_compatibility(return_type, result.type(), True):
+                interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    f"type mismatch {return_type.type_name} and {result.type().type_name}",
+                    line_num,
+                )
+            return STATUS_RETURN, result
+
+        return execute_return
+
+    # (print expression1 expression2 ...)
+    def __compile_print(self, code):
+        line_num = code[0].line_num
+        expressions = [self.compile_expression(expr, line_num) for expr in code[1:]]
+
+        def execute_print(obj, frame):
+            obj.interpreter.statements_executed += 1
+            output = ""
+            for expression in expressions:
+                term = expression(obj, frame)
+                if type(term) is tuple:
+                    return term[0], term[1]
+                val = term.value()
+                if term.type() == BOOL_TYPE_CONST:
+                    if val == True:
+                        val = "true"
+                    else:
+                        val = "false"
+                output += str(val)
+            obj.interpreter.output(output)
+            return STATUS_PROCEED, None
+
+        return execute_print
+
+    # (inputs target_variable) or (inputi target_variable)
+    def __compile_input(self, code, get_string):
+        assign = self.__compile_assignment(code[1], code[0].line_num)
+
+        def execute_input(obj, frame):
+            obj.interpreter.statements_executed += 1
+            inp = obj.interpreter.get_input()
+            if get_string:
+                val = Value(STRING_TYPE_CONST, inp)
+            else:
+                val = create_int_value(int(inp))
+            assign(obj, frame, val)
+            return STATUS_PROCEED, None
+
+        return execute_input
+
+    # (throw expression)
+    def __compile_throw(self, code):
+        line_num = code[0].line_num
+        expression = self.compile_expression(code[1], line_num)
+
+        def execute_throw(obj, frame):
+            obj.interpreter.statements_executed += 1
+            term = expression(obj, frame)
+            term.value()  # the tree walker crashes here if the expression threw
+            if term.type() != STRING_TYPE_CONST:
+                obj.interpreter.error(
+                    ErrorType.TYPE_ERROR, "throwing a non string error", line_num
+                )
+            return STATUS_EXCEPTION_THROWN, term
+
+        return execute_throw
+
+    # (try (statement) (catch statement)); the catch statement sees the thrown string as "exception"
+    def __compile_try(self, code):
+        statement = self.compile_statement(code[1])
+        next_slot = self.next_slot
+        self.scopes.append({})
+        try:
+            slot = self.__declare(EXCEPTION_VAR_NAME, STRING_TYPE_CONST)
+            catch = self.compile_statement(code[2])
+        finally:
+            self.scopes.pop()
+            self.next_slot = next_slot
+
+        def execute_try(obj, frame):
+            obj.interpreter.statements_executed += 1
+            status, return_value = statement(obj, frame)
+            if status != STATUS_EXCEPTION_THROWN:
+                return status, return_value
+            frame[slot] = return_value
+            return catch(obj, frame)
+
+        return execute_try
+
+    # (call object_ref/me methodname param1 param2 param3) as a statement
+    def __compile_call_statement(self, code):
+        call = self.__compile_call(code, code[0].line_num)
+
+        def execute_call(obj, frame):
+            obj.interpreter.statements_executed += 1
+            result = call(obj, frame)
+            if type(result) is tuple:
+                return result[0], result[1]
+            return STATUS_PROCEED, result
+
+        return execute_call
+
+    # returns a function (obj, frame) -> Value, or a (STATUS_EXCEPTION_THROWN, value) tuple
+    def compile_expression(self, expr, line_num):
+        if type(expr) is not list:
+            return self.__compile_name_or_constant(expr, line_num)
+        operator = expr[0]
+        if operator in BINARY_OP_LIST:
+            return self.__compile_binary_operation(expr, line_num)
+        if operator in UNARY_OP_LIST:
+            return self.__compile_unary_operation(expr, line_num)
+        if operator == InterpreterBase.CALL_DEF:
+            return self.__compile_call(expr, line_num)
+        if operator == InterpreterBase.NEW_DEF:
+            return self.__compile_new(expr, line_num)
+        return lambda obj, frame: None
+
+    # locals shadow fields, which shadow constants, which shadow me
+    def __compile_name_or_constant(self, expr, line_num):
+        local = self.__find_local(expr)
+        if local is not None:
+            slot, var_type = local
+            null_value = var_type.null_value
+
+            def get_local(obj, frame):
+                value = frame[slot]
+                if value.is_null():
+                    return null_value
+                return value
+
+            return get_local
+        field_index = self.field_index.get(expr)
+        if field_index is not None:
+            null_value = self.field_types[field_index].null_value
+
+            def get_field(obj, frame):
+                value = obj.field_values[field_index]
+                if value.is_null():
+                    return null_value
+                return value
+
+            return get_field
+        value = create_value(expr)
+        if value is not None:
+            return lambda obj, frame: value
+        if expr == InterpreterBase.ME_DEF:
+            return lambda obj, frame: obj.get_me_as_value()
+        return fail_with_error(
+            ErrorType.NAME_ERROR, "invalid field or parameter " + expr, line_num
+        )
+
+    def __compile_binary_operation(self, expr, line_num):
+        left = self.compile_expression(expr[1], line_num)
+        right = self.compile_expression(expr[2], line_num)
+        operation = make_binary_operation(expr[0], line_num)
+
+        def evaluate_binary_operation(obj, frame):
+            return operation(left(obj, frame), right(obj, frame), obj)
+
+        return evaluate_binary_operation
+
+    def __compile_unary_operation(self, expr, line_num):
+        operand_expression = self.compile_expression(expr[1], line_num)
+        operation = make_unary_operation(expr[0], line_num)
+
+        def evaluate_unary_operation(obj, frame):
+            return operation(operand_expression(obj, frame), obj)
+
+        return evaluate_unary_operation
+
+    # (new classname)
+    def __compile_new(self, expr, line_num):
+        class_name = expr[1]
+        class_type = get_type_for_name(class_name)
+
+        def evaluate_new(obj, frame):
+            return Value(class_type, obj.interpreter.instantiate(class_name, line_num))
+
+        return evaluate_new
+
+    # (call object_ref/me/super methodname p1 p2 p3)
+    def __compile_call(self, code, line_num):
+        obj_name = code[1]
+        method_name = code[2]
+        args = [self.compile_expression(expr, line_num) for expr in code[3:]]
+        inline_cache = InlineCache()
+
+        # each argument is evaluated exactly once; an exception thrown by one ends the call
+        def evaluate_args(obj, frame):
+            actual_args = []
+            for arg in args:
+                evaluated = arg(obj, frame)
+                if type(evaluated) is tuple:
+                    return evaluated
+                actual_args.append(evaluated)
+            return actual_args
+
+        if obj_name == InterpreterBase.ME_DEF:
+            def call_on_me(obj, frame):
+                actual_args = evaluate_args(obj, frame)
+                if type(actual_args) is tuple:
+                    return actual_args[0], actual_args[1]
+                return obj.call_method(method_name, actual_args, False, line_num, inline_cache)
+
+            return call_on_me
+
+        if obj_name == InterpreterBase.SUPER_DEF:
+            def call_on_super(obj, frame):
+                if not obj.super_object:
+                    obj.interpreter.error(
+                        ErrorType.TYPE_ERROR,
+                        "invalid call to super object by class " + obj.class_def.get_name(),
+                        line_num,
+                    )
+                actual_args = evaluate_args(obj, frame)
+                if type(actual_args) is tuple:
+                    return actual_args[0], actual_args[1]
+                return obj.super_object.call_method(
+                    method_name, actual_args, True, line_num, inline_cache
+                )
+
+            return call_on_super
+
+        target = self.compile_expression(obj_name, line_num)
+
+        def call_on_object(obj, frame):
+            obj_val = target(obj, frame)
+            if obj_val.is_null():
+                obj.interpreter.error(ErrorType.FAULT_ERROR, "null dereference", line_num)
+            actual_args = evaluate_args(obj, frame)
+            if type(actual_args) is tuple:
+                return actual_args[0], actual_args[1]
+            return obj_val.value().call_method(
+                method_name, actual_args, False, line_num, inline_cache
+            )
+
+        return call_on_object
@@ -1,27 +1,115 @@
-from classv2 import ClassDef
+from classv2 import ClassDef, TemplateCache
+import bytecode
+import closure_engine
+import memo
+import optimizer
+import transpiler
+import typecheck
 from intbase import InterpreterBase, ErrorType
 from bparser import BParser
-from objectv2 import ObjectDef
+from objectv2 import ObjectDef, InlineCache, BrewinThrow
 from type_valuev2 import TypeManager
-import copy
+from types import MappingProxyType
 # need to document that each class has at least one method guaranteed
 
 # Main interpreter class
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    # execution engines for method bodies
+    ENGINE_TREE = "tree"  # ObjectDef walks the parsed lists directly
+    ENGINE_CLOSURE = "closure"  # method bodies are compiled once into Python closures
+    ENGINE_TRANSPILE = "transpile"  # method bodies are translated to Python source and compiled
+    ENGINE_BYTECODE = "bytecode"  # method bodies are compiled to bytecode run by a stack VM
+
+    # parse_cache is an optional ParseCache; when provided, parsed programs are loaded from/saved to it
+    # engine selects how method bodies are executed; trace_output always uses the tree engine
+    # code_cache is an optional transpiler.CodeCache that the transpile engine loads/saves compiled code with
+    # optimize runs the load-time optimizer (see optimizer.py) on the programs this interpreter prepares and
+    # lets call sites inline trivial getters and setters (see InlineCache); it is off with trace_output, so
+    # traces show the statements as written
+    # max_call_depth bounds the calls the bytecode engine keeps suspended at once (see bytecode.Code.run),
+    # which live on the heap rather than the Python stack; each takes a few hundred bytes
+    # memoize caches the results of pure methods (see memo.py): either the size of the LRU cache of every
+    # pure method, or a dict of "classname.methodname" -> cache size for just those methods; it is off (0)
+    # by default, and with trace_output
+    # unchecked type checks the whole program before main starts (see typecheck.py), and the tree engine then
+    # skips the type checks of the assignments, returns and lets proved type-safe; the type errors found are
+    # in type_errors, and still reported if the statement runs
+    def __init__(self, console_output=True, inp=None, trace_output=False, parse_cache=None,
+                 engine=ENGINE_TREE, code_cache=None, optimize=True, max_call_depth=100000, memoize=0,
+                 unchecked=False):
         super().__init__(console_output, inp)
         self.trace_output = trace_output
+        self.optimize = optimize and not trace_output
+        self.max_call_depth = max_call_depth
+        self.memoize = memoize if not trace_output else 0
+        self.memos = {}  # MethodDef -> MethodMemo of every memoized method of the running program
+        self.unchecked = unchecked
+        self.type_errors = []  # (ErrorType, description, line) of every type error found by typecheck.py
+        self.parse_cache = parse_cache
+        self.code_cache = code_cache
+        self.statements_executed = 0
+        self.inline_caches = {}  # id of a (call ...) list -> (the list, its InlineCache); see get_inline_cache
+        self.engine = engine
+        if engine == Interpreter.ENGINE_TREE or trace_output:
+            self.compile_method = None
+        elif engine == Interpreter.ENGINE_CLOSURE:
+            self.compile_method = closure_engine.compile_method
+        elif engine == Interpreter.ENGINE_TRANSPILE:
+            self.compile_method = None  # each program has its own Transpiler; see run_prepared
+        elif engine == Interpreter.ENGINE_BYTECODE:
+            self.compile_method = bytecode.compile_method
+        else:
+            raise ValueError(f"unknown engine {engine}")
 
     # run a program, provided in an array of strings, one string per line of source code
-    # usese the provided BParser class found in parser.py to parse the program into lists
     def run(self, program):
-        status, parsed_program = BParser.parse(program)
+        self.run_prepared(self.prepare(program))
+
+    # parses the program and builds the TypeManager and all ClassDefs; the returned PreparedProgram can
+    # then be run any number of times (with different inputs) without repeating this load phase
+    # usese the provided BParser class found in parser.py to parse the program into lists
+    def prepare(self, program):
+        if self.parse_cache is not None:
+            status, parsed_program = self.parse_cache.parse(program)
+        else:
+            status, parsed_program = BParser.parse(program)
         if not status:
             super().error(
                 ErrorType.SYNTAX_ERROR, f"Parse error on program: {parsed_program}"
             )
+        return self.prepare_parsed(parsed_program)
+
+    # the load phase of prepare() for a program that was already parsed by BParser
+    def prepare_parsed(self, parsed_program):
         self.__add_all_class_types_to_type_manager(parsed_program)
         self.__map_class_names_to_class_defs(parsed_program)
+        if self.optimize:
+            for class_def in self.class_index.values():
+                if not class_def.template:
+                    optimizer.optimize_class(class_def)
+        options = {
+            "engine": self.engine,
+            "optimize": self.optimize,
+            "max_call_depth": self.max_call_depth,
+            "memoize": self.memoize,
+            "unchecked": self.unchecked,
+        }
+        return PreparedProgram(
+            self.type_manager, self.class_index, self.template_cache, parsed_program, self.optimize, options
+        )
+
+    # runs the main method of an already prepared program; only the main object and the runtime state
+    # (input, output, errors) belong to this interpreter
+    def run_prepared(self, prepared):
+        self.type_manager = prepared.type_manager
+        self.class_index = prepared.class_index
+        self.template_cache = prepared.template_cache
+        self.statements_executed = 0
+        self.memos = memo.make_memos(prepared, self.memoize) if self.memoize else {}
+        if self.unchecked:
+            self.type_errors = prepared.type_check()
+        if self.engine == Interpreter.ENGINE_TRANSPILE and not self.trace_output:
+            self.compile_method = prepared.get_transpiler(self.code_cache).compile_method
 
         # instantiate main class
         invalid_line_num_of_caller = None
@@ -30,9 +118,12 @@ class Interpreter(InterpreterBase):
         )
 
         # call main function in main class; return value is ignored from main
-        self.main_object.call_method(
-            InterpreterBase.MAIN_FUNC_DEF, [], False, invalid_line_num_of_caller
-        )
+        try:
+            self.main_object.call_method(
+                InterpreterBase.MAIN_FUNC_DEF, [], False, invalid_line_num_of_caller
+            )
+        except BrewinThrow:
+            pass  # an exception main doesn't catch ends the program (the other engines return it from main)
 
         # program terminates!
 
@@ -55,16 +146,26 @@ class Interpreter(InterpreterBase):
                 self, class_def, None, self.trace_output
             )  # Create an object based on this class definition
             return obj
-        class_name_orig = class_name_orig.split('@')
-        class_def_templated = copy.deepcopy(class_def)
-        # give @ vars here
-        class_def_templated.template_instantiation(class_name_orig[1:])
+        # every Foo@T@U signature is specialized once and then shared by all of its instances
+        class_def_templated = self.template_cache.get(class_name_orig, class_def, self)
 
         obj = ObjectDef(
                 self, class_def_templated, None, self.trace_output
             )  # Create an object based on this class definition
         return obj
         
+    # returns the InlineCache of a call site of the tree engine, identified by its parsed (call ...) list
+    def get_inline_cache(self, call_code):
+        entry = self.inline_caches.get(id(call_code))
+        if entry is None or entry[0] is not call_code:
+            entry = (call_code, InlineCache())
+            self.inline_caches[id(call_code)] = entry
+        return entry[1]
+
+    # returns the hits, misses, size and hit rate of the cache of every memoized method, e.g., "main.fib(int)"
+    def get_memo_stats(self):
+        return {method_memo.name: method_memo.get_stats() for method_memo in self.memos.values()}
+
     # returns a ClassDef object
     def get_class_def(self, class_name, line_number_of_statement):
         if class_name not in self.class_index:
@@ -95,6 +196,7 @@ class Interpreter(InterpreterBase):
 
     def __map_class_names_to_class_defs(self, program):
         self.class_index = {}
+        self.template_cache = TemplateCache(self.optimize)
         ## Doing duplicate to get all classdefs for templated classes first
         for item in program:
             if item[0] == InterpreterBase.TEMPLATE_CLASS_DEF:
@@ -130,9 +232,62 @@ class Interpreter(InterpreterBase):
                 if item[2] == InterpreterBase.INHERITS_DEF:
                     superclass_name = item[3]
                 self.type_manager.add_class_type(class_name, superclass_name)
+        self.type_manager.finalize()
                 
 
 
+# the result of Interpreter.prepare(): a parsed and type-registered program whose TypeManager and ClassDefs
+# are shared, read-only, by every run. Specialized templated classes are cached here too, since they only
+# depend on the program. optimized tells whether the method bodies went through the load-time optimizer;
+# options are the Interpreter keyword arguments (engine, optimize, memoize, ...) it was prepared with.
+class PreparedProgram:
+    def __init__(self, type_manager, class_index, template_cache, parsed_program=None, optimized=False,
+                 options=None):
+        self.type_manager = type_manager
+        self.class_index = MappingProxyType(class_index)
+        self.template_cache = template_cache
+        self.parsed_program = parsed_program
+        self.optimized = optimized
+        self.options = options if options is not None else {"optimize": optimized}
+        self.transpiler = None
+        self.pure_methods = None
+        self.type_errors = None
+
+    # returns the set of the pure MethodDefs of the program (see memo.py), found the first time
+    def get_pure_methods(self):
+        if self.pure_methods is None:
+            self.pure_methods = memo.find_pure_methods(self.class_index)
+        return self.pure_methods
+
+    # type checks the program (see typecheck.py) the first time, marking the statements the tree engine can
+    # run unchecked; returns the (ErrorType, description, line) of every type error found
+    def type_check(self):
+        if self.type_errors is None:
+            self.type_errors = typecheck.check_program(self)
+        return self.type_errors
+
+    # returns the transpile engine for this program, translating (or loading from code_cache) every
+    # method of its non-templated classes the first time
+    def get_transpiler(self, code_cache=None):
+        if self.transpiler is None:
+            self.transpiler = transpiler.Transpiler(
+                transpiler.get_program_hash(self.parsed_program, self.optimized), code_cache
+            )
+            self.transpiler.transpile_classes(self.class_index.values())
+        return self.transpiler
+
+    # runs the program once with the given input lines and returns its output lines; errors are raised
+    # just like Interpreter.run (use Interpreter.run_prepared to inspect the error type and line). The run
+    # uses the options the program was prepared with, except for engine, when given
+    def run(self, inputs=None, trace_output=False, engine=None):
+        options = dict(self.options)
+        if engine is not None:
+            options["engine"] = engine
+        interpreter = Interpreter(console_output=False, inp=inputs, trace_output=trace_output, **options)
+        interpreter.run_prepared(self)
+        return interpreter.get_output()
+
+
 if __name__ == "__main__":
     tester = Interpreter()
 
@@ -0,0 +1,196 @@
+"""
+Memoization of pure methods, shared by every engine; off unless the Interpreter is made with memoize.
+
+A method is pure if the value it returns only depends on its arguments (and on the class of its object,
+which decides the methods its calls reach). find_pure_methods checks the whole program at once:
+- the method returns an int, string or bool, and every parameter is an int, string or bool
+- its body reads no field, doesn't use me as a value, assigns no field, and has no print, inputi, inputs
+  or new
+- every call it makes is on me or super, and every method of the program with the called name and number
+  of arguments is pure, so no override in a derived class can make it impure; methods that only call each
+  other (e.g., even and odd) are pure together
+The bodies are checked in their resolved form (see resolver.py), where every name is already bound to a
+local, a field, a constant or me.
+
+Each memoized method keeps the results of its most recent calls in a MethodMemo, an LRU cache keyed on the
+class of the object and the argument values. A hit also counts the statements the original call executed,
+so statements_executed is the same with or without memoization. A call that throws or fails isn't
+remembered.
+
+A miss runs the method the way its engine runs any call, so memoization doesn't cost stack depth:
+ObjectDef.call_method looks the call up and remembers its result around the run_method it makes for every
+call; a method ending in a tail call returns the TailCall, and ObjectDef.run_tail_calls remembers the result
+once the chain of tail calls is done; the bytecode VM runs the method in a frame of its own loop and
+remembers the result when the frame returns (see bytecode.Code.run).
+"""
+
+from collections import OrderedDict
+
+from intbase import InterpreterBase
+from objectv2 import BINARY_OP_LIST, UNARY_OP_LIST
+from resolver import ResolvedName, resolve_body
+from type_valuev2 import Value
+
+MEMOIZABLE_TYPES = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF}
+
+
+# returns the set of the pure MethodDefs of the program's non-templated classes
+def find_pure_methods(class_index):
+    methods = {}  # (method name, number of parameters) -> the MethodDefs of every class with that signature
+    candidates = {}  # MethodDef -> the (name, number of arguments) it calls, if the rest of its body is pure
+    for class_def in class_index.values():
+        if class_def.template:
+            # a templated class only has MethodDefs once specialized, and they are never memoized
+            for member in class_def.class_source[3:]:
+                if member[0] == InterpreterBase.METHOD_DEF:
+                    methods.setdefault((member[2], len(member[3])), []).append(None)
+            continue
+        for method_def in class_def.get_methods():
+            signature = (method_def.get_method_name(), len(method_def.get_formal_params()))
+            methods.setdefault(signature, []).append(method_def)
+            if has_memoizable_signature(method_def):
+                calls = PurityChecker(class_def, method_def).check()
+                if calls is not None:
+                    candidates[method_def] = calls
+    # a method is only pure if every method it can call is; drop the others until none is dropped
+    changed = True
+    while changed:
+        changed = False
+        for method_def, calls in list(candidates.items()):
+            for call in calls:
+                callees = methods.get(call)
+                if not callees or any(callee not in candidates for callee in callees):
+                    del candidates[method_def]
+                    changed = True
+                    break
+    return set(candidates)
+
+
+def has_memoizable_signature(method_def):
+    if method_def.get_return_type().type_name not in MEMOIZABLE_TYPES:
+        return False
+    return all(param.type.type_name in MEMOIZABLE_TYPES for param in method_def.get_formal_params())
+
+
+# returns the name of method_def in get_memo_stats, e.g., "main.fib(int)"
+def get_memo_name(class_def, method_def):
+    param_types = ", ".join(param.type.type_name for param in method_def.get_formal_params())
+    return f"{class_def.get_name()}.{method_def.get_method_name()}({param_types})"
+
+
+# checks the resolved body of one method; anything it doesn't recognize makes the method impure
+class PurityChecker:
+    def __init__(self, class_def, method_def):
+        self.code = resolve_body(class_def, method_def).code
+        self.calls = set()
+
+    # returns the (name, number of arguments) of every call the body makes, or None if it's impure
+    def check(self):
+        if not self.__statement(self.code):
+            return None
+        return self.calls
+
+    def __statement(self, code):
+        if type(code) is not list or not code:
+            return False
+        tok = code[0]
+        if tok == InterpreterBase.BEGIN_DEF:
+            return all(self.__statement(statement) for statement in code[1:])
+        if tok in (InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF):
+            return (
+                len(code) > 2
+                and self.__expression(code[1])
+                and all(self.__statement(statement) for statement in code[2:])
+            )
+        if tok == InterpreterBase.LET_DEF:
+            # the defaults of let variables are literals
+            return len(code) > 1 and all(self.__statement(statement) for statement in code[2:])
+        if tok == InterpreterBase.TRY_DEF:
+            return all(self.__statement(statement) for statement in code[1:3])
+        if tok == InterpreterBase.SET_DEF:
+            target = code[1] if len(code) == 3 else None
+            if type(target) is not ResolvedName or target.kind != ResolvedName.LOCAL or target.index is None:
+                return False
+            return self.__expression(code[2])
+        if tok in (InterpreterBase.RETURN_DEF, InterpreterBase.THROW_DEF):
+            return all(self.__expression(expr) for expr in code[1:])
+        if tok == InterpreterBase.CALL_DEF:
+            return self.__call(code)
+        return False  # print, inputi, inputs or a malformed statement
+
+    def __expression(self, expr):
+        if type(expr) is not list:
+            return type(expr) is ResolvedName and expr.kind in (ResolvedName.LOCAL, ResolvedName.CONSTANT)
+        if not expr:
+            return False
+        if expr[0] == InterpreterBase.CALL_DEF:
+            return self.__call(expr)
+        if expr[0] in BINARY_OP_LIST or expr[0] in UNARY_OP_LIST:
+            return all(self.__expression(operand) for operand in expr[1:])
+        return False  # new or a malformed expression
+
+    # (call me/super methodname arg1 arg2 ...)
+    def __call(self, code):
+        if len(code) < 3 or code[1] not in (InterpreterBase.ME_DEF, InterpreterBase.SUPER_DEF):
+            return False
+        self.calls.add((str(code[2]), len(code) - 3))
+        return all(self.__expression(expr) for expr in code[3:])
+
+
+# the LRU cache of the results of one pure method
+class MethodMemo:
+    def __init__(self, name, max_size):
+        self.name = name
+        self.max_size = max_size
+        self.entries = OrderedDict()  # (ClassDef, argument values...) -> (result, statements executed)
+        self.hits = 0
+        self.misses = 0
+
+    # returns (key, result): the remembered result of a call on obj with actual_params, after counting its
+    # statements, or None; after a miss, the result is passed to remember with the key
+    def lookup(self, obj, actual_params):
+        key = (obj.anchor_object.class_def,) + tuple(arg.v for arg in actual_params)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        obj.interpreter.statements_executed += entry[1]
+        return key, entry[0]
+
+    # remembers what the call of key returned, if it returned a Value, and the number of statements it took
+    def remember(self, key, result, statements_executed):
+        if type(result) is Value:
+            self.entries[key] = (result, statements_executed)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+            "hit_rate": self.hits / calls if calls else 0.0,
+        }
+
+
+# returns MethodDef -> MethodMemo for the pure methods of a prepared program to memoize. memoize is either
+# the size of the cache of every pure method, or maps "classname.methodname" to the cache size of the
+# methods to memoize (of any parameter types)
+def make_memos(prepared, memoize):
+    memos = {}
+    for class_def in prepared.class_index.values():
+        if class_def.template:
+            continue
+        for method_def in class_def.get_methods():
+            if method_def not in prepared.get_pure_methods():
+                continue
+            if type(memoize) is dict:
+                max_size = memoize.get(f"{class_def.get_name()}.{method_def.get_method_name()}")
+            else:
+                max_size = memoize
+            if max_size:
+                memos[method_def] = MethodMemo(get_memo_name(class_def, method_def), max_size)
+    return memos
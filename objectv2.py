@@ -1,16 +1,29 @@
-from classv2 import VariableDef
-import copy
-from env_v2 import EnvironmentManager
+import weakref
 from intbase import InterpreterBase, ErrorType
+from resolver import ResolvedName, resolve_body
 from type_valuev2 import create_value, create_default_value
-from type_valuev2 import Type, Value
+from type_valuev2 import Type, Value, create_bool_value, create_int_value
 
 
 class ObjectDef:
+    # an object of a derived class is made of one ObjectDef part per class in its inheritance chain, since
+    # a method runs on the part of the class that defines it; the parts only refer to each other, the
+    # ClassDefs and one shared list with the values of all of the object's fields
+    __slots__ = (
+        "interpreter",
+        "class_def",
+        "anchor_object",
+        "trace_output",
+        "field_values",
+        "super_object",
+        "object_parts",
+    )
+
     # statement execution results
     STATUS_PROCEED = 0
     STATUS_RETURN = 1
-    STATUS_EXCEPTION_THROWN = 2
+    STATUS_EXCEPTION_THROWN = 2  # only returned by compiled bodies; the tree engine raises a BrewinThrow
+    STATUS_TAIL_CALL = 3  # the value is a TailCall, made by call_method once the method has returned
 
     # type constants
     INT_TYPE_CONST = Type(InterpreterBase.INT_DEF)
@@ -24,36 +37,41 @@ class ObjectDef:
 
         if anchor_object is None:
             self.anchor_object = self
+            # the values of the fields of every part, at the offsets given by ClassDef.field_index
+            self.field_values = list(class_def.field_defaults)
         else:
             self.anchor_object = anchor_object
+            self.field_values = anchor_object.field_values
         self.trace_output = trace_output
-        self.__instantiate_fields()
-        self.__map_method_names_to_method_definitions()
-        self.__create_map_of_operations_to_lambdas()  # sets up maps to facilitate binary and unary operations, e.g., (+ 5 6)
-        self.__init_superclass_if_any()  # construct default values for superclass fields all the way to the base class
-
+        self.__init_superclass_if_any()  # construct the parts for the superclasses all the way to the base class
+        if anchor_object is None and self.super_object is not None:
+            # every part of the object, most derived first, so an InlineCache can find a part by index;
+            # an object without a superclass only has itself (index 0), so it doesn't need the tuple
+            parts = []
+            part = self
+            while part is not None:
+                parts.append(part)
+                part = part.super_object
+            self.object_parts = tuple(parts)
+
+    # returns the part of start_obj's object (start_obj or one of its super objects) whose method handles a
+    # call to method_name with actual_params, or None; the candidates come from the flattened vtable of
+    # start_obj's class, so no super_object links are followed
     def __get_obj_with_method(self, start_obj, method_name, actual_params):
-        cur_obj = start_obj
-        while cur_obj is not None:
-            if method_name not in cur_obj.methods:
-                cur_obj = cur_obj.super_object
-                continue
-            method_def = cur_obj.methods[method_name]
-            if len(actual_params) == len(
-                method_def.formal_params
-            ) and self.__compatible_param_types(
-                actual_params, method_def.formal_params
-            ):
-                break
-
-            cur_obj = cur_obj.super_object
-
-        return cur_obj
-
-    # actual_params is a list of Value objects; all parameters are passed by value
-    # the caller passes in its line number so if there's an error (e.g., mismatched # of parameters or unknown
-    # method name) we can generate an error at the source (where the call is initiated) for better context
-    def call_method(self, method_name, actual_params, super_only, line_num_of_caller):
+        class_def = start_obj.class_def
+        for depth, method_def, formal_types in class_def.vtable.get(
+            (method_name, len(actual_params)), ()
+        ):
+            if self.__compatible_param_types(actual_params, formal_types):
+                if depth == 0:
+                    return start_obj
+                anchor = start_obj.anchor_object
+                return anchor.object_parts[anchor.class_def.depth - class_def.depth + depth]
+        return None
+
+    # returns the object part (this object, one of its super objects or, unless super_only, a part of a
+    # derived class) whose method method_name handles a call with actual_params
+    def resolve_method(self, method_name, actual_params, super_only, line_num_of_caller):
         # check to see if we have a method in this class or its base class(es) matching this signature
         if self.__get_obj_with_method(self, method_name, actual_params) is None:
             self.interpreter.error(
@@ -71,27 +89,67 @@ class ObjectDef:
         else:
             anchor = self.anchor_object
         obj_to_call_on = self.__get_obj_with_method(anchor, method_name, actual_params)
+        return obj_to_call_on
 
-        method_def = obj_to_call_on.methods[method_name]
-
-        # handle the call in the object
-        env = (
-            EnvironmentManager()
-        )  # maintains lexical environment for function; just params for now
-        for formal, actual in zip(method_def.formal_params, actual_params):
-            formal_copy = copy.copy(formal)  # VariableDef obj.
-            formal_copy.set_value(actual)  # actual is a Value obj.
-            if not env.create_new_symbol(formal_copy.name):
-                self.interpreter.error(
-                    ErrorType.NAME_ERROR,
-                    "duplicate formal param name " + formal.name,
-                    method_def.line_num,
-                )
-            env.set(formal_copy.name, formal_copy)
-        # since each method has a single top-level statement, execute it.
-        status, return_value = obj_to_call_on.__execute_statement(
-            env, method_def.return_type, method_def.code
-        )
+    # actual_params is a list of Value objects; all parameters are passed by value. The list becomes the frame
+    # of the call (the callee appends its locals to it), so every call must pass a new list
+    # the caller passes in its line number so if there's an error (e.g., mismatched # of parameters or unknown
+    # method name) we can generate an error at the source (where the call is initiated) for better context
+    # inline_cache is the InlineCache of the calling call site, if it has one
+    # in_tail_call is set by run_tail_calls, which makes the tail call of the method (returned as a TailCall)
+    # returns the Value the method returns; an exception the method throws is raised as a BrewinThrow by the
+    # tree engine, and returned as a (STATUS_EXCEPTION_THROWN, value) tuple by the other engines
+    def call_method(
+        self, method_name, actual_params, super_only, line_num_of_caller, inline_cache=None, in_tail_call=False
+    ):
+        if inline_cache is None:
+            obj_to_call_on = self.resolve_method(method_name, actual_params, super_only, line_num_of_caller)
+        else:
+            if inline_cache.inlined is not None:
+                result = inline_cache.call_inlined(self, actual_params)
+                if result is not None:
+                    return result
+            obj_to_call_on = inline_cache.lookup(self, method_name, actual_params, super_only, line_num_of_caller)
+
+        method_def = obj_to_call_on.class_def.method_map[method_name]
+        memos = self.interpreter.memos
+        if not memos or method_def not in memos:
+            return obj_to_call_on.run_method(method_def, actual_params, in_tail_call)
+        # a pure method, see memo.py; a miss runs from this frame like any other call, so memoization
+        # doesn't nest Python frames
+        method_memo = memos[method_def]
+        key, result = method_memo.lookup(obj_to_call_on, actual_params)
+        if result is not None:
+            return result
+        statements_before = self.interpreter.statements_executed
+        result = obj_to_call_on.run_method(method_def, actual_params, True)
+        if type(result) is TailCall:
+            # the method ends with a tail call; the result is remembered once the tail calls are made
+            result.memos = [(method_memo, key, statements_before)]
+            return result if in_tail_call else obj_to_call_on.run_tail_calls(result)
+        method_memo.remember(key, result, self.interpreter.statements_executed - statements_before)
+        return result
+
+    # runs method_def, a method of this object part, with actual_params (which become its frame); returns
+    # what call_method does
+    def run_method(self, method_def, actual_params, in_tail_call=False):
+        # handle the call in the object; the arguments are the first slots of the callee's frame
+        compile_method = self.interpreter.compile_method
+        if compile_method is None:
+            # since each method has a single top-level statement, execute it.
+            resolved = resolve_body(self.class_def, method_def)
+            frame = actual_params
+            frame.extend(resolved.local_slots)
+            status, return_value = self.__execute_statement(
+                frame, method_def.return_type, resolved.code
+            )
+            if status == ObjectDef.STATUS_TAIL_CALL:
+                if in_tail_call:
+                    return return_value
+                return self.run_tail_calls(return_value)
+        else:  # an alternate engine compiles the method body once, then we just run it
+            body = compile_method(self.class_def, method_def)
+            status, return_value = body(self, actual_params)
         # if the method explicitly used the (return expression) statement to return a value, then return that
         # value back to the caller
         # print(status, return_value.type().type_name, return_value.value())
@@ -103,18 +161,54 @@ class ObjectDef:
         # The method didn't explicitly return a value, so return the default return type for the method
         return create_default_value(method_def.get_return_type())
 
+    # makes tail_call, then the tail call that method makes, and so on, all from this one Python frame, and
+    # returns the value of the first call. Each (return (call ...)) still checks the value it returns against
+    # the return type of its method, innermost first; a run of checks against the same type is done once, at
+    # the line of the innermost return, where the first would fail. Memoized methods that ended with one of
+    # the tail calls (see memo.py) remember the value once every check has passed
+    def run_tail_calls(self, tail_call):
+        checks = []  # (return type, line number) of each pending return, innermost last
+        memos = []  # (MethodMemo, key, statements executed before the call) of each memoized method
+        while True:
+            if tail_call.memos is not None:
+                memos += tail_call.memos
+            if checks and checks[-1][0] is tail_call.return_type:
+                checks[-1] = (tail_call.return_type, tail_call.line_num)
+            else:
+                checks.append((tail_call.return_type, tail_call.line_num))
+            result = tail_call.obj.call_method(
+                tail_call.method_name,
+                tail_call.actual_params,
+                tail_call.super_only,
+                tail_call.line_num,
+                tail_call.inline_cache,
+                True,
+            )
+            if type(result) is not TailCall:
+                break
+            tail_call = result
+        for return_type, line_num in reversed(checks):
+            if result.is_typeless_null():
+                self.__check_type_compatibility(return_type, result.type(), True, line_num)
+                result = return_type.null_value  # propagate return type to null
+            self.__check_type_compatibility(return_type, result.type(), True, line_num)
+        statements_executed = self.interpreter.statements_executed
+        for method_memo, key, statements_before in reversed(memos):  # innermost first, as the calls return
+            method_memo.remember(key, result, statements_executed - statements_before)
+        return result
+
     # def get_me_as_value(self):
     #     return Value(Type(self.class_def.name), self)
 
     def get_me_as_value(self):
         anchor = self.anchor_object
-        return Value(Type(anchor.class_def.name), anchor)
+        return Value(Type(anchor.class_def.name, full_name=anchor.class_def.full_name), anchor)
 
-    # checks whether each formal parameter has a compatible type with the actual parameter
-    def __compatible_param_types(self, actual_params, formal_params):
-        for formal, actual in zip(formal_params, actual_params):
+    # checks whether each formal parameter type is compatible with the type of the actual parameter
+    def __compatible_param_types(self, actual_params, formal_types):
+        for formal_type, actual in zip(formal_types, actual_params):
             if not self.interpreter.check_type_compatibility(
-                formal.type, actual.type(), True
+                formal_type, actual.type(), True
             ):
                 return False
         return True
@@ -124,34 +218,35 @@ class ObjectDef:
     #   the current method needs to terminate immediately, or whether the statement simply ran but didn't execute a
     #   return statement, and thus the next statement in the method should run normally
     # - return value is a value of type Value which is the returned value from the function
-    def __execute_statement(self, env, return_type, code):
+    def __execute_statement(self, frame, return_type, code):
+        self.interpreter.statements_executed += 1
         if self.trace_output:
             print(f"{code[0].line_num}: {code}")
         tok = code[0]
         if tok == InterpreterBase.BEGIN_DEF:
-            return self.__execute_begin(env, return_type, code)
+            return self.__execute_begin(frame, return_type, code)
         elif tok == InterpreterBase.SET_DEF:
-            return self.__execute_set(env, code)
+            return self.__execute_set(frame, code)
         elif tok == InterpreterBase.IF_DEF:
-            return self.__execute_if(env, return_type, code)
+            return self.__execute_if(frame, return_type, code)
         elif tok == InterpreterBase.CALL_DEF:
-            return self.__execute_call(env, code)
+            return self.__execute_call(frame, code)
         elif tok == InterpreterBase.WHILE_DEF:
-            return self.__execute_while(env, return_type, code)
+            return self.__execute_while(frame, return_type, code)
         elif tok == InterpreterBase.RETURN_DEF:
-            return self.__execute_return(env, return_type, code)
+            return self.__execute_return(frame, return_type, code)
         elif tok == InterpreterBase.INPUT_STRING_DEF:
-            return self.__execute_input(env, code, True)
+            return self.__execute_input(frame, code, True)
         elif tok == InterpreterBase.INPUT_INT_DEF:
-            return self.__execute_input(env, code, False)
+            return self.__execute_input(frame, code, False)
         elif tok == InterpreterBase.PRINT_DEF:
-            return self.__execute_print(env, code)
+            return self.__execute_print(frame, code)
         elif tok == InterpreterBase.LET_DEF:
-            return self.__execute_let(env, return_type, code)
+            return self.__execute_let(frame, return_type, code)
         elif tok == InterpreterBase.THROW_DEF:
-            return self.__execute_throw(env, return_type, code)
+            return self.__execute_throw(frame, return_type, code)
         elif tok == InterpreterBase.TRY_DEF:
-            return self.__execute_try(env, return_type, code)
+            return self.__execute_try(frame, return_type, code)
         else:
             # Report error via interpreter
             self.interpreter.error(
@@ -161,30 +256,29 @@ class ObjectDef:
     # This method is used for both the begin and let statements
     # (begin (statement1) (statement2) ... (statementn))
     # (let ((type1 var1 defaultvalue1) ... (typen varn defaultvaluen)) (statement1) ... (statementn))
-    def __execute_begin(self, env, return_type, code, has_vardef=False):
+    def __execute_begin(self, frame, return_type, code, has_vardef=False):
         if has_vardef: #handles the let case
             code_start = 2
-            env.block_nest()
-            self.__add_locals_to_env(env, code[1], code[0].line_num)
+            if type(code[0]) is ResolvedName:  # the type checker precomputed the defaults, see typecheck.py
+                for slot, default_value in code[0].value:
+                    frame[slot] = default_value
+            else:
+                self.__add_locals_to_frame(frame, code[1], code[0].line_num)
         else: #handles the begin case
             code_start = 1
 
         status = ObjectDef.STATUS_PROCEED
         return_value = None
         for statement in code[code_start:]:
-            status, return_value = self.__execute_statement(env, return_type, statement)
-            if status == ObjectDef.STATUS_RETURN:
-                break
-            if status == ObjectDef.STATUS_EXCEPTION_THROWN:
+            status, return_value = self.__execute_statement(frame, return_type, statement)
+            if status != ObjectDef.STATUS_PROCEED:  # a return or a tail call
                 break
         # if we run through the entire block without a return, then just return proceed
         # we don't want the enclosing block to exit with a return
-        if has_vardef:
-            env.block_unnest()
         return status, return_value  # could be a valid return of a value or an error
 
-    # add all local variables defined in a let to the environment
-    def __add_locals_to_env(self, env, var_defs, line_number):
+    # store the default values of all local variables defined in a let into their slots of the frame
+    def __add_locals_to_frame(self, frame, var_defs, line_number):
         for var_def in var_defs:
             # vardef in the form of (typename varname defvalue)
             if '@' in var_def[0]:
@@ -206,108 +300,111 @@ class ObjectDef:
             self.__check_type_compatibility(
                 var_type, default_value.type(), True, line_number
             )
-            if not env.create_new_symbol(var_name):
+            if var_name.index is None:  # the resolver found an earlier local with this name in the let
                 self.interpreter.error(
                     ErrorType.NAME_ERROR,
                     "duplicate local variable name " + var_name,
                     line_number,
                 )
-            var_def = VariableDef(var_type, var_name, default_value)
-            env.set(var_name, var_def)
+            frame[var_name.index] = default_value
 
     # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
     # uses helper function __execute_begin to implement its functionality
-    def __execute_let(self, env, return_type, code):
-        return self.__execute_begin(env, return_type, code, True)
+    def __execute_let(self, frame, return_type, code):
+        return self.__execute_begin(frame, return_type, code, True)
 
     # (throw (string expr))
-    def __execute_throw(self, env, return_type, code):
+    def __execute_throw(self, frame, return_type, code):
         # evaluate the second variable
         # check if string. Treat like a return variable so make sure "execute statement gets it"
         # Need to update begin, if, while for appropriate result when a exception is thrown
         # Need to add something like a ObjectDef.Status_Exception_thrown
         # print(code)
-        term = self.__evaluate_expression(env, code[1], code[0].line_num)
+        term = self.__evaluate_expression(frame, code[1], code[0].line_num)
         val = term.value()
         typ = term.type()
         # print(val, typ, typ.type_name)
-        if typ != Type(InterpreterBase.STRING_DEF):
+        if typ != ObjectDef.STRING_TYPE_CONST:
             self.interpreter.error(
                     ErrorType.TYPE_ERROR,
                     "throwing a non string error",
                     code[0].line_num
                 )
-        return ObjectDef.STATUS_EXCEPTION_THROWN, term
+        raise BrewinThrow(term)  # unwinds to the closest enclosing try, in this method or a caller
     
     # (try (statement-to-try) (catch) )
-    def __execute_try(self, env, return_type, code):
-        # create a new env that adds an exception variable - set it to nothing/null at first
+    # a Python try costs nothing until something is thrown
+    def __execute_try(self, frame, return_type, code):
         # print(code)
-        status, return_value = self.__execute_statement(env, return_type, code[1])
-        # print(status, return_value)
-        if status != ObjectDef.STATUS_EXCEPTION_THROWN:
-            return status, return_value
-        
-        env.block_nest()
-        var_type = Type(InterpreterBase.STRING_DEF)
-        var_name = 'exception'
-        env.create_new_symbol(var_name)
-        var_def = VariableDef(var_type, var_name, return_value)
-        env.set(var_name, var_def)
-        
-        # print("testing here", var_def.type.type_name, var_def.name)
-        status_catch, return_value_catch = self.__execute_statement(env, return_type, code[2])
-        env.block_unnest()
+        try:
+            return self.__execute_statement(frame, return_type, code[1])
+        except BrewinThrow as thrown:
+            exception = thrown.value
+
+        # the catch statement sees the exception variable, whose slot the resolver bound to the try keyword
+        frame[code[0].index] = exception
+        status_catch, return_value_catch = self.__execute_statement(frame, return_type, code[2])
         return status_catch, return_value_catch
 
     # (call object_ref/me methodname param1 param2 param3)
     # where params are expressions, and expresion could be a value, or a (+ ...)
     # statement version of a method call; there's also an expression version of a method call below
-    def __execute_call(self, env, code):
+    def __execute_call(self, frame, code):
         result = self.__execute_call_aux(
-            env, code, code[0].line_num
+            frame, code, code[0].line_num
         )
-        if type(result) is tuple:
-            return result[0], result[1]
         return ObjectDef.STATUS_PROCEED, result
 
     # (set varname expression), where expression could be a value, or a (+ ...)
-    def __execute_set(self, env, code):
-        val = self.__evaluate_expression(env, code[2], code[0].line_num)
-        if type(val) is tuple:
-            return val[0], val[1]
+    def __execute_set(self, frame, code):
+        if type(code[0]) is ResolvedName:
+            if code[0].kind == ResolvedName.INT_STEP:  # (set i (+ i n)) on an int local, see resolver.py
+                frame[code[0].index] = create_int_value(frame[code[0].index].v + code[0].value)
+                return ObjectDef.STATUS_PROCEED, None
+            # the type checker proved the assignment type-safe, see typecheck.py
+            val = self.__evaluate_expression(frame, code[2], code[0].line_num)
+            if code[1].kind == ResolvedName.LOCAL:
+                frame[code[1].index] = val
+            else:
+                self.field_values[code[1].index] = val
+            return ObjectDef.STATUS_PROCEED, None
+        val = self.__evaluate_expression(frame, code[2], code[0].line_num)
         self.__set_variable_aux(
-            env, code[1], val, code[0].line_num
+            frame, code[1], val, code[0].line_num
         )  # checks/reports type and name errors
         return ObjectDef.STATUS_PROCEED, None
 
     # (return expression) where expresion could be a value, or a (+ ...)
-    def __execute_return(self, env, return_type, code):
+    def __execute_return(self, frame, return_type, code):
         if len(code) == 1:
             # [return] with no return value; return default value for type
             return ObjectDef.STATUS_RETURN, None
+        elif type(code[0]) is ResolvedName:
+            if code[0].kind == ResolvedName.TAIL_CALL:  # a call in tail position, see resolver.py
+                return self.__execute_call_aux(frame, code[1], code[0].line_num, return_type)
+            # the type checker proved the return type-safe, see typecheck.py
+            result = self.__evaluate_expression(frame, code[1], code[0].line_num)
+            if result.is_typeless_null():
+                result = return_type.null_value
+            return ObjectDef.STATUS_RETURN, result
         else:
-            result = self.__evaluate_expression(env, code[1], code[0].line_num)
+            result = self.__evaluate_expression(frame, code[1], code[0].line_num)
             # CAREY FIX
-            if type(result) is tuple:
-                return result[0], result[1]
             if result.is_typeless_null():
                 self.__check_type_compatibility(return_type, result.type(), True, code[0].line_num) 
-                result = Value(return_type, None)  # propagate return type to null ###
+                result = return_type.null_value  # propagate return type to null ###
         self.__check_type_compatibility(
             return_type, result.type(), True, code[0].line_num
         )
         return ObjectDef.STATUS_RETURN, result
 
     # (print expression1 expression2 ...) where expresion could be a variable, value, or a (+ ...)
-    def __execute_print(self, env, code):
+    def __execute_print(self, frame, code):
         # print(code)
         output = ""
         for expr in code[1:]:
             # TESTING NOTE: Will not test printing of object references
-            term = self.__evaluate_expression(env, expr, code[0].line_num)
-            if type(term) is tuple:
-                return term[0], term[1]
+            term = self.__evaluate_expression(frame, expr, code[0].line_num)
             val = term.value()
             typ = term.type()
             if typ == ObjectDef.BOOL_TYPE_CONST:
@@ -321,25 +418,31 @@ class ObjectDef:
         return ObjectDef.STATUS_PROCEED, None
 
     # (inputs target_variable) or (inputi target_variable) sets target_variable to input string/int
-    def __execute_input(self, env, code, get_string):
+    def __execute_input(self, frame, code, get_string):
         inp = self.interpreter.get_input()
         if get_string:
             val = Value(ObjectDef.STRING_TYPE_CONST, inp)
         else:
-            val = Value(ObjectDef.INT_TYPE_CONST, int(inp))
+            val = create_int_value(int(inp))
 
-        self.__set_variable_aux(env, code[1], val, code[0].line_num)
+        self.__set_variable_aux(frame, code[1], val, code[0].line_num)
         return ObjectDef.STATUS_PROCEED, None
 
     # helper method used to set either parameter variables or member fields; parameters currently shadow
     # member fields
-    def __set_variable_aux(self, env, var_name, value, line_num):
+    # var_name was bound by the resolver, which applied the shadowing rules
+    def __set_variable_aux(self, frame, var_name, value, line_num):
         # parameters shadows fields, locals shadow parameters (and outer-block locals)
-        if self.__set_local_or_param(
-            env, var_name, value, line_num
-        ):  # may report a type error
+        kind = var_name.kind
+        if kind == ResolvedName.LOCAL:
+            self.__check_type_compatibility(var_name.var_type, value.type(), True, line_num)
+            frame[var_name.index] = value
             return
-        if self.__set_field(var_name, value, line_num):  # may report a type error
+        if kind == ResolvedName.FIELD:
+            self.__check_type_compatibility(
+                self.class_def.field_types[var_name.index], value.type(), True, line_num
+            )
+            self.field_values[var_name.index] = value
             return
         self.interpreter.error(
             ErrorType.NAME_ERROR, "unknown field/variable " + var_name, line_num
@@ -347,24 +450,27 @@ class ObjectDef:
 
     # (if expression (statement) (statement) ) where expresion could be a boolean constant (e.g., true), member
     # variable without ()s, or a boolean expression in parens, like (> 5 a)
-    def __execute_if(self, env, return_type, code):
-        condition = self.__evaluate_expression(env, code[1], code[0].line_num)
-        if type(condition) is tuple:
-            return condition[0], condition[1]
-        if condition.type() != ObjectDef.BOOL_TYPE_CONST:
-            self.interpreter.error(
-                ErrorType.TYPE_ERROR,
-                "non-boolean if condition " + ' '.join(x for x in code[1]),
-                code[0].line_num,
-            )
-        if condition.value():
+    def __execute_if(self, frame, return_type, code):
+        if type(code[0]) is ResolvedName:  # the condition compares ints, see resolver.IntCompare
+            compare = code[0].value
+            is_true = compare.compare(frame[compare.slot].v, compare.get_operand(frame, self.field_values))
+        else:
+            condition = self.__evaluate_expression(frame, code[1], code[0].line_num)
+            if condition.type() != ObjectDef.BOOL_TYPE_CONST:
+                self.interpreter.error(
+                    ErrorType.TYPE_ERROR,
+                    "non-boolean if condition " + ' '.join(x for x in code[1]),
+                    code[0].line_num,
+                )
+            is_true = condition.value()
+        if is_true:
             status, return_value = self.__execute_statement(
-                env, return_type, code[2]
+                frame, return_type, code[2]
             )  # if condition was true
             return status, return_value
         elif len(code) == 4:
             status, return_value = self.__execute_statement(
-                env, return_type, code[3]
+                frame, return_type, code[3]
             )  # if condition was false, do else
             return status, return_value
         else:
@@ -372,9 +478,11 @@ class ObjectDef:
 
     # (while expression (statement) ) where expresion could be a boolean value, boolean member variable,
     # or a boolean expression in parens, like (> 5 a)
-    def __execute_while(self, env, return_type, code):
+    def __execute_while(self, frame, return_type, code):
+        if type(code[0]) is ResolvedName:
+            return self.__execute_counting_loop(frame, return_type, code)
         while True:
-            condition = self.__evaluate_expression(env, code[1], code[0].line_num)
+            condition = self.__evaluate_expression(frame, code[1], code[0].line_num)
             if condition.type() != ObjectDef.BOOL_TYPE_CONST:
                 self.interpreter.error(
                     ErrorType.TYPE_ERROR,
@@ -384,46 +492,54 @@ class ObjectDef:
             if not condition.value():  # condition is false, exit loop immediately
                 return ObjectDef.STATUS_PROCEED, None
             # condition is true, run body of while loop
-            status, return_value = self.__execute_statement(env, return_type, code[2])
-            if status == ObjectDef.STATUS_EXCEPTION_THROWN:
-                return (
-                    status,
-                    return_value,
-                )  # could be a valid return of a value or an error
-            if status == ObjectDef.STATUS_RETURN:
+            status, return_value = self.__execute_statement(frame, return_type, code[2])
+            if status != ObjectDef.STATUS_PROCEED:  # a return or a tail call
                 return (
                     status,
                     return_value,
                 )  # could be a valid return of a value or an error
 
-    # var_def is a VariableDef
+    # a while loop whose condition compares ints (see resolver.IntCompare); an operand that can't change
+    # while the loop runs is only read once
+    def __execute_counting_loop(self, frame, return_type, code):
+        compare = code[0].value
+        test, slot, body = compare.compare, compare.slot, code[2]
+        invariant = compare.invariant
+        if invariant:
+            operand = compare.get_operand(frame, self.field_values)
+        while True:
+            if not invariant:
+                operand = compare.get_operand(frame, self.field_values)
+            if not test(frame[slot].v, operand):
+                return ObjectDef.STATUS_PROCEED, None
+            status, return_value = self.__execute_statement(frame, return_type, body)
+            if status != ObjectDef.STATUS_PROCEED:
+                return status, return_value
+
     # this method checks to see if a variable holds a null value, and if so, changes the type of the null value
-    # to the type of the variable, e.g.,
-    def __propagate_type_to_null(self, var_def):
-        if var_def.value.is_null():
-            return Value(var_def.type, None)
-        return var_def.value
+    # to the declared type of the variable, e.g.,
+    def __propagate_type_to_null(self, value, var_type):
+        if value.is_null():
+            return var_type.null_value
+        return value
 
     # given an expression, return a Value object with the expression's evaluated result
     # expressions could be: constants (true, 5, "blah"), variables (e.g., x), arithmetic/string/logical expressions
     # like (+ 5 6), (+ "abc" "def"), (> a 5), method calls (e.g., (call me foo)), or instantiations (e.g., new dog_class)
-    def __evaluate_expression(self, env, expr, line_num_of_statement):
+    def __evaluate_expression(self, frame, expr, line_num_of_statement):
         if type(expr) is not list:
-            # locals shadow member variables
+            # the resolver bound the name: locals shadow member variables, which shadow constants and me
             # print(expr)
-            var_def = env.get(expr)
-            # print(var_def)
-            if var_def is not None:
-                return self.__propagate_type_to_null(var_def)
-            elif expr in self.fields:
+            kind = expr.kind
+            if kind == ResolvedName.LOCAL:
+                return self.__propagate_type_to_null(frame[expr.index], expr.var_type)
+            if kind == ResolvedName.FIELD:
                 return self.__propagate_type_to_null(
-                    self.fields[expr]
+                    self.field_values[expr.index], self.class_def.field_types[expr.index]
                 )  # return the Value object
-            # need to check for variable name and get its value too
-            value = create_value(expr)
-            if value is not None:
-                return value
-            if expr == InterpreterBase.ME_DEF:
+            if kind == ResolvedName.CONSTANT:
+                return expr.value
+            if kind == ResolvedName.ME:
                 return (
                     self.get_me_as_value()
                 )  # create Value object for current object with right type
@@ -434,58 +550,62 @@ class ObjectDef:
             )
 
         operator = expr[0]
-        if operator in self.binary_op_list:
-            operand1 = self.__evaluate_expression(env, expr[1], line_num_of_statement)
-            operand2 = self.__evaluate_expression(env, expr[2], line_num_of_statement)
-            if type(operand1) is tuple:
-                return operand1
-            if type(operand2) is tuple:
-                return operand2
-                
+        if operator in BINARY_OP_LIST:
+            try:
+                operand1 = self.__evaluate_expression(frame, expr[1], line_num_of_statement)
+            except BrewinThrow:
+                # the second operand is still evaluated, but the first exception is the one thrown
+                try:
+                    self.__evaluate_expression(frame, expr[2], line_num_of_statement)
+                except BrewinThrow:
+                    pass
+                raise
+            operand2 = self.__evaluate_expression(frame, expr[2], line_num_of_statement)
+
             if (
                 operand1.type() == operand2.type()
                 and operand1.type() == ObjectDef.INT_TYPE_CONST
             ):
-                if operator not in self.binary_ops[InterpreterBase.INT_DEF]:
+                if operator not in BINARY_OPS[InterpreterBase.INT_DEF]:
                     self.interpreter.error(
                         ErrorType.TYPE_ERROR,
                         "invalid operator applied to ints",
                         line_num_of_statement,
                     )
-                return self.binary_ops[InterpreterBase.INT_DEF][operator](
+                return BINARY_OPS[InterpreterBase.INT_DEF][operator](
                     operand1, operand2
                 )
             if (
                 operand1.type() == operand2.type()
                 and operand1.type() == ObjectDef.STRING_TYPE_CONST
             ):
-                if operator not in self.binary_ops[InterpreterBase.STRING_DEF]:
+                if operator not in BINARY_OPS[InterpreterBase.STRING_DEF]:
                     self.interpreter.error(
                         ErrorType.TYPE_ERROR,
                         "invalid operator applied to strings",
                         line_num_of_statement,
                     )
-                return self.binary_ops[InterpreterBase.STRING_DEF][operator](
+                return BINARY_OPS[InterpreterBase.STRING_DEF][operator](
                     operand1, operand2
                 )
             if (
                 operand1.type() == operand2.type()
                 and operand1.type() == ObjectDef.BOOL_TYPE_CONST
             ):
-                if operator not in self.binary_ops[InterpreterBase.BOOL_DEF]:
+                if operator not in BINARY_OPS[InterpreterBase.BOOL_DEF]:
                     self.interpreter.error(
                         ErrorType.TYPE_ERROR,
                         "invalid operator applied to bool",
                         line_num_of_statement,
                     )
-                return self.binary_ops[InterpreterBase.BOOL_DEF][operator](
+                return BINARY_OPS[InterpreterBase.BOOL_DEF][operator](
                     operand1, operand2
                 )
             # handle object reference comparisons last
             if self.interpreter.check_type_compatibility(
                 operand1.type(), operand2.type(), False
             ):
-                return self.binary_ops[InterpreterBase.CLASS_DEF][operator](
+                return BINARY_OPS[InterpreterBase.CLASS_DEF][operator](
                     operand1, operand2
                 )
             self.interpreter.error(
@@ -493,26 +613,26 @@ class ObjectDef:
                 f"operator {operator} applied to two incompatible types",
                 line_num_of_statement,
             )
-        if operator in self.unary_op_list:
-            operand = self.__evaluate_expression(env, expr[1], line_num_of_statement)
+        if operator in UNARY_OP_LIST:
+            operand = self.__evaluate_expression(frame, expr[1], line_num_of_statement)
             if operand.type() == ObjectDef.BOOL_TYPE_CONST:
-                if operator not in self.unary_ops[InterpreterBase.BOOL_DEF]:
+                if operator not in UNARY_OPS[InterpreterBase.BOOL_DEF]:
                     self.interpreter.error(
                         ErrorType.TYPE_ERROR,
                         "invalid unary operator applied to bool",
                         line_num_of_statement,
                     )
-                return self.unary_ops[InterpreterBase.BOOL_DEF][operator](operand)
+                return UNARY_OPS[InterpreterBase.BOOL_DEF][operator](operand)
 
         # handle call expression: (call objref methodname p1 p2 p3)
         if operator == InterpreterBase.CALL_DEF:
-            return self.__execute_call_aux(env, expr, line_num_of_statement)
+            return self.__execute_call_aux(frame, expr, line_num_of_statement)
         # handle new expression: (new classname)
         if operator == InterpreterBase.NEW_DEF:
-            return self.__execute_new_aux(env, expr, line_num_of_statement)
+            return self.__execute_new_aux(frame, expr, line_num_of_statement)
 
     # (new classname)
-    def __execute_new_aux(self, env, code, line_num_of_statement):
+    def __execute_new_aux(self, frame, code, line_num_of_statement):
         class_name = code[1]
         
         obj = self.interpreter.instantiate(code[1], line_num_of_statement)
@@ -526,7 +646,9 @@ class ObjectDef:
 
     # this method is a helper used by call statements and call expressions
     # (call object_ref/me methodname p1 p2 p3)
-    def __execute_call_aux(self, env, code, line_num_of_statement):
+    # for a call in tail position, tail_return_type is the return type of the calling method, and the call
+    # isn't made: it returns (STATUS_TAIL_CALL, TailCall) for call_method to make
+    def __execute_call_aux(self, frame, code, line_num_of_statement, tail_return_type=None):
         # determine which object we want to call the method on
         super_only = False
         obj_name = code[1]
@@ -544,50 +666,26 @@ class ObjectDef:
             super_only = True
         else:
             # return a Value() object which has a type and a value
-            obj_val = self.__evaluate_expression(env, obj_name, line_num_of_statement)
+            obj_val = self.__evaluate_expression(frame, obj_name, line_num_of_statement)
             # print("val", obj_val)
             if obj_val.is_null():
                 self.interpreter.error(
                     ErrorType.FAULT_ERROR, "null dereference", line_num_of_statement
                 )
             obj = obj_val.value()
-        # prepare the actual arguments for passing
+        # prepare the actual arguments for passing; each one is evaluated exactly once
         actual_args = []
         for expr in code[3:]:
-            evaluated = self.__evaluate_expression(env, expr, line_num_of_statement)
-            if type(evaluated) is tuple:
-                return evaluated[0], evaluated[1]
-            actual_args.append(
-                self.__evaluate_expression(env, expr, line_num_of_statement)
+            evaluated = self.__evaluate_expression(frame, expr, line_num_of_statement)
+            actual_args.append(evaluated)
+        if tail_return_type is not None:
+            return ObjectDef.STATUS_TAIL_CALL, TailCall(
+                obj, code[2], actual_args, super_only, line_num_of_statement,
+                self.interpreter.get_inline_cache(code), tail_return_type,
             )
-        return obj.call_method(code[2], actual_args, super_only, line_num_of_statement)
-
-    def __map_method_names_to_method_definitions(self):
-        self.methods = {}
-        for method in self.class_def.get_methods():
-            self.methods[method.method_name] = method
-
-    def __instantiate_fields(self):
-        self.fields = {}
-        # get_fields() returns a set of VariableDefs
-        for vardef in self.class_def.get_fields():
-            self.fields[vardef.name] = copy.copy(vardef)
-
-    def __set_field(self, field_name, value, line_num):
-        if field_name not in self.fields:
-            return False
-        var_def = self.fields[field_name]
-        self.__check_type_compatibility(var_def.type, value.type(), True, line_num)
-        var_def.set_value(value)
-        return True
-
-    def __set_local_or_param(self, env, var_name, value, line_num):
-        var_def = env.get(var_name)
-        if var_def is None:
-            return False
-        self.__check_type_compatibility(var_def.type, value.type(), True, line_num)
-        var_def.set_value(value)
-        return True
+        return obj.call_method(
+            code[2], actual_args, super_only, line_num_of_statement, self.interpreter.get_inline_cache(code)
+        )
 
     def __check_type_compatibility(
         self, lvalue_type, rvalue_type, for_assignment, line_num
@@ -601,64 +699,6 @@ class ObjectDef:
                 line_num,
             )
 
-    def __create_map_of_operations_to_lambdas(self):
-        self.binary_op_list = [
-            "+",
-            "-",
-            "*",
-            "/",
-            "%",
-            "==",
-            "!=",
-            "<",
-            "<=",
-            ">",
-            ">=",
-            "&",
-            "|",
-        ]
-        self.unary_op_list = ["!"]
-        self.binary_ops = {}
-        self.binary_ops[InterpreterBase.INT_DEF] = {
-            "+": lambda a, b: Value(ObjectDef.INT_TYPE_CONST, a.value() + b.value()),
-            "-": lambda a, b: Value(ObjectDef.INT_TYPE_CONST, a.value() - b.value()),
-            "*": lambda a, b: Value(ObjectDef.INT_TYPE_CONST, a.value() * b.value()),
-            "/": lambda a, b: Value(
-                ObjectDef.INT_TYPE_CONST, a.value() // b.value()
-            ),  # // for integer ops
-            "%": lambda a, b: Value(ObjectDef.INT_TYPE_CONST, a.value() % b.value()),
-            "==": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() == b.value()),
-            "!=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() != b.value()),
-            ">": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() > b.value()),
-            "<": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() < b.value()),
-            ">=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() >= b.value()),
-            "<=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() <= b.value()),
-        }
-        self.binary_ops[InterpreterBase.STRING_DEF] = {
-            "+": lambda a, b: Value(ObjectDef.STRING_TYPE_CONST, a.value() + b.value()),
-            "==": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() == b.value()),
-            "!=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() != b.value()),
-            ">": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() > b.value()),
-            "<": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() < b.value()),
-            ">=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() >= b.value()),
-            "<=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() <= b.value()),
-        }
-        self.binary_ops[InterpreterBase.BOOL_DEF] = {
-            "&": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() and b.value()),
-            "|": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() or b.value()),
-            "==": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() == b.value()),
-            "!=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() != b.value()),
-        }
-        self.binary_ops[InterpreterBase.CLASS_DEF] = {
-            "==": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() == b.value()),
-            "!=": lambda a, b: Value(ObjectDef.BOOL_TYPE_CONST, a.value() != b.value()),
-        }
-
-        self.unary_ops = {}
-        self.unary_ops[InterpreterBase.BOOL_DEF] = {
-            "!": lambda a: Value(ObjectDef.BOOL_TYPE_CONST, not a.value()),
-        }
-
     def __init_superclass_if_any(self):
         superclass_def = self.class_def.get_superclass()
         if superclass_def is None:
@@ -668,3 +708,257 @@ class ObjectDef:
         self.super_object = ObjectDef(
             self.interpreter, superclass_def, self.anchor_object, self.trace_output
         )
+
+
+# raised for a Brewin throw by the tree engine and by transpiled code; value is the thrown string Value
+class BrewinThrow(Exception):
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+# a call made by (return (call ...)) in tail position, to be made by ObjectDef.call_method once the calling
+# method has returned; return_type is the return type of the calling method
+class TailCall:
+    def __init__(self, obj, method_name, actual_params, super_only, line_num, inline_cache, return_type):
+        self.obj = obj
+        self.method_name = method_name
+        self.actual_params = actual_params
+        self.super_only = super_only
+        self.line_num = line_num
+        self.inline_cache = inline_cache
+        self.return_type = return_type
+        self.memos = None  # set by call_method when a memoized method made this call
+
+
+# Caches the result of method dispatch at one call site. Which object part handles a call only depends on
+# the class of the part the call is made on, the class of the whole (anchor) object and the types of the
+# arguments, so for each such key the cache remembers the handling part's index in anchor.object_parts.
+# A hit skips both searches of the super_object chain and every parameter type check. A site that sees
+# more than MAX_ENTRIES keys is megamorphic: further keys are resolved without being cached.
+# If the method found by the first lookup of a site is an InlinedMethod (a trivial getter or setter), the
+# site runs it in place of the call for as long as the receiver has the classes and argument types of that
+# first lookup. The site is deoptimized for good once a receiver resolves to a different method, e.g., an
+# override in a subclass.
+class InlineCache:
+    MAX_ENTRIES = 8
+    all_caches = weakref.WeakSet()  # for get_inline_cache_stats
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.inlined = None  # the InlinedMethod run in place of calls, if any
+        self.inlined_class = None  # the classes of the part and the anchor, and the argument type, it runs for
+        self.inlined_anchor_class = None
+        self.inlined_arg_type = None
+        self.deoptimized = False
+        InlineCache.all_caches.add(self)
+
+    # runs the inlined method for (call obj ... actual_params) and returns its result, or returns None if the
+    # call isn't the one the method was inlined for
+    def call_inlined(self, obj, actual_params):
+        if obj.class_def is not self.inlined_class or obj.anchor_object.class_def is not self.inlined_anchor_class:
+            return None
+        inlined = self.inlined
+        if inlined.kind == InlinedMethod.SETTER:
+            value = actual_params[0]
+            if type(value) is not Value or value.t is not self.inlined_arg_type:
+                return None
+            obj.interpreter.statements_executed += inlined.num_statements
+            obj.field_values[inlined.index] = inlined.null_value if value.is_null() else value
+            self.hits += 1
+            return inlined.value
+        obj.interpreter.statements_executed += inlined.num_statements
+        self.hits += 1
+        if inlined.kind == InlinedMethod.CONSTANT:
+            return inlined.value
+        value = obj.field_values[inlined.index]
+        return inlined.null_value if value.is_null() else value
+
+    # returns the object part that handles (call obj method_name actual_params)
+    def lookup(self, obj, method_name, actual_params, super_only, line_num_of_caller):
+        anchor = obj.anchor_object
+        try:
+            key = (
+                obj.class_def,
+                anchor.class_def,
+                tuple([(arg.t.type_name, arg.t.supertype_name, arg.t.full_name) for arg in actual_params]),
+            )
+        except AttributeError:  # an argument isn't a Value; resolve it uncached so it fails the same way
+            return obj.resolve_method(method_name, actual_params, super_only, line_num_of_caller)
+        index = self.entries.get(key)
+        if index is not None:
+            self.hits += 1
+            return anchor.object_parts[index] if index else anchor
+        self.misses += 1
+        obj_to_call_on = obj.resolve_method(method_name, actual_params, super_only, line_num_of_caller)
+        method_def = obj_to_call_on.class_def.method_map[method_name]
+        if self.inlined is not None:
+            if method_def is not self.inlined.method_def:
+                self.inlined = None
+                self.deoptimized = True
+        elif not self.entries and not self.deoptimized and obj.interpreter.optimize:
+            inlined = get_inlined_method(obj.interpreter, obj_to_call_on.class_def, method_def)
+            if inlined is not None:
+                self.inlined = inlined
+                self.inlined_class = obj.class_def
+                self.inlined_anchor_class = anchor.class_def
+                self.inlined_arg_type = actual_params[0].t if actual_params else None
+        if len(self.entries) < InlineCache.MAX_ENTRIES:
+            if obj_to_call_on is anchor:
+                self.entries[key] = 0
+            else:
+                self.entries[key] = anchor.object_parts.index(obj_to_call_on)
+        return obj_to_call_on
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+# A method whose body is a single trivial statement, possibly wrapped in begins, which an InlineCache can
+# run without making the call:
+# - a getter, (return field), or (return constant), with no parameters
+# - a setter, (set field param), with one parameter
+# Only methods whose return (or assignment) can't fail a type check are inlined, so running one is just a
+# read or write of the object's field_values plus the statement count of the body
+class InlinedMethod:
+    GETTER = 0  # index is the field's offset and null_value the null of the field's type
+    CONSTANT = 1  # value is the returned Value
+    SETTER = 2  # index is the field's offset, null_value the null of the parameter's type and value the result
+
+    def __init__(self, method_def, kind, num_statements, index=None, null_value=None, value=None):
+        self.method_def = method_def
+        self.kind = kind
+        self.num_statements = num_statements
+        self.index = index
+        self.null_value = null_value
+        self.value = value
+
+
+# returns the InlinedMethod for method_def (a member of class_def), or None if it can't be inlined; the
+# answer is worked out once and kept on the MethodDef
+def get_inlined_method(interpreter, class_def, method_def):
+    if method_def.inlined is None:
+        method_def.inlined = make_inlined_method(interpreter, class_def, method_def) or False
+    return method_def.inlined or None
+
+
+def make_inlined_method(interpreter, class_def, method_def):
+    code = method_def.get_code()
+    num_statements = 1
+    while type(code) is list and len(code) == 2 and code[0] == InterpreterBase.BEGIN_DEF:
+        code = code[1]
+        num_statements += 1
+    if type(code) is not list or not code or any(type(item) is list for item in code):
+        return None
+    params = method_def.get_formal_params()
+    return_type = method_def.get_return_type()
+    # names are bound like the resolver binds them: parameters shadow fields, which shadow constants
+    if code[0] == InterpreterBase.RETURN_DEF and len(code) == 2 and not params:
+        if code[1] in class_def.field_index:
+            index = class_def.field_index[code[1]]
+            field_type = class_def.field_types[index]
+            if interpreter.check_type_compatibility(return_type, field_type, True):
+                return InlinedMethod(
+                    method_def, InlinedMethod.GETTER, num_statements, index, field_type.null_value
+                )
+            return None
+        value = create_value(code[1])
+        if value is None or not interpreter.check_type_compatibility(return_type, value.type(), True):
+            return None
+        if value.is_typeless_null():
+            value = return_type.null_value  # propagate return type to null
+        return InlinedMethod(method_def, InlinedMethod.CONSTANT, num_statements, value=value)
+    if code[0] == InterpreterBase.SET_DEF and len(code) == 3 and len(params) == 1:
+        param = params[0]
+        if code[2] != param.name or code[1] == param.name or code[1] not in class_def.field_index:
+            return None
+        index = class_def.field_index[code[1]]
+        if not interpreter.check_type_compatibility(class_def.field_types[index], param.type, True):
+            return None
+        return InlinedMethod(
+            method_def,
+            InlinedMethod.SETTER,
+            num_statements,
+            index,
+            param.type.null_value,
+            create_default_value(return_type),
+        )
+    return None
+
+
+# returns hit/miss totals over every live InlineCache, and how many sites are monomorphic (one entry),
+# polymorphic or megamorphic (full)
+def get_inline_cache_stats():
+    stats = {"sites": 0, "hits": 0, "misses": 0, "monomorphic": 0, "polymorphic": 0, "megamorphic": 0}
+    for cache in list(InlineCache.all_caches):
+        stats["sites"] += 1
+        stats["hits"] += cache.hits
+        stats["misses"] += cache.misses
+        if len(cache.entries) >= InlineCache.MAX_ENTRIES:
+            stats["megamorphic"] += 1
+        elif len(cache.entries) > 1:
+            stats["polymorphic"] += 1
+        elif cache.entries:
+            stats["monomorphic"] += 1
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+# maps used for binary and unary operations, e.g., (+ 5 6); shared by all objects
+BINARY_OP_LIST = [
+    "+",
+    "-",
+    "*",
+    "/",
+    "%",
+    "==",
+    "!=",
+    "<",
+    "<=",
+    ">",
+    ">=",
+    "&",
+    "|",
+]
+UNARY_OP_LIST = ["!"]
+BINARY_OPS = {}
+BINARY_OPS[InterpreterBase.INT_DEF] = {
+    "+": lambda a, b: create_int_value(a.value() + b.value()),
+    "-": lambda a, b: create_int_value(a.value() - b.value()),
+    "*": lambda a, b: create_int_value(a.value() * b.value()),
+    "/": lambda a, b: create_int_value(a.value() // b.value()),  # // for integer ops
+    "%": lambda a, b: create_int_value(a.value() % b.value()),
+    "==": lambda a, b: create_bool_value(a.value() == b.value()),
+    "!=": lambda a, b: create_bool_value(a.value() != b.value()),
+    ">": lambda a, b: create_bool_value(a.value() > b.value()),
+    "<": lambda a, b: create_bool_value(a.value() < b.value()),
+    ">=": lambda a, b: create_bool_value(a.value() >= b.value()),
+    "<=": lambda a, b: create_bool_value(a.value() <= b.value()),
+}
+BINARY_OPS[InterpreterBase.STRING_DEF] = {
+    "+": lambda a, b: Value(ObjectDef.STRING_TYPE_CONST, a.value() + b.value()),
+    "==": lambda a, b: create_bool_value(a.value() == b.value()),
+    "!=": lambda a, b: create_bool_value(a.value() != b.value()),
+    ">": lambda a, b: create_bool_value(a.value() > b.value()),
+    "<": lambda a, b: create_bool_value(a.value() < b.value()),
+    ">=": lambda a, b: create_bool_value(a.value() >= b.value()),
+    "<=": lambda a, b: create_bool_value(a.value() <= b.value()),
+}
+BINARY_OPS[InterpreterBase.BOOL_DEF] = {
+    "&": lambda a, b: create_bool_value(a.value() and b.value()),
+    "|": lambda a, b: create_bool_value(a.value() or b.value()),
+    "==": lambda a, b: create_bool_value(a.value() == b.value()),
+    "!=": lambda a, b: create_bool_value(a.value() != b.value()),
+}
+BINARY_OPS[InterpreterBase.CLASS_DEF] = {
+    "==": lambda a, b: create_bool_value(a.value() == b.value()),
+    "!=": lambda a, b: create_bool_value(a.value() != b.value()),
+}
+
+UNARY_OPS = {}
+UNARY_OPS[InterpreterBase.BOOL_DEF] = {
+    "!": lambda a: create_bool_value(not a.value()),
+}
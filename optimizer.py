@@ -0,0 +1,175 @@
+"""
+Load-time optimization of method bodies, shared by every engine.
+
+Once a class is built, optimize_class rewrites the body of each of its methods:
+- constant subexpressions over int, string and bool literals are folded into one literal, e.g.
+  (+ 5 6) becomes 11 and (! (== "a" "b")) becomes true
+- an if whose condition is a constant bool is replaced by a begin holding the branch that would run
+  (an empty begin if none would), and a while whose condition is false by an empty begin; a begin counts
+  as one statement, just like the if or while it replaces
+
+Only expressions that cannot fail are folded: an operator applied to mismatched types or to the wrong
+number of operands, and division or modulo by zero, are left in place so they still fail at run time,
+at the same line. A folded literal keeps the line number of the operator it replaces. Literals are
+turned into Values when a body is resolved or compiled, so only the folding happens here.
+
+A literal is only treated as a constant if no field, parameter or local of the method has that name
+(locals shadow constants). The parsed lists are never modified: the optimized body is a copy, stored as
+the MethodDef's code.
+"""
+
+from bparser import StringWithLineNumber
+from intbase import InterpreterBase
+from objectv2 import BINARY_OP_LIST, UNARY_OP_LIST, BINARY_OPS, UNARY_OPS
+from resolver import EXCEPTION_VAR_NAME
+from type_valuev2 import BOOL_TYPE, STRING_TYPE, create_value
+
+FOLDABLE_TYPES = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF}
+BOOL_OPERATORS = {"==", "!=", "<", ">", "<=", ">=", "&", "|", "!"}  # operators that only produce bools
+
+
+# optimizes the body of every method defined by class_def (a non-templated or specialized class)
+def optimize_class(class_def):
+    for method_def in class_def.get_methods():
+        method_def.code = MethodOptimizer(class_def, method_def).optimize()
+
+
+# returns the literal token for a Value of a foldable type, e.g., 11, true or "ab"
+def make_literal(value, line_num):
+    if value.type() == BOOL_TYPE:
+        text = InterpreterBase.TRUE_DEF if value.value() else InterpreterBase.FALSE_DEF
+    elif value.type() == STRING_TYPE:
+        text = '"' + value.value() + '"'
+    else:
+        text = str(value.value())
+    return StringWithLineNumber(text, line_num)
+
+
+# returns the names of every let variable declared in code
+def get_let_names(code):
+    names = set()
+    if type(code) is not list or not code:
+        return names
+    if code[0] == InterpreterBase.LET_DEF and len(code) > 1 and type(code[1]) is list:
+        for var_def in code[1]:
+            if type(var_def) is list and len(var_def) > 1 and type(var_def[1]) is not list:
+                names.add(var_def[1])
+    for item in code[1:]:
+        names |= get_let_names(item)
+    return names
+
+
+# optimizes one method body. Anything malformed is copied as is, so it fails the same way when it runs.
+class MethodOptimizer:
+    def __init__(self, class_def, method_def):
+        self.method_def = method_def
+        # every name that could shadow a constant somewhere in the body
+        self.names = set(class_def.field_index)
+        self.names.update(param.name for param in method_def.get_formal_params())
+        self.names.update(get_let_names(method_def.get_code()))
+        self.names.add(EXCEPTION_VAR_NAME)
+
+    def optimize(self):
+        return self.optimize_statement(self.method_def.get_code())
+
+    def optimize_statement(self, code):
+        if type(code) is not list or not code:
+            return code
+        tok = code[0]
+        if tok == InterpreterBase.IF_DEF:
+            return self.__optimize_if(code)
+        if tok == InterpreterBase.WHILE_DEF:
+            return self.__optimize_while(code)
+        if tok == InterpreterBase.BEGIN_DEF:
+            return [tok] + [self.optimize_statement(statement) for statement in code[1:]]
+        if tok in (InterpreterBase.SET_DEF, InterpreterBase.CALL_DEF):
+            # (set name expr) and (call target methodname arg1 arg2 ...)
+            first = 2 if tok == InterpreterBase.SET_DEF else 3
+            return code[:first] + [self.optimize_expression(expr) for expr in code[first:]]
+        if tok in (InterpreterBase.RETURN_DEF, InterpreterBase.PRINT_DEF, InterpreterBase.THROW_DEF):
+            return [tok] + [self.optimize_expression(expr) for expr in code[1:]]
+        if tok == InterpreterBase.LET_DEF:
+            return code[:2] + [self.optimize_statement(statement) for statement in code[2:]]
+        if tok == InterpreterBase.TRY_DEF:
+            return [tok] + [self.optimize_statement(statement) for statement in code[1:3]] + code[3:]
+        return code
+
+    # (if expression (statement) [(statement)])
+    def __optimize_if(self, code):
+        if len(code) not in (3, 4):
+            return code
+        condition = self.__optimize_condition(code[1])
+        statements = [self.optimize_statement(statement) for statement in code[2:]]
+        value = self.__get_constant(condition)
+        if value is None or value.type() != BOOL_TYPE:
+            return [code[0], condition] + statements
+        begin = StringWithLineNumber(InterpreterBase.BEGIN_DEF, code[0].line_num)
+        if value.value():
+            return [begin, statements[0]]
+        return [begin] + statements[1:]
+
+    # (while expression (statement))
+    def __optimize_while(self, code):
+        if len(code) != 3:
+            return code
+        condition = self.__optimize_condition(code[1])
+        value = self.__get_constant(condition)
+        if value is not None and value.type() == BOOL_TYPE and not value.value():
+            return [StringWithLineNumber(InterpreterBase.BEGIN_DEF, code[0].line_num)]
+        return [code[0], condition, self.optimize_statement(code[2])]
+
+    # the error for a non-bool if/while condition quotes the condition as written, so the condition is only
+    # rewritten if it folds to a bool or its operator can only produce one
+    def __optimize_condition(self, expr):
+        condition = self.optimize_expression(expr)
+        if type(condition) is list:
+            return condition if condition and condition[0] in BOOL_OPERATORS else expr
+        value = self.__get_constant(condition)
+        return condition if value is not None and value.type() == BOOL_TYPE else expr
+
+    def optimize_expression(self, expr):
+        if type(expr) is not list or not expr or expr[0] == InterpreterBase.NEW_DEF:
+            return expr
+        if expr[0] == InterpreterBase.CALL_DEF:
+            return self.optimize_statement(expr)
+        operands = [self.optimize_expression(operand) for operand in expr[1:]]
+        folded = None
+        if expr[0] in BINARY_OP_LIST and len(operands) == 2:
+            folded = self.__fold_binary(expr[0], operands[0], operands[1])
+        elif expr[0] in UNARY_OP_LIST and len(operands) == 1:
+            folded = self.__fold_unary(expr[0], operands[0])
+        if folded is None:
+            return [expr[0]] + operands
+        return make_literal(folded, expr[0].line_num)
+
+    # returns the Value of expr if it is an int, string or bool literal, otherwise None
+    def __get_constant(self, expr):
+        if type(expr) is list or expr in self.names:
+            return None
+        value = create_value(expr)
+        if value is None or value.type().type_name not in FOLDABLE_TYPES:
+            return None
+        return value
+
+    # returns the Value of (operator operand1 operand2), or None if it can't be folded
+    def __fold_binary(self, operator, operand1, operand2):
+        value1 = self.__get_constant(operand1)
+        value2 = self.__get_constant(operand2)
+        if value1 is None or value2 is None or value1.type() != value2.type():
+            return None
+        operations = BINARY_OPS[value1.type().type_name]
+        if operator not in operations:
+            return None  # a type error, reported when the expression runs
+        if operator in ("/", "%") and value2.value() == 0:
+            return None
+        return operations[operator](value1, value2)
+
+    # returns the Value of (operator operand), or None if it can't be folded
+    def __fold_unary(self, operator, operand):
+        value = self.__get_constant(operand)
+        if value is None or value.type().type_name not in UNARY_OPS:
+            return None
+        operations = UNARY_OPS[value.type().type_name]
+        if operator not in operations:
+            return None
+        return operations[operator](value)
@@ -0,0 +1,161 @@
+import hashlib
+import marshal
+import os
+import tempfile
+
+from bparser import BParser, StringWithLineNumber
+
+
+# returns (token_table, tree) for parsed lists: every distinct (token, line number) pair is stored once in
+# token_table and the nested lists refer to it by index; both only hold marshallable strs, ints and lists
+def encode_tree(parsed_program):
+    token_table = []
+    token_index = {}
+
+    def encode(item):
+        if type(item) is list:
+            return [encode(sub) for sub in item]
+        entry = (str(item), getattr(item, "line_num", None))
+        index = token_index.get(entry)
+        if index is None:
+            index = len(token_table)
+            token_index[entry] = index
+            token_table.append(entry)
+        return index
+
+    return token_table, encode(parsed_program)
+
+
+# the inverse of encode_tree; returns the parsed lists with StringWithLineNumber tokens
+def decode_tree(token_table, tree):
+    tokens = [StringWithLineNumber(text, line_num) for text, line_num in token_table]
+
+    def decode(item):
+        if type(item) is list:
+            return [decode(sub) for sub in item]
+        return tokens[item]
+
+    return decode(tree)
+
+
+# On-disk cache of parsed Brewin programs, keyed by a hash of the program's source lines.
+# Each entry stores the parsed lists in a compact form: every distinct (token, line number) pair is
+# stored once in a table and the nested lists refer to it by index, so the line numbers that the
+# error reporting in ClassDef/ObjectDef relies on survive the round trip.
+# The cache is capped at max_bytes; the least recently used entries are evicted first.
+class ParseCache:
+    FORMAT_VERSION = 1
+    FILE_SUFFIX = ".bpc"
+
+    def __init__(self, cache_dir=None, max_bytes=64 * 1024 * 1024):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "brewin", "parse")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # same contract as BParser.parse: returns (status, parsed_program); only successful parses are cached
+    def parse(self, program):
+        key = self.get_key(program)
+        parsed_program = self.load(key)
+        if parsed_program is not None:
+            self.hits += 1
+            return True, parsed_program
+        self.misses += 1
+        status, parsed_program = BParser.parse(program)
+        if status:
+            self.store(key, parsed_program)
+        return status, parsed_program
+
+    # program is a list of strings, one string per line of source code
+    def get_key(self, program):
+        digest = hashlib.sha256()
+        digest.update(str(ParseCache.FORMAT_VERSION).encode())
+        for line in program:
+            digest.update(b"\n")
+            digest.update(line.encode())
+        return digest.hexdigest()
+
+    # returns the parsed program for key, or None if it isn't cached (or the entry is unreadable)
+    def load(self, key):
+        path = self.__get_path(key)
+        try:
+            with open(path, "rb") as f:
+                version, token_table, tree = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != ParseCache.FORMAT_VERSION:
+            return None
+        try:
+            os.utime(path)  # mark as most recently used
+        except OSError:
+            pass  # another process evicted it since the read; what was read is still good
+        return decode_tree(token_table, tree)
+
+    def store(self, key, parsed_program):
+        token_table, tree = encode_tree(parsed_program)
+        data = marshal.dumps((ParseCache.FORMAT_VERSION, token_table, tree))
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.__get_path(key))  # atomic, so readers never see a partial entry
+        self.__evict_if_needed()
+
+    # remove the cached entry for a program, if any
+    def invalidate(self, program):
+        try:
+            os.remove(self.__get_path(self.get_key(program)))
+            return True
+        except FileNotFoundError:
+            return False
+
+    # remove every cached entry
+    def clear(self):
+        for path, _, _ in self.__get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self):
+        entries = self.__get_entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+    def __get_path(self, key):
+        return os.path.join(self.cache_dir, key + ParseCache.FILE_SUFFIX)
+
+    # returns a list of (path, size, last_used) for every entry in the cache directory
+    def __get_entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(ParseCache.FILE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def __evict_if_needed(self):
+        entries = self.__get_entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort(key=lambda entry: entry[2])  # least recently used first
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
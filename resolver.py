@@ -0,0 +1,360 @@
+"""
+Lexical addressing for the tree-walking engine (ObjectDef).
+
+The first time a method runs, resolve_body binds every identifier occurrence in its body once, so that
+ObjectDef never has to search for a name at run time:
+- a name read by an expression becomes a local/parameter slot, a field offset, a literal Value, me, or an
+  unknown name (reported when evaluated), with the precedence of the original lookup: locals shadow
+  fields, which shadow constants, which shadow me
+- a name assigned by set/inputi/inputs becomes a local/parameter slot, a field offset or an unknown name
+
+Locals and parameters live in one list per call, the frame, instead of an EnvironmentManager. The
+parameters take slots 0..n-1 (the list of arguments is extended into the frame) and every let variable, and
+the exception variable of a catch, takes the next free slot; a slot is reused once its block has ended,
+since lexical scope is static.
+
+Each bound identifier is replaced by a ResolvedName, a copy of the token that carries the binding, so
+error messages, line numbers and trace output are unchanged. The slot of a catch's exception variable is
+carried by the try keyword. The parsed lists are never modified: the resolved body is a copy, cached on
+the MethodDef.
+
+When the program is optimized (Interpreter(optimize=True)), two common shapes of counting loops are also
+marked on their keywords, so ObjectDef can run them as single steps (superinstructions):
+- an if or while whose condition compares an int local with an int local, field or constant carries an
+  IntCompare, evaluated without building any Value; a while also reads the other operand only once if it
+  can't change while the loop runs (a local the body doesn't assign, or a field the body neither assigns
+  nor could assign through a call)
+- (set i (+ i n)), (set i (+ n i)) or (set i (- i n)), with i an int local and n an int constant, carries
+  the slot of i and the amount it changes by
+
+Whether or not the program is optimized, a (return (call ...)) that isn't inside the statement of a try is
+marked as a tail call: ObjectDef makes the call once the calling method has returned, so a chain of tail
+calls runs in constant stack space.
+"""
+
+import operator
+from bparser import StringWithLineNumber
+from intbase import InterpreterBase
+from type_valuev2 import Type, INT_TYPE, create_value
+
+EXCEPTION_VAR_NAME = 'exception'  # the variable holding the thrown string inside a catch statement
+
+INT_COMPARISONS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+MIRRORED_COMPARISONS = {"<": ">", ">": "<", "<=": ">=", ">=": "<=", "==": "==", "!=": "!="}
+
+
+# an identifier bound by MethodResolver
+class ResolvedName(StringWithLineNumber):
+    # binding kinds
+    LOCAL = 0  # a local or parameter; index is its slot in the frame and var_type its declared Type
+    FIELD = 1  # index is the field's offset in ObjectDef.field_values
+    CONSTANT = 2  # value is the literal's Value
+    ME = 3
+    UNKNOWN = 4
+    # superinstructions, carried by statement keywords
+    INT_COMPARE = 5  # an if/while whose condition is value, an IntCompare
+    INT_STEP = 6  # (set i (+ i n)); index is the slot of i and value is n (or -n for a -)
+    TAIL_CALL = 7  # (return (call ...)) in tail position
+    UNCHECKED = 8  # a set, return or let proved type-safe by typecheck.py; value is a let's (slot, default)s
+
+    def __new__(cls, name, kind, index=None, var_type=None, value=None):
+        resolved = str.__new__(cls, name)
+        resolved.line_num = getattr(name, "line_num", None)
+        resolved.kind = kind
+        resolved.index = index  # None for a let variable that duplicates an earlier one of the same let
+        resolved.var_type = var_type
+        resolved.value = value
+        return resolved
+
+
+# the condition (compare local operand) of an if/while, where local is an int local and operand an int
+# local, field or constant; operand_kind is the ResolvedName kind of the operand and operand its slot,
+# offset or (for a constant) its int value
+class IntCompare:
+    def __init__(self, compare, slot, operand_kind, operand):
+        self.compare = compare  # e.g., operator.lt
+        self.slot = slot
+        self.operand_kind = operand_kind
+        self.operand = operand
+        self.invariant = operand_kind == ResolvedName.CONSTANT  # set by the resolver for while loops
+
+    # returns the operand's current int value
+    def get_operand(self, frame, field_values):
+        if self.operand_kind == ResolvedName.LOCAL:
+            return frame[self.operand].v
+        if self.operand_kind == ResolvedName.FIELD:
+            return field_values[self.operand].v
+        return self.operand
+
+
+class ResolvedMethod:
+    def __init__(self, code, num_slots, num_params):
+        self.code = code
+        self.num_slots = num_slots  # the size of the frame, parameters included
+        self.local_slots = [None] * (num_slots - num_params)  # appended to the arguments to make the frame
+
+
+# returns the ResolvedMethod of method_def (a member of class_def), resolving it on first use
+def resolve_body(class_def, method_def):
+    resolved = method_def.resolved
+    if resolved is None:
+        resolved = MethodResolver(class_def, method_def, class_def.interpreter.optimize).resolve()
+        method_def.resolved = resolved
+    return resolved
+
+
+# returns a Type for a type name, e.g., Type("int") or Type("box", full_name="box@int")
+def get_type_for_name(typename):
+    if '@' in typename:
+        return Type(typename[0:typename.find('@')], full_name=typename)
+    return Type(typename)
+
+
+# resolves one method body. Anything the tree walker would fail on (a malformed statement or
+# expression) is copied unresolved, so it still fails the same way, and only when it runs.
+class MethodResolver:
+    def __init__(self, class_def, method_def, fuse=False):
+        self.field_index = class_def.field_index
+        self.field_types = class_def.field_types
+        self.method_def = method_def
+        self.fuse = fuse  # whether to mark superinstructions
+        self.try_depth = 0  # the number of try statements the statement being resolved is inside
+        self.scopes = [{}]  # name -> (slot, Type) of the locals/parameters in scope, one dict per block
+        self.next_slot = 0
+        self.num_slots = 0
+        for param in method_def.get_formal_params():
+            self.__declare(param.name, param.type)
+
+    def resolve(self):
+        code = self.resolve_statement(self.method_def.get_code())
+        return ResolvedMethod(code, self.num_slots, len(self.method_def.get_formal_params()))
+
+    def __declare(self, name, var_type):
+        slot = self.next_slot
+        self.next_slot += 1
+        self.num_slots = max(self.num_slots, self.next_slot)
+        self.scopes[-1][name] = (slot, var_type)
+        return slot
+
+    def __find_local(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def __nest(self):
+        self.scopes.append({})
+        return self.next_slot
+
+    def __unnest(self, next_slot):
+        self.scopes.pop()
+        self.next_slot = next_slot
+
+    def resolve_statement(self, code):
+        if type(code) is not list or not code:
+            return code
+        tok = code[0]
+        if tok in (InterpreterBase.BEGIN_DEF, InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF):
+            # the condition of an if/while is evaluated like any expression
+            first = 2 if tok != InterpreterBase.BEGIN_DEF else 1
+            resolved = (
+                [tok]
+                + [self.resolve_expression(expr) for expr in code[1:first]]
+                + [self.resolve_statement(statement) for statement in code[first:]]
+            )
+            if self.fuse and first == 2 and len(resolved) > 2:
+                self.__fuse_condition(resolved)
+            return resolved
+        if tok == InterpreterBase.SET_DEF:
+            resolved = (
+                [tok]
+                + [self.__resolve_target(name) for name in code[1:2]]
+                + [self.resolve_expression(expr) for expr in code[2:]]
+            )
+            if self.fuse and len(resolved) == 3:
+                self.__fuse_step(resolved)
+            return resolved
+        if tok in (InterpreterBase.INPUT_STRING_DEF, InterpreterBase.INPUT_INT_DEF):
+            return [tok] + [self.__resolve_target(name) for name in code[1:2]] + code[2:]
+        if tok in (InterpreterBase.RETURN_DEF, InterpreterBase.PRINT_DEF, InterpreterBase.THROW_DEF):
+            resolved = [tok] + [self.resolve_expression(expr) for expr in code[1:]]
+            if tok == InterpreterBase.RETURN_DEF and self.try_depth == 0:
+                self.__mark_tail_call(resolved)
+            return resolved
+        if tok == InterpreterBase.CALL_DEF:
+            return self.__resolve_call(code)
+        if tok == InterpreterBase.LET_DEF:
+            return self.__resolve_let(code)
+        if tok == InterpreterBase.TRY_DEF:
+            return self.__resolve_try(code)
+        return code
+
+    # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+    def __resolve_let(self, code):
+        if len(code) < 2 or type(code[1]) is not list:
+            return code
+        next_slot = self.__nest()
+        try:
+            var_defs = []
+            for var_def in code[1]:
+                if type(var_def) is not list or len(var_def) < 2 or type(var_def[1]) is list:
+                    var_defs.append(var_def)
+                    continue
+                name = var_def[1]
+                if name in self.scopes[-1]:  # ObjectDef reports the duplicate when the let runs
+                    resolved = ResolvedName(name, ResolvedName.LOCAL)
+                else:
+                    var_type = get_type_for_name(var_def[0])
+                    resolved = ResolvedName(
+                        name, ResolvedName.LOCAL, self.__declare(name, var_type), var_type
+                    )
+                var_defs.append([var_def[0], resolved] + var_def[2:])
+            return [code[0], var_defs] + [self.resolve_statement(statement) for statement in code[2:]]
+        finally:
+            self.__unnest(next_slot)
+
+    # (try (statement) (catch statement)); the catch statement sees the exception variable
+    def __resolve_try(self, code):
+        # an exception thrown by a call in the try statement must be caught here, so its calls aren't tail
+        # calls; those of the catch statement may be
+        self.try_depth += 1
+        try:
+            statements = [self.resolve_statement(statement) for statement in code[1:2]]
+        finally:
+            self.try_depth -= 1
+        next_slot = self.__nest()
+        try:
+            exception_type = Type(InterpreterBase.STRING_DEF)
+            slot = self.__declare(EXCEPTION_VAR_NAME, exception_type)
+            statements += [self.resolve_statement(statement) for statement in code[2:3]]
+        finally:
+            self.__unnest(next_slot)
+        tok = ResolvedName(code[0], ResolvedName.LOCAL, slot, exception_type)
+        return [tok] + statements + code[3:]
+
+    # (call object_ref/me/super methodname param1 param2 ...)
+    def __resolve_call(self, code):
+        target = code[1:2]
+        if target and target[0] not in (InterpreterBase.ME_DEF, InterpreterBase.SUPER_DEF):
+            target = [self.resolve_expression(target[0])]
+        return [code[0]] + target + code[2:3] + [self.resolve_expression(expr) for expr in code[3:]]
+
+    def resolve_expression(self, expr):
+        if type(expr) is not list:
+            return self.__resolve_name(expr)
+        if not expr or expr[0] == InterpreterBase.NEW_DEF:
+            return expr
+        if expr[0] == InterpreterBase.CALL_DEF:
+            return self.__resolve_call(expr)
+        # operators; any other list evaluates to None without evaluating its items
+        return [expr[0]] + [self.resolve_expression(operand) for operand in expr[1:]]
+
+    # marks a resolved (if/while condition statement...) whose condition is an IntCompare
+    def __fuse_condition(self, resolved):
+        condition = resolved[1]
+        if type(condition) is not list or len(condition) != 3 or condition[0] not in INT_COMPARISONS:
+            return
+        operator_name, local, operand = condition
+        if not self.__is_int_local(local):
+            operator_name, local, operand = MIRRORED_COMPARISONS[operator_name], operand, local
+            if not self.__is_int_local(local):
+                return
+        if type(operand) is not ResolvedName:
+            return
+        if self.__is_int_local(operand):
+            compare = IntCompare(INT_COMPARISONS[operator_name], local.index, ResolvedName.LOCAL, operand.index)
+        elif operand.kind == ResolvedName.FIELD and self.field_types[operand.index] == INT_TYPE:
+            compare = IntCompare(INT_COMPARISONS[operator_name], local.index, ResolvedName.FIELD, operand.index)
+        elif operand.kind == ResolvedName.CONSTANT and operand.value.type() == INT_TYPE:
+            compare = IntCompare(
+                INT_COMPARISONS[operator_name], local.index, ResolvedName.CONSTANT, operand.value.value()
+            )
+        else:
+            return
+        if resolved[0] == InterpreterBase.WHILE_DEF and not compare.invariant:
+            compare.invariant = is_invariant(resolved[2:], compare.operand_kind, compare.operand)
+        resolved[0] = ResolvedName(resolved[0], ResolvedName.INT_COMPARE, value=compare)
+
+    # marks a resolved (return (call target methodname arg1 arg2 ...))
+    def __mark_tail_call(self, resolved):
+        if len(resolved) == 2 and type(resolved[1]) is list and resolved[1]:
+            if resolved[1][0] == InterpreterBase.CALL_DEF:
+                resolved[0] = ResolvedName(resolved[0], ResolvedName.TAIL_CALL)
+
+    # marks a resolved (set i (+ i n)), (set i (+ n i)) or (set i (- i n))
+    def __fuse_step(self, resolved):
+        target, expr = resolved[1], resolved[2]
+        if not self.__is_int_local(target) or type(expr) is not list or len(expr) != 3:
+            return
+        if expr[0] == "+" and self.__is_constant_int(expr[1]):
+            step, local = expr[1].value.value(), expr[2]
+        elif expr[0] in ("+", "-") and self.__is_constant_int(expr[2]):
+            step, local = expr[2].value.value(), expr[1]
+            if expr[0] == "-":
+                step = -step
+        else:
+            return
+        if self.__is_int_local(local) and local.index == target.index:
+            resolved[0] = ResolvedName(resolved[0], ResolvedName.INT_STEP, target.index, value=step)
+
+    @staticmethod
+    def __is_int_local(name):
+        return (
+            type(name) is ResolvedName
+            and name.kind == ResolvedName.LOCAL
+            and name.index is not None
+            and name.var_type == INT_TYPE
+        )
+
+    @staticmethod
+    def __is_constant_int(name):
+        return type(name) is ResolvedName and name.kind == ResolvedName.CONSTANT and name.value.type() == INT_TYPE
+
+    # a name read by an expression
+    def __resolve_name(self, name):
+        local = self.__find_local(name)
+        if local is not None:
+            return ResolvedName(name, ResolvedName.LOCAL, local[0], local[1])
+        if name in self.field_index:
+            return ResolvedName(name, ResolvedName.FIELD, self.field_index[name])
+        value = create_value(name)
+        if value is not None:
+            return ResolvedName(name, ResolvedName.CONSTANT, value=value)
+        if name == InterpreterBase.ME_DEF:
+            return ResolvedName(name, ResolvedName.ME)
+        return ResolvedName(name, ResolvedName.UNKNOWN)
+
+    # a name assigned by set, inputi or inputs
+    def __resolve_target(self, name):
+        if type(name) is list:
+            return name
+        local = self.__find_local(name)
+        if local is not None:
+            return ResolvedName(name, ResolvedName.LOCAL, local[0], local[1])
+        if name in self.field_index:
+            return ResolvedName(name, ResolvedName.FIELD, self.field_index[name])
+        return ResolvedName(name, ResolvedName.UNKNOWN)
+
+
+# returns whether the operand of an IntCompare (a local's slot or a field's offset) keeps its value while
+# the resolved statements run: nothing in them assigns it, and for a field, nothing calls a method
+def is_invariant(statements, operand_kind, operand):
+    for code in statements:
+        if type(code) is not list or not code:
+            continue
+        if code[0] == InterpreterBase.CALL_DEF and operand_kind == ResolvedName.FIELD:
+            return False
+        if code[0] in (InterpreterBase.SET_DEF, InterpreterBase.INPUT_STRING_DEF, InterpreterBase.INPUT_INT_DEF):
+            target = code[1] if len(code) > 1 else None
+            if type(target) is ResolvedName and target.kind == operand_kind and target.index == operand:
+                return False
+        if not is_invariant(code, operand_kind, operand):
+            return False
+    return True
@@ -0,0 +1,646 @@
+"""
+Ahead-of-time transpiler from Brewin methods to Python.
+
+Each MethodDef body is translated into the source of a Python function (obj, args) -> (status, return_value),
+the same contract as the closure engine's compiled bodies, and compiled with compile(). Brewin locals and
+parameters become Python locals (lexical scope is static, so every name is resolved while translating),
+statements become Python statements and a Brewin exception is raised as a BrewinThrow, which a Brewin try
+catches as a Python try and the method boundary turns back into a (STATUS_EXCEPTION_THROWN, value) pair.
+
+The generated code performs every run-time check the tree-walking ObjectDef performs, in the same order,
+and reports the same ErrorType and line number. Operators and let checks are shared with closure_engine.
+
+Compiled code objects only hold strings and numbers, so they are marshalled into a CodeCache keyed by a hash
+of the parsed program (tokens and line numbers); a rerun of the same program skips translation and
+compile() and only has to exec the cached code. A method too deeply nested for Python's compiler is run by
+the closure engine instead.
+
+usage: python transpiler.py program.brewin   (prints the generated Python for every method)
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+import closure_engine
+from closure_engine import (
+    EXCEPTION_VAR_NAME,
+    check_local,
+    get_type_for_name,
+    make_binary_operation,
+    make_unary_operation,
+)
+from intbase import InterpreterBase, ErrorType
+from objectv2 import ObjectDef, InlineCache, BrewinThrow, BINARY_OP_LIST, UNARY_OP_LIST
+from type_valuev2 import Type, Value, create_value, create_default_value, create_int_value
+
+TRANSPILER_VERSION = 7  # bump whenever the generated code changes, to invalidate cached code objects
+FUNCTION_NAME = "brewin_method"
+
+
+# the globals every generated module runs with
+RUNTIME_GLOBALS = {
+    "Type": Type,
+    "Value": Value,
+    "ErrorType": ErrorType,
+    "BrewinThrow": BrewinThrow,
+    "InlineCache": InlineCache,
+    "create_value": create_value,
+    "create_default_value": create_default_value,
+    "create_int_value": create_int_value,
+    "make_binary_operation": make_binary_operation,
+    "make_unary_operation": make_unary_operation,
+    "STATUS_PROCEED": ObjectDef.STATUS_PROCEED,
+    "STATUS_RETURN": ObjectDef.STATUS_RETURN,
+    "STATUS_EXCEPTION_THROWN": ObjectDef.STATUS_EXCEPTION_THROWN,
+    "INT_TYPE": ObjectDef.INT_TYPE_CONST,
+    "STRING_TYPE": ObjectDef.STRING_TYPE_CONST,
+    "BOOL_TYPE": ObjectDef.BOOL_TYPE_CONST,
+}
+
+
+# returns a hex digest of a parsed program, including the line number of every token (they end up in
+# the generated code); optimized tells whether its method bodies went through the load-time optimizer
+def get_program_hash(parsed_program, optimized=False):
+    digest = hashlib.sha256()
+    digest.update(f"{TRANSPILER_VERSION}:{optimized}:".encode())
+
+    def add(item):
+        if type(item) is list:
+            digest.update(b"(")
+            for sub in item:
+                add(sub)
+            digest.update(b")")
+        else:
+            digest.update(f"{len(item)}:{item}:{getattr(item, 'line_num', None)};".encode())
+
+    add(parsed_program)
+    return digest.hexdigest()
+
+
+# returns the Python source of the module defining the function for method_def (a member of class_def)
+def transpile_method(class_def, method_def):
+    return MethodTranspiler(class_def, method_def).transpile()
+
+
+# a str/None literal in generated code
+def literal(text):
+    return repr(None if text is None else str(text))
+
+
+# On-disk cache of compiled method code, one file per program hash. Marshalled code objects only load
+# into the Python version that wrote them, so the interpreter's cache tag is part of the file name.
+class CodeCache:
+    FORMAT_VERSION = 1
+    FILE_SUFFIX = ".bcc"
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "brewin", "code")
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # returns a dict of method key -> code object; empty if nothing usable is cached for program_hash
+    def load(self, program_hash):
+        try:
+            with open(self.__get_path(program_hash), "rb") as f:
+                version, transpiler_version, code_objects = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return {}
+        if version != CodeCache.FORMAT_VERSION or transpiler_version != TRANSPILER_VERSION:
+            return {}
+        return code_objects
+
+    def store(self, program_hash, code_objects):
+        data = marshal.dumps((CodeCache.FORMAT_VERSION, TRANSPILER_VERSION, code_objects))
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.__get_path(program_hash))  # atomic, so readers never see a partial entry
+
+    # remove every cached entry
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CodeCache.FILE_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def __get_path(self, program_hash):
+        name = f"{program_hash}-{sys.implementation.cache_tag}{CodeCache.FILE_SUFFIX}"
+        return os.path.join(self.cache_dir, name)
+
+
+# The transpile engine for one prepared program. compile_method is what ObjectDef.call_method calls; every
+# method is translated at most once per program (and not at all when its code is cached).
+class Transpiler:
+    def __init__(self, program_hash, code_cache=None):
+        self.program_hash = program_hash
+        self.code_cache = code_cache
+        self.code_objects = {} if code_cache is None else code_cache.load(program_hash)
+        self.hits = 0  # methods whose code came from the cache
+        self.misses = 0  # methods that were translated and compiled
+        self.__saving = True
+        self.__unsaved = False
+
+    # ahead of time: translates every method of the non-templated classes and saves the cache once.
+    # specialized templated classes only exist at run time, so their methods are translated on first call
+    def transpile_classes(self, class_defs):
+        self.__saving = False
+        try:
+            for class_def in class_defs:
+                if class_def.template:
+                    continue
+                for method_def in class_def.get_methods():
+                    self.compile_method(class_def, method_def)
+        finally:
+            self.__saving = True
+        self.save()
+
+    # returns the compiled body of method_def, a function (obj, args) -> (status, return_value)
+    def compile_method(self, class_def, method_def):
+        body = method_def.transpiled_body
+        if body is None:
+            body = self.__load_or_transpile(class_def, method_def)
+            method_def.transpiled_body = body
+        return body
+
+    def save(self):
+        if self.__unsaved and self.code_cache is not None:
+            self.code_cache.store(self.program_hash, self.code_objects)
+        self.__unsaved = False
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses, "methods": len(self.code_objects)}
+
+    def __load_or_transpile(self, class_def, method_def):
+        key = f"{class_def.full_name or class_def.name}.{method_def.method_name}"
+        code = self.code_objects.get(key)
+        if code is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            try:
+                code = compile(transpile_method(class_def, method_def), f"<brewin {key}>", "exec")
+            except (SyntaxError, RecursionError):  # too deeply nested for Python's compiler
+                return closure_engine.compile_method(class_def, method_def)
+            self.code_objects[key] = code
+            self.__unsaved = True
+            if self.__saving:
+                self.save()
+        namespace = dict(RUNTIME_GLOBALS)
+        exec(code, namespace)
+        return namespace[FUNCTION_NAME]
+
+
+# translates one method. Expressions are emitted as statements assigning temporaries, in the order the
+# tree walker evaluates them; only reads that can't fail or be affected by a call (locals, literals, me)
+# are left inline.
+class MethodTranspiler:
+    def __init__(self, class_def, method_def):
+        self.interpreter = class_def.interpreter  # only used for compile-time type queries
+        self.field_index = class_def.field_index  # field name -> offset in ObjectDef.field_values
+        self.field_types = class_def.field_types
+        self.method_def = method_def
+        self.constants = {}  # constant definition -> name
+        self.constant_lines = []
+        self.return_type = self.__type_constant(method_def.get_return_type())
+        self.lines = []
+        self.indent = 2
+        self.num_temps = 0
+        self.num_locals = 0
+        # Brewin name -> (Python local, name of its Type constant), one dict per nested block
+        self.scopes = [{}]
+
+    def transpile(self):
+        lines = [f"def {FUNCTION_NAME}(obj, args):", "    interpreter = obj.interpreter"]
+        for index, param in enumerate(self.method_def.get_formal_params()):
+            local = self.__new_local()
+            self.scopes[0][param.name] = (local, self.__type_constant(param.type))
+            lines.append(f"    {local} = args[{index}]")
+        self.statement(self.method_def.get_code())
+        lines.append("    try:")
+        lines.extend(self.lines)
+        lines.append("    except BrewinThrow as thrown:")
+        lines.append("        return STATUS_EXCEPTION_THROWN, thrown.value")
+        lines.append("    return STATUS_PROCEED, None")
+        return "\n".join(self.constant_lines + lines) + "\n"
+
+    def __emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def __emit_count(self):
+        self.__emit("interpreter.statements_executed += 1")
+
+    def __emit_error(self, error_type, description, line_num):
+        self.__emit(f"interpreter.error({error_type}, {description}, {line_num!r})")
+
+    def __new_temp(self):
+        self.num_temps += 1
+        return f"t{self.num_temps}"
+
+    def __new_local(self):
+        self.num_locals += 1
+        return f"l{self.num_locals}"
+
+    # returns the module-level name holding the value of definition (a Python expression)
+    def __constant(self, prefix, definition):
+        name = self.constants.get(definition)
+        if name is None:
+            name = f"{prefix}{len(self.constants)}"
+            self.constants[definition] = name
+            self.constant_lines.append(f"{name} = {definition}")
+        return name
+
+    def __type_constant(self, var_type):
+        return self.__constant(
+            "T",
+            f"Type({literal(var_type.type_name)}, {literal(var_type.supertype_name)}, "
+            f"{literal(var_type.full_name)})",
+        )
+
+    def __find_local(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    # emits code raising a TypeError/IndexError/AttributeError for source the tree walker would crash on
+    def __emit_crash(self, exception):
+        self.__emit(f"raise {type(exception).__name__}({str(exception)!r})")
+
+    # emits a statement; malformed source is translated into code that crashes like the tree walker
+    def statement(self, code):
+        num_lines, indent, num_scopes = len(self.lines), self.indent, len(self.scopes)
+        try:
+            self.__statement(code)
+        except (IndexError, TypeError, AttributeError) as e:
+            del self.lines[num_lines:]
+            del self.scopes[num_scopes:]
+            self.indent = indent
+            self.__emit_crash(e)
+
+    def __statement(self, code):
+        tok = code[0]
+        if tok == InterpreterBase.BEGIN_DEF:
+            self.__emit_count()
+            for statement in code[1:]:
+                self.statement(statement)
+        elif tok == InterpreterBase.SET_DEF:
+            self.__set(code)
+        elif tok == InterpreterBase.IF_DEF:
+            self.__if(code)
+        elif tok == InterpreterBase.CALL_DEF:
+            self.__emit_count()
+            self.__raise_if_thrown(self.__call(code, code[0].line_num), True)
+        elif tok == InterpreterBase.WHILE_DEF:
+            self.__while(code)
+        elif tok == InterpreterBase.RETURN_DEF:
+            self.__return(code)
+        elif tok == InterpreterBase.INPUT_STRING_DEF:
+            self.__input(code, True)
+        elif tok == InterpreterBase.INPUT_INT_DEF:
+            self.__input(code, False)
+        elif tok == InterpreterBase.PRINT_DEF:
+            self.__print(code)
+        elif tok == InterpreterBase.LET_DEF:
+            self.__let(code)
+        elif tok == InterpreterBase.THROW_DEF:
+            self.__throw(code)
+        elif tok == InterpreterBase.TRY_DEF:
+            self.__try(code)
+        else:
+            self.__emit_error(
+                "ErrorType.SYNTAX_ERROR", literal("unknown statement " + tok), tok.line_num
+            )
+
+    # propagates a (STATUS_EXCEPTION_THROWN, value) result of a call as a BrewinThrow
+    def __raise_if_thrown(self, value, has_call):
+        if has_call:
+            self.__emit(f"if type({value}) is tuple:")
+            self.__emit(f"    raise BrewinThrow({value}[1])")
+
+    # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+    def __let(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        scope = {}
+        for var_def in code[1]:
+            problem = check_local(self.interpreter, var_def, scope, line_num)
+            if isinstance(problem, Exception):
+                self.__emit_crash(problem)
+                break
+            if problem is not None:
+                error_type, description, error_line = problem
+                self.__emit_error(f"ErrorType.{error_type.name}", literal(description), error_line)
+                break
+            var_type = get_type_for_name(var_def[0])
+            type_name = self.__type_constant(var_type)
+            if len(var_def) == 3:
+                default_value = self.__constant("V", f"create_value({literal(var_def[2])})")
+            else:
+                default_value = self.__constant("V", f"create_default_value({type_name})")
+            local = self.__new_local()
+            self.__emit(f"{local} = {default_value}")
+            scope[var_def[1]] = (local, type_name)
+
+        self.scopes.append(scope)
+        try:
+            for statement in code[2:]:
+                self.statement(statement)
+        finally:
+            self.scopes.pop()
+
+    # (set varname expression)
+    def __set(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        value = self.__value(code[2], line_num)
+        self.__assign(code[1], value, line_num)
+
+    # emits the type check and store of value into the local/parameter or field var_name
+    def __assign(self, var_name, value, line_num):
+        local = self.__find_local(var_name)
+        if local is not None:
+            local_name, type_name = local
+            self.__emit(f"if not interpreter.check_type_compatibility({type_name}, {value}.type(), True):")
+            self.__emit(
+                f"    interpreter.error(ErrorType.TYPE_ERROR, 'type mismatch ' + {type_name}.type_name"
+                f" + ' and ' + {value}.type().type_name, {line_num!r})"
+            )
+            self.__emit(f"{local_name} = {value}")
+        elif var_name in self.field_index:
+            field_index = self.field_index[var_name]
+            type_name = self.__type_constant(self.field_types[field_index])
+            self.__emit(f"if not interpreter.check_type_compatibility({type_name}, {value}.type(), True):")
+            self.__emit(
+                f"    interpreter.error(ErrorType.TYPE_ERROR, 'type mismatch ' + {type_name}.type_name"
+                f" + ' and ' + {value}.type().type_name, {line_num!r})"
+            )
+            self.__emit(f"obj.field_values[{field_index}] = {value}")
+        else:
+            self.__emit_error(
+                "ErrorType.NAME_ERROR", literal("unknown field/variable " + var_name), line_num
+            )
+
+    # emits the check that condition holds a bool, like the tree walker's if and while
+    def __check_condition(self, condition, expr, statement_name, line_num):
+        self.__emit(f"if {condition}.type() != BOOL_TYPE:")
+        try:
+            description = f"non-boolean {statement_name} condition " + ' '.join(x for x in expr)
+        except TypeError as e:  # the tree walker crashes building the message for a nested expression
+            self.__emit(f"    raise TypeError({str(e)!r})")
+        else:
+            self.__emit(f"    interpreter.error(ErrorType.TYPE_ERROR, {literal(description)}, {line_num!r})")
+
+    # (if expression (statement) (statement))
+    def __if(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        condition = self.__value(code[1], line_num)
+        self.__check_condition(condition, code[1], "if", line_num)
+        self.__emit(f"if {condition}.value():")
+        self.indent += 1
+        self.statement(code[2])
+        self.indent -= 1
+        if len(code) == 4:
+            self.__emit("else:")
+            self.indent += 1
+            self.statement(code[3])
+            self.indent -= 1
+
+    # (while expression (statement))
+    def __while(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        self.__emit("while True:")
+        self.indent += 1
+        condition = self.__value(code[1], line_num)
+        self.__check_condition(condition, code[1], "while", line_num)
+        self.__emit(f"if not {condition}.value():")
+        self.__emit("    break")
+        self.statement(code[2])
+        self.indent -= 1
+
+    # (return expression) or (return)
+    def __return(self, code):
+        self.__emit_count()
+        if len(code) == 1:
+            self.__emit("return STATUS_RETURN, None")
+            return
+        line_num = code[0].line_num
+        result = self.__value(code[1], line_num)
+        return_type = self.return_type
+        mismatch = (
+            f"interpreter.error(ErrorType.TYPE_ERROR, 'type mismatch ' + {return_type}.type_name"
+            f" + ' and ' + {result}.type().type_name, {line_num!r})"
+        )
+        self.__emit(f"if {result}.is_typeless_null():")
+        self.__emit(f"    if not interpreter.check_type_compatibility({return_type}, {result}.type(), True):")
+        self.__emit(f"        {mismatch}")
+        self.__emit(f"    {result} = {return_type}.null_value")  # propagate return type to null
+        self.__emit(f"if not interpreter.check_type_compatibility({return_type}, {result}.type(), True):")
+        self.__emit(f"    {mismatch}")
+        self.__emit(f"return STATUS_RETURN, {result}")
+
+    # (print expression1 expression2 ...)
+    def __print(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        terms = [self.__value(expr, line_num) for expr in code[1:]]
+        pieces = [
+            f"(('true' if {term}.value() == True else 'false') if {term}.type() == BOOL_TYPE "
+            f"else str({term}.value()))"
+            for term in terms
+        ]
+        self.__emit(f"interpreter.output({' + '.join(pieces) or repr('')})")
+
+    # (inputs target_variable) or (inputi target_variable)
+    def __input(self, code, get_string):
+        self.__emit_count()
+        value = self.__new_temp()
+        if get_string:
+            self.__emit(f"{value} = Value(STRING_TYPE, interpreter.get_input())")
+        else:
+            self.__emit(f"{value} = create_int_value(int(interpreter.get_input()))")
+        self.__assign(code[1], value, code[0].line_num)
+
+    # (throw expression)
+    def __throw(self, code):
+        line_num = code[0].line_num
+        self.__emit_count()
+        expr, has_call = self.__expression(code[1], line_num)
+        term = self.__to_temp(expr)
+        if has_call:
+            self.__emit(f"{term}.value()")  # the tree walker crashes here if the expression threw
+        self.__emit(f"if {term}.type() != STRING_TYPE:")
+        self.__emit(f"    interpreter.error(ErrorType.TYPE_ERROR, 'throwing a non string error', {line_num!r})")
+        self.__emit(f"raise BrewinThrow({term})")
+
+    # (try (statement) (catch statement)); the catch statement sees the thrown string as "exception"
+    def __try(self, code):
+        self.__emit_count()
+        self.__emit("try:")
+        self.indent += 1
+        self.statement(code[1])
+        self.indent -= 1
+        self.__emit("except BrewinThrow as thrown:")
+        self.indent += 1
+        local = self.__new_local()
+        self.__emit(f"{local} = thrown.value")
+        self.scopes.append({EXCEPTION_VAR_NAME: (local, "STRING_TYPE")})
+        try:
+            self.statement(code[2])
+        finally:
+            self.scopes.pop()
+        self.indent -= 1
+
+    # emits the evaluation of expr and returns the name of a temporary holding a Value; a call that threw
+    # is raised as a BrewinThrow
+    def __value(self, expr, line_num):
+        code, has_call = self.__expression(expr, line_num)
+        value = self.__to_temp(code)
+        self.__raise_if_thrown(value, has_call)
+        return value
+
+    def __to_temp(self, code):
+        if code.startswith("t") and code[1:].isdigit():
+            return code
+        temp = self.__new_temp()
+        self.__emit(f"{temp} = {code}")
+        return temp
+
+    # emits the statements evaluating expr and returns (python_expression, has_call); the expression is
+    # a Value, or a (STATUS_EXCEPTION_THROWN, value) tuple, which is only possible when has_call is true
+    def __expression(self, expr, line_num):
+        if type(expr) is not list:
+            return self.__name_or_constant(expr, line_num), False
+        operator = expr[0]
+        if operator in BINARY_OP_LIST:
+            left, left_call = self.__expression(expr[1], line_num)
+            right, right_call = self.__expression(expr[2], line_num)
+            operation = self.__constant(
+                "B", f"make_binary_operation({literal(operator)}, {line_num!r})"
+            )
+            result = self.__new_temp()
+            self.__emit(f"{result} = {operation}({left}, {right}, obj)")
+            return result, left_call or right_call
+        if operator in UNARY_OP_LIST:
+            operand, has_call = self.__expression(expr[1], line_num)
+            operation = self.__constant(
+                "U", f"make_unary_operation({literal(operator)}, {line_num!r})"
+            )
+            result = self.__new_temp()
+            self.__emit(f"{result} = {operation}({operand}, obj)")
+            return result, has_call
+        if operator == InterpreterBase.CALL_DEF:
+            return self.__call(expr, line_num), True
+        if operator == InterpreterBase.NEW_DEF:
+            class_type = self.__type_constant(get_type_for_name(expr[1]))
+            result = self.__new_temp()
+            self.__emit(
+                f"{result} = Value({class_type}, interpreter.instantiate({literal(expr[1])}, {line_num!r}))"
+            )
+            return result, False
+        return "None", False
+
+    # locals shadow fields, which shadow constants, which shadow me
+    def __name_or_constant(self, expr, line_num):
+        local = self.__find_local(expr)
+        if local is not None:
+            local_name, type_name = local
+            return f"({local_name} if not {local_name}.is_null() else {type_name}.null_value)"
+        if expr in self.field_index:
+            field_index = self.field_index[expr]
+            value = self.__new_temp()
+            self.__emit(f"{value} = obj.field_values[{field_index}]")
+            self.__emit(f"if {value}.is_null():")
+            self.__emit(f"    {value} = {self.__type_constant(self.field_types[field_index])}.null_value")
+            return value
+        if create_value(expr) is not None:
+            return self.__constant("V", f"create_value({literal(expr)})")
+        if expr == InterpreterBase.ME_DEF:
+            return "obj.get_me_as_value()"
+        self.__emit_error(
+            "ErrorType.NAME_ERROR", literal("invalid field or parameter " + expr), line_num
+        )
+        return "None"
+
+    # (call object_ref/me/super methodname p1 p2 p3); returns the temporary holding the result
+    def __call(self, code, line_num):
+        obj_name = code[1]
+        method_name = code[2]
+        result = self.__new_temp()
+        inline_cache = f"C{len(self.constant_lines)}"  # not shared through __constant: one per call site
+        self.constant_lines.append(f"{inline_cache} = InlineCache()")
+        super_only = False
+        if obj_name == InterpreterBase.ME_DEF:
+            target = "obj"
+        elif obj_name == InterpreterBase.SUPER_DEF:
+            self.__emit("if not obj.super_object:")
+            self.__emit(
+                f"    interpreter.error(ErrorType.TYPE_ERROR, 'invalid call to super object by class '"
+                f" + obj.class_def.get_name(), {line_num!r})"
+            )
+            target = "obj.super_object"
+            super_only = True
+        else:
+            expr, _ = self.__expression(obj_name, line_num)
+            obj_val = self.__to_temp(expr)
+            self.__emit(f"if {obj_val}.is_null():")
+            self.__emit(f"    interpreter.error(ErrorType.FAULT_ERROR, 'null dereference', {line_num!r})")
+            target = self.__new_temp()
+            self.__emit(f"{target} = {obj_val}.value()")
+        self.__call_args(code[3:], [], target, (method_name, super_only, inline_cache), result, line_num)
+        return result
+
+    # each argument is evaluated exactly once; only one with a call can evaluate to a thrown exception
+    # call is (method_name, super_only, name of the call site's InlineCache)
+    def __call_args(self, args, actual_args, target, call, result, line_num):
+        if not args:
+            method_name, super_only, inline_cache = call
+            self.__emit(
+                f"{result} = {target}.call_method({literal(method_name)}, [{', '.join(actual_args)}], "
+                f"{super_only}, {line_num!r}, {inline_cache})"
+            )
+            return
+        arg, has_call = self.__expression(args[0], line_num)
+        if has_call:
+            evaluated = self.__to_temp(arg)
+            self.__emit(f"if type({evaluated}) is tuple:")
+            self.__emit(f"    {result} = {evaluated}[0], {evaluated}[1]")
+            self.__emit("else:")
+            self.indent += 1
+            self.__call_args(args[1:], actual_args + [evaluated], target, call, result, line_num)
+            self.indent -= 1
+        else:
+            self.__call_args(args[1:], actual_args + [arg], target, call, result, line_num)
+
+
+def main(argv=None):
+    import argparse
+    from bparser import BParser
+    from interpreterv3 import Interpreter
+
+    parser = argparse.ArgumentParser(description="Print the Python generated for a Brewin program.")
+    parser.add_argument("program", help="Brewin source file")
+    args = parser.parse_args(argv)
+
+    with open(args.program) as f:
+        status, parsed_program = BParser.parse(f.read().splitlines())
+    if not status:
+        sys.exit(f"parse error: {parsed_program}")
+    prepared = Interpreter(console_output=False).prepare_parsed(parsed_program)
+    for class_def in prepared.class_index.values():
+        if class_def.template:
+            continue
+        for method_def in class_def.get_methods():
+            print(f"# {class_def.name}.{method_def.method_name}")
+            print(transpile_method(class_def, method_def))
+
+
+if __name__ == "__main__":
+    main()
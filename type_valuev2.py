@@ -1,22 +1,54 @@
+import weakref
+
 from intbase import InterpreterBase
 
 
 # Enumerated type for our different language data types
+# Types are immutable and interned: Type(...) returns the one instance for its (type_name, supertype_name,
+# full_name), so equal types are usually the same object and == is answered by the identity check. Each
+# Type also holds the null Value of its type, shared like every other Value.
+# The table only holds weak references: a Type is dropped once no program uses it, so a long-running
+# process (see brewin_server.py) doesn't keep the class and template types of every program it ran.
 class Type:
-    def __init__(self, type_name, supertype_name=None, full_name=None):
-        self.type_name = type_name
-        self.supertype_name = supertype_name
-        self.full_name = full_name
+    __slots__ = ("type_name", "supertype_name", "full_name", "null_value", "__weakref__")
+    interned = {}  # (type_name, supertype_name, full_name) -> weak reference to the Type
+
+    def __new__(cls, type_name, supertype_name=None, full_name=None):
+        key = (type_name, supertype_name, full_name)
+        ref = Type.interned.get(key)
+        interned = ref() if ref is not None else None
+        if interned is None:
+            interned = object.__new__(cls)
+            interned.type_name = type_name
+            interned.supertype_name = supertype_name
+            interned.full_name = full_name
+            interned.null_value = Value(interned, None)
+            Type.interned[key] = weakref.ref(interned, lambda ref, key=key: Type.__forget(key, ref))
+        return interned
+
+    # called when the Type of key is collected; a newer Type may already have taken its place
+    @staticmethod
+    def __forget(key, ref):
+        if Type.interned.get(key) is ref:
+            del Type.interned[key]
+
+    # copies and pickles of a Type are the interned Type
+    def __reduce__(self):
+        return Type, (self.type_name, self.supertype_name, self.full_name)
 
     def __eq__(self, other):
-        return (
+        return self is other or (
             self.type_name == other.type_name
             and self.supertype_name == other.supertype_name
         )
 
 
 # Represents a value, which has a type and its value
+# Values are immutable, so the common ones (true, false, small ints, "", and the null of each Type) are
+# shared instead of being allocated again; see create_bool_value and create_int_value
 class Value:
+    __slots__ = ("t", "v")
+
     def __init__(self, type_obj, value=None):
         self.t = type_obj
         self.v = value
@@ -24,55 +56,73 @@ class Value:
     def value(self):
         return self.v
 
-    def set(self, other):
-        self.t = other.t
-        self.v = other.v
-
     def type(self):
         return self.t
 
     def is_null(self):
-        return self.v == None and self.t != Type(InterpreterBase.NOTHING_DEF)
+        return self.v is None and self.t is not NOTHING_TYPE
   
     def is_typeless_null(self):
-        return self.v == None and self.t == Type(InterpreterBase.NULL_DEF)
+        return self.v is None and self.t is NULL_TYPE
     
     def __eq__(self, other):
         return self.t == other.t and self.v == other.v
 
 
+INT_TYPE = Type(InterpreterBase.INT_DEF)
+STRING_TYPE = Type(InterpreterBase.STRING_DEF)
+BOOL_TYPE = Type(InterpreterBase.BOOL_DEF)
+NULL_TYPE = Type(InterpreterBase.NULL_DEF)
+NOTHING_TYPE = Type(InterpreterBase.NOTHING_DEF)
+
+TRUE_VALUE = Value(BOOL_TYPE, True)
+FALSE_VALUE = Value(BOOL_TYPE, False)
+EMPTY_STRING_VALUE = Value(STRING_TYPE, "")
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1023
+SMALL_INT_VALUES = [Value(INT_TYPE, i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+def create_bool_value(val):
+    return TRUE_VALUE if val else FALSE_VALUE
+
+
+def create_int_value(val):
+    if SMALL_INT_MIN <= val <= SMALL_INT_MAX:
+        return SMALL_INT_VALUES[val - SMALL_INT_MIN]
+    return Value(INT_TYPE, val)
+
+
 # val is a string with the value we want to use to construct a Value object.
 # e.g., '1234' 'null' 'true' '"foobar"'
 def create_value(val):
     if val == InterpreterBase.TRUE_DEF:
-        return Value(Type(InterpreterBase.BOOL_DEF), True)
+        return TRUE_VALUE
     elif val == InterpreterBase.FALSE_DEF:
-        return Value(Type(InterpreterBase.BOOL_DEF), False)
+        return FALSE_VALUE
     elif val[0] == '"':
-        return Value(Type(InterpreterBase.STRING_DEF), val.strip('"'))
+        return Value(STRING_TYPE, val.strip('"'))
     elif val.lstrip('-').isnumeric():
-        return Value(Type(InterpreterBase.INT_DEF), int(val))
+        return create_int_value(int(val))
     elif val == InterpreterBase.NULL_DEF:
-        return Value(Type(InterpreterBase.NULL_DEF), None)
+        return NULL_TYPE.null_value
     else:
         return None
 
 
 # create a default value of the specified type; type_def is a Type object
 def create_default_value(type_def):
-    if type_def == Type(InterpreterBase.BOOL_DEF):
-        return Value(Type(InterpreterBase.BOOL_DEF), False)
-    elif type_def == Type(InterpreterBase.STRING_DEF):
-        return Value(Type(InterpreterBase.STRING_DEF), "")
-    elif type_def == Type(InterpreterBase.INT_DEF):
-        return Value(Type(InterpreterBase.INT_DEF), 0)
-    elif type_def == Type(
-        InterpreterBase.NOTHING_DEF
-    ):  # used for void return type on methods
-        return Value(Type(InterpreterBase.NOTHING_DEF), None)
+    if type_def == BOOL_TYPE:
+        return FALSE_VALUE
+    elif type_def == STRING_TYPE:
+        return EMPTY_STRING_VALUE
+    elif type_def == INT_TYPE:
+        return create_int_value(0)
+    elif type_def == NOTHING_TYPE:  # used for void return type on methods
+        return NOTHING_TYPE.null_value
     else:
-        return Value(
-            type_def, None
+        return (
+            type_def.null_value
         )  # the type is a class type, so we return null for default val, with proper class type
 
 
@@ -83,6 +133,11 @@ class TypeManager:
         self.map_typename_to_type = {}
         self.template_classname_num_types = {}
         self.template_classname_param_types = {}
+        self.ancestors = {}  # type name -> frozenset of the names of the type and all of its supertypes
+        self.valid_template_names = {}  # e.g., "box@int" -> bool, filled in as the names are checked
+        # (id(typea), id(typeb), for_assignment) -> (bool, typea, typeb); Types are interned, and the entry
+        # keeps both alive so their ids can't be reused by other Types
+        self.compatibility = {}
         self.__setup_primitive_types()
 
     # used to register a new class name (and its supertype name, if present as a valid type so it can be used
@@ -98,22 +153,43 @@ class TypeManager:
         self.template_classname_num_types[class_name] = num_params
         self.template_classname_param_types[class_name] = param_names
 
+    # called once every class name has been added with add_class_type; precomputes the inheritance chain
+    # of every type so is_a_subtype is a set lookup, however deep the hierarchy
+    def finalize(self):
+        self.ancestors = {}
+        for typename in self.map_typename_to_type:
+            chain = []
+            cur_type = typename
+            while cur_type in self.map_typename_to_type and cur_type not in chain:
+                chain.append(cur_type)
+                cur_type = self.map_typename_to_type[cur_type].supertype_name
+            self.ancestors[typename] = frozenset(chain)
+        self.compatibility = {}
+
     def is_valid_type(self, typename):
-        if '@' in typename:
-            typename_split = typename.split('@')
-            
-            firstflag =  typename_split[0] in self.map_typename_to_type \
-                and len(typename_split[1:]) == self.template_classname_num_types[typename_split[0]]
-            secondflag = True
-            for vartype in typename_split[1:]:
-                # print(vartype)
-                if not self.is_valid_type(vartype):
-                    if vartype not in self.template_classname_param_types[typename_split[0]]:
-                        secondflag = False
-                        break
-            return firstflag and secondflag
-                
-        return typename in self.map_typename_to_type
+        if typename in self.map_typename_to_type:
+            return True
+        if '@' not in typename:
+            return False
+        valid = self.valid_template_names.get(typename)
+        if valid is None:
+            valid = self.__is_valid_template_name(typename)
+            self.valid_template_names[typename] = valid
+        return valid
+
+    def __is_valid_template_name(self, typename):
+        typename_split = typename.split('@')
+        
+        firstflag =  typename_split[0] in self.map_typename_to_type \
+            and len(typename_split[1:]) == self.template_classname_num_types[typename_split[0]]
+        secondflag = True
+        for vartype in typename_split[1:]:
+            # print(vartype)
+            if not self.is_valid_type(vartype):
+                if vartype not in self.template_classname_param_types[typename_split[0]]:
+                    secondflag = False
+                    break
+        return firstflag and secondflag
 
     # return Type object for specified typename string
     def get_type_info(self, typename):
@@ -126,6 +202,9 @@ class TypeManager:
 
     # args are strings
     def is_a_subtype(self, suspected_supertype, suspected_subtype):
+        ancestors = self.ancestors.get(suspected_subtype)
+        if ancestors is not None and suspected_supertype in self.map_typename_to_type:
+            return suspected_supertype in ancestors
         if not self.is_valid_type(suspected_supertype) or not self.is_valid_type(
             suspected_subtype
         ):
@@ -143,8 +222,17 @@ class TypeManager:
                 type_info.supertype_name #check suspected supertype is in the inheritance chain
             )  # check the base class of the subtype next
 
-    # typea and typeb are Type objects
+    # typea and typeb are Type objects; the answer for each pair of Types is only worked out once
     def check_type_compatibility(self, typea, typeb, for_assignment):
+        key = (id(typea), id(typeb), for_assignment)
+        entry = self.compatibility.get(key)
+        if entry is None:
+            compatible = self.__check_type_compatibility(typea, typeb, for_assignment)
+            self.compatibility[key] = (compatible, typea, typeb)
+            return compatible
+        return entry[0]
+
+    def __check_type_compatibility(self, typea, typeb, for_assignment):
         # if either type is invalid (E.g., the user referenced a class name that doesn't exist) then
         # return false
         # print(typea.type_name, typeb.type_name, typea.full_name, typeb.full_name)
@@ -0,0 +1,225 @@
+"""
+Whole-program static type checking, run before main starts when the Interpreter is made with
+unchecked=True (or on its own: python typecheck.py program.brewin).
+
+check_program resolves (see resolver.py) the body of every method of the program's non-templated classes
+and works out the static type of every expression it can: the declared type of a local, parameter or
+field, the type of a literal, of me and of (new classname), the result type of an operator, and the
+return type of a call when every method of the program with that name and number of arguments returns
+the same type. A static type is what the value has if the expression completes; a value held by a
+variable may be of a derived class of its static type, and templated types are never given a static type.
+
+A set, return or let whose run-time type check the static types prove always passes is marked on its
+keyword (ResolvedName.UNCHECKED), and the tree engine skips that check; a let also gets its default values
+precomputed. Every other statement keeps its dynamic checks, so a program runs exactly as it does when
+checked: a type error is still reported when, and only if, the statement runs. The checks the static
+types prove always fail are returned as (ErrorType, message, line) with the ErrorType, message and line
+the run-time check reports.
+
+usage: python typecheck.py program.brewin
+"""
+
+import sys
+
+from intbase import InterpreterBase, ErrorType
+from resolver import ResolvedName, resolve_body
+from type_valuev2 import Type, BOOL_TYPE, INT_TYPE, STRING_TYPE, create_value, create_default_value
+
+BOOL_OPERATORS = {"==", "!=", "<", "<=", ">", ">=", "&", "|"}  # binary operators that only produce bools
+INT_OPERATORS = {"-", "*", "/", "%"}  # binary operators that only apply to ints
+
+
+# type checks every method of a prepared program, marking the statements proved type-safe; returns the
+# type errors found, ordered by line
+def check_program(prepared):
+    return_types = get_return_types(prepared.class_index)
+    errors = []
+    for class_def in prepared.class_index.values():
+        if class_def.template:
+            continue
+        for method_def in class_def.get_methods():
+            errors += MethodChecker(prepared.type_manager, return_types, class_def, method_def).check()
+    return sorted(errors, key=lambda error: error[2] if error[2] is not None else -1)
+
+
+# returns (method name, number of parameters) -> the return Type shared by every method of the program with
+# that signature, or None if they differ or one is in a templated class
+def get_return_types(class_index):
+    return_types = {}
+    for class_def in class_index.values():
+        if class_def.template:
+            for member in class_def.class_source[3:]:
+                if member[0] == InterpreterBase.METHOD_DEF:
+                    return_types[(member[2], len(member[3]))] = None
+            continue
+        for method_def in class_def.get_methods():
+            signature = (method_def.get_method_name(), len(method_def.get_formal_params()))
+            return_type = method_def.get_return_type()
+            if return_types.get(signature, return_type) is not return_type:
+                return_type = None
+            return_types[signature] = return_type
+    return return_types
+
+
+# checks the resolved body of one method, marking its type-safe statements in place
+class MethodChecker:
+    def __init__(self, type_manager, return_types, class_def, method_def):
+        self.type_manager = type_manager
+        self.return_types = return_types
+        self.field_types = class_def.field_types
+        self.class_type = Type(class_def.get_name()) if class_def.full_name is None else None
+        self.return_type = method_def.get_return_type()
+        self.code = resolve_body(class_def, method_def).code
+        self.errors = []
+
+    def check(self):
+        self.statement(self.code)
+        return self.errors
+
+    def statement(self, code):
+        if type(code) is not list or not code:
+            return
+        tok = code[0]
+        if tok == InterpreterBase.SET_DEF:
+            self.__check_set(code)
+        elif tok == InterpreterBase.RETURN_DEF:
+            self.__check_return(code)
+        elif tok == InterpreterBase.LET_DEF:
+            self.__check_let(code)
+        if tok in (InterpreterBase.BEGIN_DEF, InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF):
+            statements = code[1:] if tok == InterpreterBase.BEGIN_DEF else code[2:]
+        elif tok == InterpreterBase.LET_DEF:
+            statements = code[2:]
+        elif tok == InterpreterBase.TRY_DEF:
+            statements = code[1:3]
+        else:
+            return
+        for statement in statements:
+            self.statement(statement)
+
+    # returns the static Type of expr, or None if it isn't known
+    def type_of(self, expr):
+        if type(expr) is not list:
+            if type(expr) is not ResolvedName:
+                return None
+            if expr.kind == ResolvedName.LOCAL:
+                return self.__known(expr.var_type)
+            if expr.kind == ResolvedName.FIELD:
+                return self.__known(self.field_types[expr.index])
+            if expr.kind == ResolvedName.CONSTANT:
+                return expr.value.type()
+            if expr.kind == ResolvedName.ME:
+                return self.class_type
+            return None
+        if not expr:
+            return None
+        operator = expr[0]
+        if operator in BOOL_OPERATORS:
+            return BOOL_TYPE
+        if operator in INT_OPERATORS:
+            return INT_TYPE
+        if operator == "+" and len(expr) == 3:
+            # + only applies to two ints or two strings
+            for operand in expr[1:]:
+                operand_type = self.type_of(operand)
+                if operand_type is INT_TYPE or operand_type is STRING_TYPE:
+                    return operand_type
+            return None
+        if operator == "!" and len(expr) == 2:
+            # ! of anything but a bool evaluates to None
+            return BOOL_TYPE if self.type_of(expr[1]) is BOOL_TYPE else None
+        if operator == InterpreterBase.CALL_DEF and len(expr) >= 3:
+            return self.__known(self.return_types.get((expr[2], len(expr) - 3)))
+        if operator == InterpreterBase.NEW_DEF and len(expr) == 2 and '@' not in expr[1]:
+            return Type(str(expr[1]))
+        return None
+
+    @staticmethod
+    def __known(var_type):
+        if var_type is None or var_type.full_name is not None:
+            return None
+        return var_type
+
+    # returns whether a value of static type rvalue_type always passes the check against lvalue_type; if it
+    # never does, records the error the check reports. A downcast (e.g., to a dog from an animal that may
+    # hold one) passes or fails depending on the value.
+    def __check(self, lvalue_type, rvalue_type, line_num):
+        if self.type_manager.check_type_compatibility(lvalue_type, rvalue_type, True):
+            return True
+        if self.type_manager.check_type_compatibility(rvalue_type, lvalue_type, True):
+            return False
+        self.errors.append(
+            (ErrorType.TYPE_ERROR, f"type mismatch {lvalue_type.type_name} and {rvalue_type.type_name}", line_num)
+        )
+        return False
+
+    # (set varname expression)
+    def __check_set(self, code):
+        if type(code[0]) is ResolvedName or len(code) != 3 or type(code[1]) is not ResolvedName:
+            return
+        target = code[1]
+        if target.kind == ResolvedName.LOCAL and target.index is not None:
+            var_type = self.__known(target.var_type)
+        elif target.kind == ResolvedName.FIELD:
+            var_type = self.__known(self.field_types[target.index])
+        else:
+            return
+        value_type = self.type_of(code[2])
+        if var_type is None or value_type is None:
+            return
+        if self.__check(var_type, value_type, code[0].line_num):
+            code[0] = ResolvedName(code[0], ResolvedName.UNCHECKED)
+
+    # (return expression); a call in tail position is checked when the call returns
+    def __check_return(self, code):
+        if type(code[0]) is ResolvedName or len(code) != 2 or self.__known(self.return_type) is None:
+            return
+        value_type = self.type_of(code[1])
+        if value_type is None:
+            return
+        if self.__check(self.return_type, value_type, code[0].line_num):
+            code[0] = ResolvedName(code[0], ResolvedName.UNCHECKED)
+
+    # (let ((type1 var1 defval1) (type2 var2 defval2)) (statement1) (statement2) ...)
+    def __check_let(self, code):
+        if len(code) < 2 or type(code[1]) is not list:
+            return
+        defaults = []  # (slot, default Value) of every variable
+        for var_def in code[1]:
+            if type(var_def) is not list or len(var_def) not in (2, 3) or '@' in var_def[0]:
+                return
+            if any(type(token) is list for token in var_def):
+                return  # malformed, reported when the let runs
+            if type(var_def[1]) is not ResolvedName or var_def[1].index is None:
+                return  # a duplicate variable, reported when the let runs
+            var_type = Type(var_def[0])
+            if len(var_def) == 3:
+                default_value = create_value(var_def[2])
+            else:
+                default_value = create_default_value(var_type)
+            if default_value is None:
+                return
+            if not self.__check(var_type, default_value.type(), code[0].line_num):
+                return
+            defaults.append((var_def[1].index, default_value))
+        code[0] = ResolvedName(code[0], ResolvedName.UNCHECKED, value=tuple(defaults))
+
+
+def main(argv=None):
+    from interpreterv3 import Interpreter
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+    with open(argv[0]) as f:
+        program = f.read().splitlines()
+    prepared = Interpreter(console_output=False).prepare(program)
+    errors = prepared.type_check()
+    for error_type, description, line_num in errors:
+        print(f"{error_type} on line {line_num}: {description}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())